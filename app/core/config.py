@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Dict, List, Optional
 import os
 
 class Settings(BaseSettings):
@@ -17,9 +17,96 @@ class Settings(BaseSettings):
     # Database settings (for future use)
     DATABASE_URL: str = "sqlite:///./portfolio_metrics.db"
     
+    # Connection pool settings, applied per logical database (sec_master, user_data, ...).
+    # DB_POOL_OVERRIDES adjusts individual databases, e.g.
+    # DB_POOL_OVERRIDES='{"sec_master": {"pool_size": 20}, "user_data": {"pool_size": 3}}'
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_OVERRIDES: Dict[str, Dict[str, int]] = {}
+    # Connect through pgbouncer (transaction pooling): no in-process pool, no cached prepared statements
+    DB_PGBOUNCER_MODE: bool = False
+    
+    # Read replicas per database as "host" or "host:port", e.g.
+    # DB_REPLICAS='{"sec_master": ["replica-1:5432", "replica-2:5432"]}'
+    DB_REPLICAS: Dict[str, List[str]] = {}
+    # How long a replica that refused or dropped a connection is left out of rotation
+    DB_REPLICA_RETRY_SECONDS: float = 30.0
+    
+    # Portfolio settings
+    PORTFOLIOS_PAGE_SIZE: int = 100
+    PORTFOLIOS_MAX_PAGE_SIZE: int = 1000
+    PORTFOLIO_SNAPSHOT_MAX_ROWS: int = 100000
+    # Snapshots per page when reading a date range
+    PORTFOLIO_SNAPSHOT_PAGE_SIZE: int = 10000
+    
+    # Instruments settings
+    INSTRUMENTS_PAGE_SIZE: int = 1000
+    INSTRUMENTS_MAX_PAGE_SIZE: int = 10000
+    INSTRUMENT_CACHE_SIZE: int = 100000
+    INSTRUMENT_LIST_CACHE_SIZE: int = 256
+    INSTRUMENT_CACHE_TTL_SECONDS: float = 300.0
+    # Listen for cross-replica cache invalidations via PostgreSQL LISTEN/NOTIFY
+    INSTRUMENT_CACHE_LISTEN: bool = True
+    
+    # Metrics settings
+    METRICS_BATCH_MAX_SYMBOLS: int = 2000
+    METRICS_ROLLING_MAX_WINDOW: int = 2520
+    # Synchronous matrix requests are computed in the API process; larger universes
+    # (up to METRICS_MATRIX_JOB_MAX_SYMBOLS) go through a return_matrix job on the workers
+    METRICS_MATRIX_MAX_SYMBOLS: int = 1000
+    METRICS_MATRIX_JOB_MAX_SYMBOLS: int = 5000
+    # Correlation/covariance matrices cached per (universe, date range, kind) within a
+    # total size in bytes; price loads clear them
+    METRICS_MATRIX_CACHE_SIZE: int = 32
+    METRICS_MATRIX_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    METRICS_MATRIX_CACHE_TTL_SECONDS: float = 3600.0
+    METRICS_MATRIX_CACHE_LISTEN: bool = True
+    # Process pool for universe-wide metric runs (workers default to the CPU count)
+    METRICS_PROCESS_WORKERS: Optional[int] = None
+    # Universe runs copy the whole price panel into /dev/shm, so by default they only run
+    # as universe_metrics jobs on the worker deployment; enable to stream them from the API
+    METRICS_UNIVERSE_ENDPOINT_ENABLED: bool = False
+    METRICS_PROCESS_CHUNK_SIZE: int = 500
+    # Point budget for frequency=auto: date ranges that would exceed it at daily frequency
+    # are served from the weekly, then monthly, rollups
+    PRICE_HISTORY_MAX_POINTS: int = 520
+    # Directory for the memory-mapped per-symbol price cache shared by the workers on a host
+    # (disabled when unset). Invalidated by price loads via LISTEN/NOTIFY.
+    PRICE_CACHE_DIR: Optional[str] = None
+    
+    # HTTP cache settings: seconds clients may reuse a GET response before revalidating it
+    # with If-None-Match (answered with 304 when the data has not changed)
+    HTTP_CACHE_INSTRUMENTS_MAX_AGE: int = 60
+    HTTP_CACHE_PRICES_MAX_AGE: int = 5
+    # Serialized metric responses kept per ETag, shared by every client polling the same query
+    METRICS_RESPONSE_CACHE_SIZE: int = 1024
+    # ETags change with the prices, so entries never go stale; the TTL only frees unpolled ones
+    METRICS_RESPONSE_CACHE_TTL_SECONDS: float = 600.0
+    
+    # Compression settings: responses of at least this many bytes are compressed with zstd,
+    # brotli or gzip when the client accepts it (streamed responses always are)
+    HTTP_COMPRESSION_MIN_SIZE: int = 1024
+    
+    # Job queue settings (see worker.py)
+    JOB_POLL_SECONDS: float = 5.0
+    # Workers record a heartbeat on their running job this often; a running job whose
+    # heartbeat is older than JOB_LEASE_SECONDS (its worker died) is claimed again
+    JOB_HEARTBEAT_SECONDS: float = 10.0
+    JOB_LEASE_SECONDS: float = 60.0
+    JOB_MAX_ATTEMPTS: int = 3
+    
     # Security settings (REQUIRED - must be set via environment)
     SECRET_KEY: str  # No default - must be provided
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+    TOKEN_CACHE_SIZE: int = 10000
+    IDENTITY_CACHE_SIZE: int = 10000
+    IDENTITY_CACHE_TTL_SECONDS: float = 300.0
+    # Listen for cross-replica identity invalidations (role changes) via LISTEN/NOTIFY
+    IDENTITY_CACHE_LISTEN: bool = True
     
     # Environment
     ENVIRONMENT: str = "development"
@@ -1,10 +1,13 @@
 from fastapi import APIRouter
-from app.routers import portfolio, instruments, auth
+from app.routers import portfolio, instruments, auth, metrics, prices, jobs
 
 # Create main API router
 api_router = APIRouter()
 
 # Include all routers
 api_router.include_router(portfolio.router, prefix="/portfolio", tags=["portfolio"])
-api_router.include_router(instruments.router, prefix="/instruments", tags=["financial-instruments"])
+api_router.include_router(instruments.router, tags=["financial-instruments"])
+api_router.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
+api_router.include_router(prices.router, prefix="/prices", tags=["market-prices"])
+api_router.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
 api_router.include_router(auth.router, tags=["authentication"])
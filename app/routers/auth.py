@@ -3,17 +3,22 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import text
 
 # Import utility functions
-from app.util.database import get_db
-from app.util.security import hash_password, verify_password, generate_token, verify_token
+from app.core.config import settings
+from app.util.cache import TTLCache
+from app.util.database import get_async_db
+from app.util.security import hash_password_async, verify_password_async, generate_token, verify_token
+from app.util.worker_pool import PoolSaturatedError
 from app.util.response_helpers import (
     create_success_response, 
     handle_database_error, 
     handle_validation_error,
     handle_not_found_error,
-    handle_unauthorized_error
+    handle_unauthorized_error,
+    handle_service_unavailable_error
 )
 from app.util.logger import logger
 
@@ -47,6 +52,53 @@ class TokenVerifyResponse(BaseModel):
     message: str
     username: Optional[str] = None
 
+# Fixed statements, defined once so the asyncpg driver reuses one server-side
+# prepared statement per connection for each of them.
+USER_WITH_ROLES_SQL = text("""
+    SELECT u.id, u.username, u.email, u.password_hash,
+           COALESCE(array_agg(r.role_name) FILTER (WHERE r.role_name IS NOT NULL), '{}') AS roles
+    FROM users u
+    LEFT JOIN user_role_mapping urm ON urm.user_id = u.id
+    LEFT JOIN user_role r ON r.id = urm.role_id
+    WHERE u.username = :username
+    GROUP BY u.id
+""")
+
+# Inserts the user unless the username or email is taken and assigns the
+# default 'viewer' role, in one round trip. user_id is NULL on conflict.
+CREATE_USER_SQL = text("""
+    WITH new_user AS (
+        INSERT INTO users (username, email, password_hash)
+        SELECT CAST(:username AS VARCHAR), CAST(:email AS VARCHAR), :password_hash
+        WHERE NOT EXISTS (
+            SELECT 1 FROM users
+            WHERE username = CAST(:username AS VARCHAR) OR email = CAST(:email AS VARCHAR)
+        )
+        RETURNING id
+    ), new_role AS (
+        INSERT INTO user_role_mapping (user_id, role_id)
+        SELECT new_user.id, r.id
+        FROM new_user, user_role r
+        WHERE r.role_name = 'viewer'
+        RETURNING user_id
+    )
+    SELECT (SELECT id FROM new_user) AS user_id, (SELECT count(*) FROM new_role) AS roles_assigned
+""")
+
+# Identity cache: username -> UserResponse (including roles). Role changes in
+# user_role_mapping fire a NOTIFY on IDENTITY_CACHE_CHANNEL (see query.sql),
+# which every replica applies through invalidate_identity_cache.
+IDENTITY_CACHE_CHANNEL = "identity_cache"
+identity_cache = TTLCache(maxsize=settings.IDENTITY_CACHE_SIZE, ttl=settings.IDENTITY_CACHE_TTL_SECONDS)
+
+
+def invalidate_identity_cache(username: str = "") -> None:
+    """Drop a user from the identity cache; an empty username drops everyone."""
+    if username:
+        identity_cache.pop(username)
+    else:
+        identity_cache.clear()
+
 # Dependency for getting current user
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
     """Get current user from token."""
@@ -57,7 +109,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     return username
 
 @router.post("/login", response_model=TokenResponse)
-async def login(user_data: UserLogin):
+async def login(user_data: UserLogin, db: AsyncSession = Depends(get_async_db('user_data'))):
     """Authenticate user and return a token."""
     username = user_data.username
     password = user_data.password
@@ -66,40 +118,20 @@ async def login(user_data: UserLogin):
         raise handle_validation_error("credentials", "Username and password are required")
 
     try:
-        # Get database session
-        db = next(get_db('user_data'))
-        
-        # Query the users table for username
+        # Fetch the user, password hash and roles in one round trip
         logger.debug(f"Querying user for login: {username}")
-        result = db.execute(
-            text("SELECT id, password_hash FROM users WHERE username = :username"),
-            {'username': username}
-        ).fetchone()
+        result = (await db.execute(USER_WITH_ROLES_SQL, {'username': username})).fetchone()
 
         if not result:
             raise handle_unauthorized_error("Invalid credentials")
 
-        user_id, stored_password_hash = result[0], result[1]
+        stored_password_hash, role_names = result.password_hash, list(result.roles)
 
         # Verify the provided password against the stored hash
-        if verify_password(password, stored_password_hash):
+        if await verify_password_async(password, stored_password_hash):
             # Generate token
             token = generate_token(username)
 
-            # Query roles for the user
-            roles = db.execute(
-                text("""
-                    SELECT r.role_name
-                    FROM user_role_mapping urm
-                    JOIN user_role r ON urm.role_id = r.id
-                    WHERE urm.user_id = :user_id
-                """),
-                {'user_id': user_id}
-            ).fetchall()
-
-            # Collect role names
-            role_names = [role[0] for role in roles]
-
             return TokenResponse(
                 message="Login successful",
                 token=token,
@@ -110,6 +142,8 @@ async def login(user_data: UserLogin):
 
     except HTTPException:
         raise
+    except PoolSaturatedError:
+        raise handle_service_unavailable_error("Too many concurrent logins, please retry")
     except Exception as e:
         logger.error(f"Error during login: {e}")
         raise handle_database_error(e, "login")
@@ -138,7 +172,7 @@ async def verify_token_endpoint(authorization: str = Header(None)):
     raise handle_unauthorized_error("Invalid or expired token")
 
 @router.post("/register", response_model=dict, status_code=status.HTTP_201_CREATED)
-async def create_user(user_data: UserCreate):
+async def create_user(user_data: UserCreate, db: AsyncSession = Depends(get_async_db('user_data'))):
     """Create a new user with the given username, email, and password."""
     username = user_data.username
     email = user_data.email
@@ -147,47 +181,27 @@ async def create_user(user_data: UserCreate):
     if not username or not email or not password:
         raise handle_validation_error("credentials", "Username, email, and password are required")
 
-    hashed_password = hash_password(password)
+    try:
+        hashed_password = await hash_password_async(password)
+    except PoolSaturatedError:
+        raise handle_service_unavailable_error("Too many concurrent registrations, please retry")
 
     try:
-        db = next(get_db('user_data'))
-        
         # Start transaction
-        with db.begin():
-            # Check if username or email already exists
-            user_exists = db.execute(
-                text("SELECT 1 FROM users WHERE username = :username OR email = :email"),
-                {'username': username, 'email': email}
-            ).fetchone()
-
-            if user_exists:
+        async with db.begin():
+            result = (await db.execute(
+                CREATE_USER_SQL,
+                {'username': username, 'email': email, 'password_hash': hashed_password}
+            )).fetchone()
+
+            if result.user_id is None:
                 raise HTTPException(
                     status_code=status.HTTP_409_CONFLICT,
                     detail="Username or email already exists!"
                 )
-
-            # Insert new user
-            db.execute(
-                text("INSERT INTO users (username, email, password_hash) VALUES (:username, :email, :password_hash)"),
-                {'username': username, 'email': email, 'password_hash': hashed_password}
-            )
-
-            # Query the new user's ID
-            user_id = db.execute(
-                text("SELECT id FROM users WHERE username = :username"),
-                {'username': username}
-            ).fetchone()[0]
-
-            # Query the role ID for 'viewer'
-            role_id = db.execute(
-                text("SELECT id FROM user_role WHERE role_name = 'viewer'")
-            ).fetchone()[0]
-
-            # Insert into user_role_mapping
-            db.execute(
-                text("INSERT INTO user_role_mapping (user_id, role_id) VALUES (:user_id, :role_id)"),
-                {'user_id': user_id, 'role_id': role_id}
-            )
+            if result.roles_assigned == 0:
+                # Raising inside the transaction block rolls back the new user
+                raise RuntimeError("Default 'viewer' role is missing from user_role")
 
         return create_success_response(message="User created successfully")
 
@@ -200,41 +214,31 @@ async def create_user(user_data: UserCreate):
         raise handle_database_error(e, "user creation")
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_info(current_user: str = Depends(get_current_user)):
+async def get_current_user_info(current_user: str = Depends(get_current_user),
+                                db: AsyncSession = Depends(get_async_db('user_data', read_only=True))):
     """Get current user information."""
-    try:
-        db = next(get_db('user_data'))
-        
-        # Get user info
-        user_result = db.execute(
-            text("SELECT id, username, email FROM users WHERE username = :username"),
-            {'username': current_user}
-        ).fetchone()
-
-        if not user_result:
-            raise handle_not_found_error("User", f"username '{current_user}'")
+    cached = identity_cache.get(current_user)
+    if cached is not None:
+        return cached
+    generation = identity_cache.generation
 
-        user_id, username, email = user_result
+    try:
+        # Get user info and roles in one round trip
+        result = (await db.execute(USER_WITH_ROLES_SQL, {'username': current_user})).fetchone()
 
-        # Get user roles
-        roles = db.execute(
-            text("""
-                SELECT r.role_name
-                FROM user_role_mapping urm
-                JOIN user_role r ON urm.role_id = r.id
-                WHERE urm.user_id = :user_id
-            """),
-            {'user_id': user_id}
-        ).fetchall()
+        if not result:
+            raise handle_not_found_error("User", f"username '{current_user}'")
 
-        role_names = [role[0] for role in roles]
+        user_id, username, email, role_names = result.id, result.username, result.email, list(result.roles)
 
-        return UserResponse(
+        user = UserResponse(
             id=user_id,
             username=username,
             email=email,
             roles=role_names
         )
+        identity_cache.set(current_user, user, generation=generation)
+        return user
 
     except HTTPException:
         raise
@@ -1,13 +1,22 @@
 from enum import Enum
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime, date
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import text
 
 # Import utility functions
-from app.util.database import get_db
+from app.core.config import settings
+from app.util.cache import TTLCache, notify
+from app.util.database import get_async_db
+from app.util.http_cache import cache_headers, make_etag, negotiate_media_type, not_modified
+from app.util.json_response import JSONBytesResponse, rows_to_json
+from app.util.market_data import FIRST_PRICE_DATE_SQL, Frequency, price_version, resolve_frequency
+from app.util.price_cache import PRICE_CACHE_CHANNEL, invalidation_payload
+from app.util.price_export import EXPORT_MEDIA_TYPES, ExportFormat, stream_prices
 from app.util.response_helpers import (
     create_success_response, 
     handle_database_error, 
@@ -38,8 +47,35 @@ class InstrumentCreate(InstrumentBase):
 class InstrumentResponse(InstrumentBase):
     date_of_creation: Optional[date] = None
 
+
+# Response field -> securities column, used for field projection
+INSTRUMENT_COLUMNS = {
+    "symbol": "symbol",
+    "company_name": "company_name",
+    "instrument_type": "sec_type",
+    "description": "description",
+    "date_of_creation": "date_of_creation",
+}
+
+# In-process security-master caches. Writes invalidate them locally and send a
+# NOTIFY on INSTRUMENT_CACHE_CHANNEL so other replicas drop their copies too.
+INSTRUMENT_CACHE_CHANNEL = "instrument_cache"
+instrument_cache = TTLCache(maxsize=settings.INSTRUMENT_CACHE_SIZE, ttl=settings.INSTRUMENT_CACHE_TTL_SECONDS)
+instrument_list_cache = TTLCache(maxsize=settings.INSTRUMENT_LIST_CACHE_SIZE, ttl=settings.INSTRUMENT_CACHE_TTL_SECONDS)
+
+
+def invalidate_instrument_cache(symbol: str = "") -> None:
+    """Drop a symbol from the instrument caches; an empty symbol drops everything."""
+    if symbol:
+        instrument_cache.pop(symbol)
+    else:
+        instrument_cache.clear()
+    # Any cached page may contain the symbol
+    instrument_list_cache.clear()
+
 @router.post("/", response_model=InstrumentResponse, status_code=status.HTTP_201_CREATED)
-async def create_instrument(instrument_data: InstrumentCreate):
+async def create_instrument(instrument_data: InstrumentCreate,
+                            db: AsyncSession = Depends(get_async_db('sec_master'))):
     """Create a new financial instrument in the database."""
     
     # Validate mandatory fields
@@ -47,14 +83,11 @@ async def create_instrument(instrument_data: InstrumentCreate):
         raise handle_validation_error("symbol", "Symbol is mandatory and cannot be empty")
 
     try:
-        # Get database session
-        db = next(get_db('sec_master'))
-        
         # Check if instrument already exists (Symbol should be unique)
-        existing_instrument = db.execute(
+        existing_instrument = (await db.execute(
             text("SELECT 1 FROM securities WHERE symbol = :symbol"),
             {'symbol': instrument_data.symbol.strip()}
-        ).fetchone()
+        )).fetchone()
 
         if existing_instrument:
             raise HTTPException(
@@ -63,7 +96,7 @@ async def create_instrument(instrument_data: InstrumentCreate):
             )
 
         # Insert new instrument
-        result = db.execute(
+        result = await db.execute(
             text("""
                 INSERT INTO securities (symbol, company_name, sec_type, description)
                 VALUES (:symbol, :company_name, :sec_type, :description)
@@ -81,7 +114,9 @@ async def create_instrument(instrument_data: InstrumentCreate):
         new_instrument = result.fetchone()
         
         # Commit the transaction
-        db.commit()
+        await notify(db, INSTRUMENT_CACHE_CHANNEL, new_instrument[0])
+        await db.commit()
+        invalidate_instrument_cache(new_instrument[0])
         
         logger.info(f"Instrument created successfully: Symbol={instrument_data.symbol}")
         
@@ -96,53 +131,204 @@ async def create_instrument(instrument_data: InstrumentCreate):
     except HTTPException:
         raise
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Database integrity error creating instrument: {e}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid data provided for instrument creation"
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error creating instrument: {e}")
         raise handle_database_error(e, "instrument creation")
 
-@router.get("/", response_model=List[InstrumentResponse])
-async def get_instruments():
-    """Get all financial instruments."""
+def _instrument_page_response(request: Request, body: bytes, next_after: Optional[str], etag: str) -> Response:
+    """Response for a serialized page of instruments, or a 304 if the client's copy is current."""
+    unchanged = not_modified(request, None, etag, settings.HTTP_CACHE_INSTRUMENTS_MAX_AGE)
+    if unchanged is not None:
+        return unchanged
+    headers = cache_headers(etag, settings.HTTP_CACHE_INSTRUMENTS_MAX_AGE)
+    if next_after:
+        headers["X-Next-After"] = next_after
+    return JSONBytesResponse(content=body, headers=headers)
+
+@router.get("/", response_model=List[InstrumentResponse], response_model_exclude_unset=True)
+async def get_instruments(
+    request: Request,
+    after: Optional[str] = Query(None, description="Return instruments with a symbol after this one"),
+    limit: int = Query(settings.INSTRUMENTS_PAGE_SIZE, ge=1, le=settings.INSTRUMENTS_MAX_PAGE_SIZE),
+    fields: Optional[List[str]] = Query(None, description="Fields to return (symbol is always included)"),
+    sec_type: Optional[InstrumentType] = None,
+    db: AsyncSession = Depends(get_async_db('sec_master', read_only=True))
+):
+    """Get financial instruments, paginated by symbol.
+
+    The symbol to pass as `after` for the next page is returned in the
+    X-Next-After header; it is absent on the last page. The ETag is a hash of
+    the page, so clients polling an unchanged page get a 304. Pages are
+    serialized straight from the rows to JSON once and cached as bytes.
+    """
+    fields = ["symbol"] + [field for field in dict.fromkeys(fields or INSTRUMENT_COLUMNS) if field != "symbol"]
+    unknown = [field for field in fields if field not in INSTRUMENT_COLUMNS]
+    if unknown:
+        raise handle_validation_error("fields", f"Unknown fields: {', '.join(unknown)}")
+
+    cache_key = (after, limit, tuple(fields), sec_type)
+    cached = instrument_list_cache.get(cache_key)
+    if cached is not None:
+        return _instrument_page_response(request, *cached)
+    # A page read before a concurrent write's invalidation must not be cached
+    generation = instrument_list_cache.generation
+
+    # Only add the filters that were requested so every parameter has a single, known type
+    conditions = []
+    params = {'limit': limit + 1}
+    if after is not None:
+        conditions.append("symbol > :after")
+        params['after'] = after
+    if sec_type is not None:
+        conditions.append("sec_type = :sec_type")
+        params['sec_type'] = sec_type.value
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
     try:
-        db = next(get_db('sec_master'))
-        
-        result = db.execute(
-            text("SELECT symbol, company_name, sec_type, description, date_of_creation FROM securities")
+        # Fetch one extra row to find out whether another page follows
+        result = await db.execute(
+            text(f"""
+                SELECT {', '.join(INSTRUMENT_COLUMNS[field] for field in fields)}
+                FROM securities
+                {where_clause}
+                ORDER BY symbol
+                LIMIT :limit
+            """),
+            params
         )
-        
-        instruments: List[InstrumentResponse] = []
-        for row in result.fetchall():
-            instruments.append(InstrumentResponse(
-                symbol=row[0],
-                company_name=row[1],
-                instrument_type=row[2],
-                description=row[3],
-                date_of_creation=row[4]
-            ))
-        
-        return instruments
+        rows = result.fetchall()
+
+        next_after = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_after = rows[-1][0]
+
+        # sec_type codes are the InstrumentType values, so rows serialize as-is
+        body = rows_to_json(fields, rows)
+        page = (body, next_after, make_etag(body.decode(), next_after))
+        instrument_list_cache.set(cache_key, page, generation=generation)
+        return _instrument_page_response(request, *page)
 
     except Exception as e:
         logger.error(f"Error retrieving instruments: {e}")
         raise handle_database_error(e, "retrieving instruments")
 
+async def _price_stream_response(request: Request, db: AsyncSession, symbols: List[str], start_date: Optional[date],
+                                 end_date: Optional[date], export_format: Optional[ExportFormat], frequency: Frequency,
+                                 filename: str) -> Response:
+    """Build a streaming response for a price export, or a 304 if the client's copy is current.
+
+    Without a format parameter the format is negotiated from the Accept header.
+    The ETag is derived from the version (row count and latest updated_at) of
+    the exported prices, so an unchanged export is never re-read or re-encoded.
+    """
+    if export_format is None:
+        formats = {media_type: fmt for fmt, media_type in EXPORT_MEDIA_TYPES.items()}
+        export_format = formats[negotiate_media_type(request, list(formats))]
+
+    try:
+        history_start = start_date
+        if frequency == Frequency.auto and start_date is None:
+            history_start = (await db.execute(
+                FIRST_PRICE_DATE_SQL, {'symbols': symbols, 'portfolio_ids': None}
+            )).scalar()
+        frequency = resolve_frequency(frequency, history_start, end_date, settings.PRICE_HISTORY_MAX_POINTS)
+        version = tuple((await db.execute(
+            price_version(frequency),
+            {'symbols': symbols, 'start_date': start_date, 'end_date': end_date}
+        )).fetchone())
+
+    except Exception as e:
+        logger.error(f"Error reading price version for export: {e}")
+        raise handle_database_error(e, "exporting prices")
+
+    etag = make_etag("prices", symbols, start_date, end_date, export_format.value, frequency.value, version)
+    unchanged = not_modified(request, None, etag, settings.HTTP_CACHE_PRICES_MAX_AGE)
+    if unchanged is not None:
+        unchanged.headers["Vary"] = "Accept"
+        return unchanged
+
+    return StreamingResponse(
+        stream_prices(symbols, start_date, end_date, export_format, frequency),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{export_format.value}"',
+            "X-Price-Frequency": frequency.value,
+            "Vary": "Accept",
+            **cache_headers(etag, settings.HTTP_CACHE_PRICES_MAX_AGE)
+        }
+    )
+
+@router.get("/prices")
+async def export_prices(
+    request: Request,
+    symbols: List[str] = Query(..., description="Symbols to export"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    format: Optional[ExportFormat] = Query(None, description="Defaults to the Accept header, else NDJSON"),
+    frequency: Frequency = Query(Frequency.daily, description="Daily, weekly or monthly bars; auto fits the date range"),
+    db: AsyncSession = Depends(get_async_db('sec_master', read_only=True))
+):
+    """Stream price history for several symbols as NDJSON, CSV, Arrow IPC or Parquet."""
+    symbols = list(dict.fromkeys(symbol.strip() for symbol in symbols if symbol.strip()))
+    if not symbols:
+        raise handle_validation_error("symbols", "At least one symbol is required")
+
+    return await _price_stream_response(request, db, symbols, start_date, end_date, format, frequency, "prices")
+
+@router.get("/{symbol}/prices")
+async def export_symbol_prices(
+    symbol: str,
+    request: Request,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    format: Optional[ExportFormat] = Query(None, description="Defaults to the Accept header, else NDJSON"),
+    frequency: Frequency = Query(Frequency.daily, description="Daily, weekly or monthly bars; auto fits the date range"),
+    db: AsyncSession = Depends(get_async_db('sec_master', read_only=True))
+):
+    """Stream the price history of a symbol as NDJSON, CSV, Arrow IPC or Parquet."""
+    try:
+        exists = (await db.execute(
+            text("SELECT 1 FROM securities WHERE symbol = :symbol"),
+            {'symbol': symbol}
+        )).fetchone()
+
+    except Exception as e:
+        logger.error(f"Error looking up instrument for price export: {e}")
+        raise handle_database_error(e, "exporting prices")
+
+    if not exists:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Instrument with symbol '{symbol}' not found"
+        )
+
+    return await _price_stream_response(
+        request, db, [symbol], start_date, end_date, format, frequency, f"{symbol}_prices"
+    )
+
 @router.get("/{symbol}", response_model=InstrumentResponse)
-async def get_instrument_by_symbol(symbol: str):
+async def get_instrument_by_symbol(symbol: str, request: Request, response: Response,
+                                   db: AsyncSession = Depends(get_async_db('sec_master', read_only=True))):
     """Get a specific financial instrument by symbol."""
+    cached = instrument_cache.get(symbol)
+    if cached is not None:
+        etag = make_etag(cached.model_dump(mode="json"))
+        return not_modified(request, response, etag, settings.HTTP_CACHE_INSTRUMENTS_MAX_AGE) or cached
+    generation = instrument_cache.generation
+
     try:
-        db = next(get_db('sec_master'))
-        
-        result = db.execute(
+        result = (await db.execute(
             text("SELECT symbol, company_name, sec_type, description, date_of_creation FROM securities WHERE symbol = :symbol"),
             {'symbol': symbol}
-        ).fetchone()
+        )).fetchone()
 
         if not result:
             raise HTTPException(
@@ -150,13 +336,16 @@ async def get_instrument_by_symbol(symbol: str):
                 detail=f"Instrument with symbol '{symbol}' not found"
             )
 
-        return InstrumentResponse(
+        instrument = InstrumentResponse(
             symbol=result[0],
             company_name=result[1],
             instrument_type=result[2],
             description=result[3],
             date_of_creation=result[4]
         )
+        instrument_cache.set(symbol, instrument, generation=generation)
+        etag = make_etag(instrument.model_dump(mode="json"))
+        return not_modified(request, response, etag, settings.HTTP_CACHE_INSTRUMENTS_MAX_AGE) or instrument
 
     except HTTPException:
         raise
@@ -165,16 +354,15 @@ async def get_instrument_by_symbol(symbol: str):
         raise handle_database_error(e, "retrieving instrument")
 
 @router.put("/{symbol}", response_model=InstrumentResponse)
-async def update_instrument(symbol: str, instrument_data: InstrumentCreate):
+async def update_instrument(symbol: str, instrument_data: InstrumentCreate,
+                            db: AsyncSession = Depends(get_async_db('sec_master'))):
     """Update an existing financial instrument."""
     try:
-        db = next(get_db('sec_master'))
-        
         # Check if instrument exists
-        existing = db.execute(
+        existing = (await db.execute(
             text("SELECT 1 FROM securities WHERE symbol = :symbol"),
             {'symbol': symbol}
-        ).fetchone()
+        )).fetchone()
 
         if not existing:
             raise HTTPException(
@@ -183,7 +371,7 @@ async def update_instrument(symbol: str, instrument_data: InstrumentCreate):
             )
 
         # Update the instrument
-        result = db.execute(
+        result = await db.execute(
             text("""
                 UPDATE securities 
                 SET company_name = :company_name, sec_type = :sec_type, 
@@ -200,7 +388,9 @@ async def update_instrument(symbol: str, instrument_data: InstrumentCreate):
         )
         
         updated_instrument = result.fetchone()
-        db.commit()
+        await notify(db, INSTRUMENT_CACHE_CHANNEL, symbol)
+        await db.commit()
+        invalidate_instrument_cache(symbol)
         
         logger.info(f"Instrument updated successfully: Symbol={symbol}")
         
@@ -215,17 +405,15 @@ async def update_instrument(symbol: str, instrument_data: InstrumentCreate):
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error updating instrument: {e}")
         raise handle_database_error(e, "updating instrument")
 
 @router.delete("/{symbol}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_instrument(symbol: str):
+async def delete_instrument(symbol: str, db: AsyncSession = Depends(get_async_db('sec_master'))):
     """Delete a financial instrument."""
     try:
-        db = next(get_db('sec_master'))
-        
-        result = db.execute(
+        result = await db.execute(
             text("DELETE FROM securities WHERE symbol = :symbol"),
             {'symbol': symbol}
         )
@@ -236,12 +424,17 @@ async def delete_instrument(symbol: str):
                 detail=f"Instrument with symbol '{symbol}' not found"
             )
         
-        db.commit()
+        # The delete cascades to the symbol's prices, rollups and metric state, so
+        # cached series and return matrices must not outlive it
+        await notify(db, INSTRUMENT_CACHE_CHANNEL, symbol)
+        await notify(db, PRICE_CACHE_CHANNEL, invalidation_payload({symbol: None}))
+        await db.commit()
+        invalidate_instrument_cache(symbol)
         logger.info(f"Instrument deleted successfully: Symbol={symbol}")
         
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error deleting instrument: {e}")
         raise handle_database_error(e, "deleting instrument")
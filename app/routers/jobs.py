@@ -0,0 +1,195 @@
+import json
+from enum import Enum
+from fastapi import APIRouter, HTTPException, status, Depends
+from typing import Any, Dict, Optional
+from pydantic import BaseModel, ValidationError
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import text
+
+# Import utility functions
+from app.routers.metrics import (
+    MetricStateRefreshRequest,
+    ReturnMatrixRequest,
+    UniverseMetricsRequest,
+    compute_return_matrix,
+    prepare_universe_metrics
+)
+from app.routers.portfolio import NavRefreshRequest
+from app.routers.prices import RollupRefreshRequest
+from app.core.config import settings
+from app.util.cache import notify
+from app.util.database import get_async_db
+from app.util.jobs import JOB_CHANNEL, JobStatus, job_key
+from app.util.metric_state import refresh_metric_state
+from app.util.portfolio_nav import refresh_portfolio_nav
+from app.util.price_rollup import refresh_price_rollups
+from app.util.response_helpers import handle_database_error, handle_not_found_error, handle_validation_error
+from app.util.logger import logger
+
+router = APIRouter()
+
+# Pydantic Models
+class JobType(Enum):
+    universe_metrics = "universe_metrics"
+    return_matrix = "return_matrix"
+    metric_state = "metric_state"
+    price_rollups = "price_rollups"
+    portfolio_nav = "portfolio_nav"
+
+class JobCreate(BaseModel):
+    job_type: JobType
+    # Same body as the synchronous endpoint for the job type
+    params: Dict[str, Any] = {}
+
+class JobResponse(BaseModel):
+    id: int
+    job_type: JobType
+    status: JobStatus
+    attempts: int
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    last_seen_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    # Set on submission when an identical job was already queued or running
+    deduplicated: Optional[bool] = None
+
+
+# Request model for each job type's parameters
+JOB_PARAMS = {
+    JobType.universe_metrics: UniverseMetricsRequest,
+    JobType.return_matrix: ReturnMatrixRequest,
+    JobType.metric_state: MetricStateRefreshRequest,
+    JobType.price_rollups: RollupRefreshRequest,
+    JobType.portfolio_nav: NavRefreshRequest,
+}
+
+JOB_COLUMNS = "id, job_type, status, attempts, error, created_at, started_at, last_seen_at, finished_at"
+
+
+def _run_universe_metrics(db, request: UniverseMetricsRequest) -> dict:
+    frequency, dates, missing_symbols, chunks = prepare_universe_metrics(request)
+    metrics, observations = {}, {}
+    for chunk in chunks:
+        metrics.update(chunk["metrics"])
+        observations.update(chunk["observations"])
+    return {
+        "frequency": frequency.value,
+        "start_date": dates[0].item() if len(dates) else None,
+        "end_date": dates[-1].item() if len(dates) else None,
+        "metrics": metrics,
+        "observations": observations,
+        "missing_symbols": missing_symbols,
+    }
+
+
+def _run_return_matrix(db, request: ReturnMatrixRequest) -> dict:
+    return compute_return_matrix(request, max_symbols=settings.METRICS_MATRIX_JOB_MAX_SYMBOLS)
+
+
+def _run_metric_state(db, request: MetricStateRefreshRequest) -> dict:
+    return {"updated": refresh_metric_state(db, request.symbols, request.price_field, rebuild=request.rebuild)}
+
+
+def _run_price_rollups(db, request: RollupRefreshRequest) -> dict:
+    since_by_symbol = None if request.symbols is None else dict.fromkeys(request.symbols)
+    return {"written": refresh_price_rollups(db, since_by_symbol)}
+
+
+def _run_portfolio_nav(db, request: NavRefreshRequest) -> dict:
+    return refresh_portfolio_nav(db, request.portfolio_ids, rebuild=request.rebuild)
+
+
+JOB_HANDLERS = {
+    JobType.universe_metrics: _run_universe_metrics,
+    JobType.return_matrix: _run_return_matrix,
+    JobType.metric_state: _run_metric_state,
+    JobType.price_rollups: _run_price_rollups,
+    JobType.portfolio_nav: _run_portfolio_nav,
+}
+
+
+def run_job(db, job_type: str, params: dict) -> dict:
+    """Run one queued job on the worker's session; the worker commits its writes with the result."""
+    job_type = JobType(job_type)
+    return JOB_HANDLERS[job_type](db, JOB_PARAMS[job_type](**params))
+
+
+@router.post("/", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(job: JobCreate, db: AsyncSession = Depends(get_async_db('sec_master'))):
+    """Queue a long-running job, or return the identical job that is already queued or running."""
+    try:
+        params = JOB_PARAMS[job.job_type](**job.params).model_dump(mode="json")
+    except ValidationError as e:
+        raise handle_validation_error("params", str(e))
+
+    key = job_key(job.job_type.value, params)
+    try:
+        # An identical job may finish between the conflicting insert and the lookup; try again then
+        for _ in range(3):
+            created = (await db.execute(
+                text(f"""
+                    INSERT INTO metric_job (job_type, params, job_key)
+                    VALUES (:job_type, CAST(:params AS JSONB), :job_key)
+                    ON CONFLICT (job_key) WHERE status IN ('queued', 'running') DO NOTHING
+                    RETURNING {JOB_COLUMNS}
+                """),
+                {'job_type': job.job_type.value, 'params': json.dumps(params), 'job_key': key}
+            )).fetchone()
+            if created:
+                await notify(db, JOB_CHANNEL, str(created.id))
+                await db.commit()
+                logger.info(f"Queued job {created.id} ({job.job_type.value})")
+                return JobResponse(**created._mapping, deduplicated=False)
+
+            existing = (await db.execute(
+                text(f"""
+                    SELECT {JOB_COLUMNS} FROM metric_job
+                    WHERE job_key = :job_key AND status IN ('queued', 'running')
+                """),
+                {'job_key': key}
+            )).fetchone()
+            if existing:
+                await db.commit()
+                return JobResponse(**existing._mapping, deduplicated=True)
+
+        raise RuntimeError("could not queue or find the job")
+
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error submitting {job.job_type.value} job: {e}")
+        raise handle_database_error(e, "submitting job")
+
+
+async def _load_job(db: AsyncSession, job_id: int, columns: str):
+    try:
+        row = (await db.execute(
+            text(f"SELECT {columns} FROM metric_job WHERE id = :id"),
+            {'id': job_id}
+        )).fetchone()
+    except Exception as e:
+        logger.error(f"Error retrieving job {job_id}: {e}")
+        raise handle_database_error(e, "retrieving job")
+
+    if not row:
+        raise handle_not_found_error("Job", f"id {job_id}")
+    return row
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: int, db: AsyncSession = Depends(get_async_db('sec_master'))):
+    """Status of a job."""
+    return JobResponse(**(await _load_job(db, job_id, JOB_COLUMNS))._mapping)
+
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: int, db: AsyncSession = Depends(get_async_db('sec_master'))):
+    """Result of a succeeded job; 409 while it is queued or running, or if it failed."""
+    row = await _load_job(db, job_id, "status, error, result")
+    if row.status != JobStatus.succeeded.value:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job {job_id} is {row.status}" + (f": {row.error}" if row.error else "")
+        )
+    return row.result
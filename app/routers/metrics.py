@@ -0,0 +1,733 @@
+from enum import Enum
+from fastapi import APIRouter, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
+from datetime import date
+import numpy as np
+
+# Import utility functions
+from app.core.config import settings
+from app.util.cache import TTLCache
+from app.util.columnar import (
+    TableFormat,
+    iter_table_bytes,
+    negotiate_table_format,
+    record_batch,
+    table_bytes,
+    with_metadata
+)
+from app.util.database import get_db
+from app.util.http_cache import cache_headers, make_etag, not_modified
+from app.util.json_response import dumps
+from app.util.market_data import (
+    PERIODS_PER_YEAR,
+    Frequency,
+    PriceField,
+    first_price_date,
+    resolve_frequency,
+    universe_symbols
+)
+from app.util.parallel_metrics import SharedPanel, iter_panel_metrics
+from app.util.portfolio_nav import load_unit_value_panel
+from app.util.price_cache import (
+    cached_first_price_date,
+    cached_price_panel,
+    cached_price_series,
+    cached_price_version
+)
+from app.util.metric_state import load_metric_state, refresh_metric_state
+from app.util.metrics import (
+    DEFAULT_ROLLING_WINDOWS,
+    METRIC_NAMES,
+    ROLLING_METRIC_NAMES,
+    TRADING_DAYS_PER_YEAR,
+    compute_metrics,
+    compute_panel_metrics,
+    compute_return_covariance,
+    compute_rolling_metrics,
+    metrics_from_state
+)
+from app.util.response_helpers import create_success_response, handle_database_error, handle_validation_error
+from app.util.logger import logger
+
+router = APIRouter()
+
+# Pydantic Models
+class MetricsResponse(BaseModel):
+    symbol: str
+    price_field: PriceField
+    frequency: Frequency = Frequency.daily
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    observations: int
+    total_return: Optional[float] = None
+    annualized_return: Optional[float] = None
+    volatility: Optional[float] = None
+    sharpe_ratio: Optional[float] = None
+    max_drawdown: Optional[float] = None
+
+class RollingMetricsResponse(BaseModel):
+    symbol: str
+    price_field: PriceField
+    dates: List[date]
+    windows: Dict[int, Dict[str, List[Optional[float]]]]
+
+class BatchMetricsRequest(BaseModel):
+    symbols: List[str] = []
+    # Portfolios are measured on the unit value of their materialized NAV series
+    portfolio_ids: List[str] = []
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    metrics: Optional[List[str]] = None
+    price_field: PriceField = PriceField.close_price
+    frequency: Frequency = Frequency.auto
+    risk_free_rate: float = 0.0
+    # Defaults to the number of periods per year at the resolved frequency
+    periods_per_year: Optional[int] = Field(None, gt=0)
+
+class BatchMetricsResponse(BaseModel):
+    price_field: PriceField
+    frequency: Frequency
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    metrics: Dict[str, Dict[str, Optional[float]]]
+    observations: Dict[str, int]
+    portfolio_metrics: Dict[str, Dict[str, Optional[float]]] = {}
+    portfolio_observations: Dict[str, int] = {}
+    missing_symbols: List[str] = []
+    missing_portfolios: List[str] = []
+
+class MetricStateRefreshRequest(BaseModel):
+    symbols: Optional[List[str]] = None
+    price_field: PriceField = PriceField.close_price
+    rebuild: bool = False
+
+class UniverseMetricsRequest(BaseModel):
+    # Defaults to every symbol in securities
+    symbols: Optional[List[str]] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    metrics: Optional[List[str]] = None
+    price_field: PriceField = PriceField.close_price
+    frequency: Frequency = Frequency.auto
+    risk_free_rate: float = 0.0
+    periods_per_year: Optional[int] = Field(None, gt=0)
+    chunk_size: Optional[int] = Field(None, gt=0)
+
+class MatrixKind(Enum):
+    correlation = "correlation"
+    covariance = "covariance"
+
+class Shrinkage(Enum):
+    none = "none"
+    ledoit_wolf = "ledoit_wolf"
+
+class ReturnMatrixRequest(BaseModel):
+    symbols: List[str] = Field(..., min_length=1)
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    kind: MatrixKind = MatrixKind.correlation
+    shrinkage: Shrinkage = Shrinkage.none
+    # Pairs with fewer common returns than this are null
+    min_observations: int = Field(2, ge=2)
+    price_field: PriceField = PriceField.close_price
+    frequency: Frequency = Frequency.auto
+    # Annualizes the covariance; defaults to the number of periods per year at the resolved frequency
+    periods_per_year: Optional[int] = Field(None, gt=0)
+
+class ReturnMatrixResponse(BaseModel):
+    kind: MatrixKind
+    price_field: PriceField
+    frequency: Frequency
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    symbols: List[str]
+    # Rows and columns follow symbols
+    matrix: List[List[Optional[float]]]
+    observations: Dict[str, int]
+    shrinkage: Shrinkage
+    shrinkage_intensity: float
+    missing_symbols: List[str] = []
+
+
+# Serialized metric responses keyed by ETag, which covers the request and the version of its prices
+metrics_response_cache = TTLCache(maxsize=settings.METRICS_RESPONSE_CACHE_SIZE,
+                                  ttl=settings.METRICS_RESPONSE_CACHE_TTL_SECONDS)
+
+# Prefix of the per-symbol columns of tabular matrix responses, so a symbol can never
+# collide with the symbol and observations columns
+MATRIX_COLUMN_PREFIX = "matrix."
+
+# Return matrices keyed by universe, date range and estimation options
+matrix_cache = TTLCache(maxsize=settings.METRICS_MATRIX_CACHE_SIZE, ttl=settings.METRICS_MATRIX_CACHE_TTL_SECONDS,
+                        maxbytes=settings.METRICS_MATRIX_CACHE_MAX_BYTES, sizeof=lambda result: result["matrix"].nbytes)
+
+
+def invalidate_matrix_cache(payload: str = "") -> None:
+    """Drop every cached return matrix; run on each price load notification."""
+    matrix_cache.clear()
+
+
+def _revalidate(request: Request, db, symbol: str, start_date: Optional[date], end_date: Optional[date],
+                price_field: PriceField, frequency: Frequency, table_format: TableFormat,
+                version: Optional[tuple] = None):
+    """ETag of a metrics GET and, if it can be answered without computing, the 304 or cached response.
+
+    The ETag is keyed by version, by default the data version of the prices in the range.
+    """
+    if version is None:
+        version = cached_price_version(db, symbol, start_date, end_date, price_field, frequency)
+    etag = make_etag("metrics", request.url.path, sorted(request.query_params.multi_items()), frequency.value,
+                     table_format.value, tuple(version))
+    unchanged = not_modified(request, None, etag, settings.HTTP_CACHE_PRICES_MAX_AGE)
+    if unchanged is not None:
+        unchanged.headers["Vary"] = "Accept"
+        return etag, unchanged
+    body = metrics_response_cache.get(etag)
+    return etag, None if body is None else _metrics_response(body, table_format, etag)
+
+
+def _metrics_response(body: bytes, table_format: TableFormat, etag: Optional[str] = None) -> Response:
+    """Serialized metrics response in its negotiated format, with cache headers when it has an ETag."""
+    headers = {"Vary": "Accept"}
+    if etag is not None:
+        headers.update(cache_headers(etag, settings.HTTP_CACHE_PRICES_MAX_AGE))
+    return Response(content=body, media_type=table_format.value, headers=headers)
+
+
+def _metrics_body(result: MetricsResponse, table_format: TableFormat) -> bytes:
+    """A symbol's metrics as a JSON object, or as a one-row table."""
+    if table_format == TableFormat.json:
+        return dumps(result.model_dump(mode="json"))
+    return table_bytes(
+        {name: [value.value if isinstance(value, Enum) else value] for name, value in result.model_dump().items()},
+        table_format
+    )
+
+
+@router.get("/", response_model=List[str])
+async def get_metric_names():
+    """List the metrics that can be computed."""
+    return list(METRIC_NAMES)
+
+@router.get("/{symbol}", response_model=MetricsResponse)
+def get_symbol_metrics(
+    symbol: str,
+    request: Request,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    price_field: PriceField = PriceField.close_price,
+    frequency: Frequency = Query(Frequency.auto, description="Price frequency; auto picks one from the date range"),
+    risk_free_rate: float = Query(0.0, description="Annual risk-free rate used for the Sharpe ratio"),
+    periods_per_year: Optional[int] = Query(None, gt=0, description="Defaults to the periods per year at the frequency")
+):
+    """Compute total return, annualized return, volatility, Sharpe ratio and maximum drawdown for a symbol.
+
+    Long date ranges are computed from weekly or monthly rollups unless a frequency is given.
+    Declared sync, like /matrix, so the query and the NumPy work run in the threadpool.
+    Returned as JSON, or as a one-row Arrow IPC stream or Parquet file if the Accept header asks for one.
+    """
+    table_format = negotiate_table_format(request)
+
+    db_session = get_db('sec_master', read_only=True)
+    try:
+        db = next(db_session)
+
+        # Full-history requests are answered from the running metric state without reading
+        # prices, so they stay daily; other open-ended ranges start at the first price date
+        if start_date is None and end_date is None and frequency == Frequency.auto:
+            frequency = Frequency.daily
+        frequency = resolve_frequency(
+            frequency, cached_first_price_date(db, symbol, frequency, start_date, price_field), end_date,
+            settings.PRICE_HISTORY_MAX_POINTS
+        )
+        periods_per_year = periods_per_year or PERIODS_PER_YEAR[frequency]
+
+        # Full-history daily requests are answered from the running state kept up to date on
+        # ingest, versioned by the state itself; a state behind its prices falls through
+        state = None
+        if start_date is None and end_date is None and frequency == Frequency.daily:
+            state = load_metric_state(db, symbol, price_field)
+
+        version = ("state", state['last_date'], state['updated_at']) if state else None
+        etag, cached = _revalidate(request, db, symbol, start_date, end_date, price_field, frequency, table_format,
+                                   version)
+        if cached is not None:
+            return cached
+
+        if state:
+            result = MetricsResponse(
+                symbol=symbol,
+                price_field=price_field,
+                start_date=state['first_date'],
+                end_date=state['last_date'],
+                observations=state['return_count'] + 1,
+                **metrics_from_state(state, periods_per_year=periods_per_year, risk_free_rate=risk_free_rate)
+            )
+            body = _metrics_body(result, table_format)
+            metrics_response_cache.set(etag, body)
+            return _metrics_response(body, table_format, etag)
+
+        dates, prices = cached_price_series(db, symbol, start_date, end_date, price_field, frequency)
+
+        if not dates:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"No market prices found for symbol '{symbol}'"
+            )
+
+        metrics = compute_metrics(prices, periods_per_year=periods_per_year, risk_free_rate=risk_free_rate)
+
+        result = MetricsResponse(
+            symbol=symbol,
+            price_field=price_field,
+            frequency=frequency,
+            start_date=dates[0],
+            end_date=dates[-1],
+            observations=len(dates),
+            **metrics
+        )
+        body = _metrics_body(result, table_format)
+        metrics_response_cache.set(etag, body)
+        return _metrics_response(body, table_format, etag)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error computing metrics for {symbol}: {e}")
+        raise handle_database_error(e, "computing metrics")
+    finally:
+        db_session.close()
+
+@router.get("/{symbol}/rolling", response_model=RollingMetricsResponse)
+def get_symbol_rolling_metrics(
+    symbol: str,
+    request: Request,
+    windows: List[int] = Query(list(DEFAULT_ROLLING_WINDOWS), description="Window lengths in trading days"),
+    metrics: Optional[List[str]] = Query(None, description="Rolling metrics to return (default: all)"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    price_field: PriceField = PriceField.close_price,
+    risk_free_rate: float = Query(0.0, description="Annual risk-free rate used for the Sharpe ratio"),
+    periods_per_year: int = Query(TRADING_DAYS_PER_YEAR, gt=0)
+):
+    """Rolling volatility, Sharpe ratio and drawdown time series for a symbol over one or more windows.
+
+    Arrow IPC stream and Parquet responses (chosen by the Accept header) hold
+    one row per date and window, with the symbol and price field as metadata.
+    """
+    windows = sorted(set(windows))
+    if any(window < 2 or window > settings.METRICS_ROLLING_MAX_WINDOW for window in windows):
+        raise handle_validation_error(
+            "windows", f"Windows must be between 2 and {settings.METRICS_ROLLING_MAX_WINDOW} days"
+        )
+
+    metric_names = metrics or list(ROLLING_METRIC_NAMES)
+    unknown = sorted(set(metric_names) - set(ROLLING_METRIC_NAMES))
+    if unknown:
+        raise handle_validation_error("metrics", f"Unknown rolling metrics: {', '.join(unknown)}")
+
+    db_session = get_db('sec_master', read_only=True)
+    try:
+        db = next(db_session)
+
+        table_format = negotiate_table_format(request)
+        etag, cached = _revalidate(
+            request, db, symbol, start_date, end_date, price_field, Frequency.daily, table_format
+        )
+        if cached is not None:
+            return cached
+
+        dates, prices = cached_price_series(db, symbol, start_date, end_date, price_field)
+
+        if not dates:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"No market prices found for symbol '{symbol}'"
+            )
+
+        results = compute_rolling_metrics(
+            prices, windows, periods_per_year=periods_per_year, risk_free_rate=risk_free_rate
+        )
+
+        if table_format == TableFormat.json:
+            # The series go to orjson as arrays (NaN becomes null) instead of through RollingMetricsResponse
+            body = dumps({
+                "symbol": symbol,
+                "price_field": price_field.value,
+                "dates": dates,
+                "windows": {
+                    window: {name: series[name] for name in metric_names}
+                    for window, series in results.items()
+                },
+            })
+        else:
+            body = table_bytes(
+                {
+                    "date": np.tile(np.array(dates, dtype="datetime64[D]"), len(windows)),
+                    "window": np.repeat(windows, len(dates)),
+                    **{name: np.concatenate([results[window][name] for window in windows]) for name in metric_names},
+                },
+                table_format,
+                metadata={"symbol": symbol, "price_field": price_field.value}
+            )
+        metrics_response_cache.set(etag, body)
+        return _metrics_response(body, table_format, etag)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error computing rolling metrics for {symbol}: {e}")
+        raise handle_database_error(e, "computing rolling metrics")
+    finally:
+        db_session.close()
+
+def _metrics_by_key(keys: List[str], results: Dict[str, np.ndarray], metric_names: List[str]):
+    """Per-key metric dicts and observation counts from panel metric columns."""
+    # Convert each metric column once; orjson writes NaN/inf as null
+    columns = {name: results[name].tolist() for name in metric_names}
+    metrics = {key: {name: columns[name][i] for name in metric_names} for i, key in enumerate(keys)}
+    return metrics, dict(zip(keys, results["observations"].tolist()))
+
+@router.post("/batch", response_model=BatchMetricsResponse)
+def get_batch_metrics(request: BatchMetricsRequest, http_request: Request):
+    """Compute metrics for many symbols and portfolios over a date range in a single request.
+
+    Portfolios are measured on the unit value of their materialized NAV series.
+    Arrow IPC stream and Parquet responses (chosen by the Accept header) hold
+    one row per symbol and portfolio; the other response fields are schema metadata.
+    """
+    symbols = list(dict.fromkeys(symbol.strip() for symbol in request.symbols if symbol.strip()))
+    portfolio_ids = list(dict.fromkeys(
+        portfolio_id.strip() for portfolio_id in request.portfolio_ids if portfolio_id.strip()
+    ))
+    if not symbols and not portfolio_ids:
+        raise handle_validation_error("symbols", "At least one symbol or portfolio id is required")
+    if len(symbols) + len(portfolio_ids) > settings.METRICS_BATCH_MAX_SYMBOLS:
+        raise handle_validation_error(
+            "symbols",
+            f"At most {settings.METRICS_BATCH_MAX_SYMBOLS} symbols and portfolios can be requested at once"
+        )
+
+    metric_names = request.metrics or list(METRIC_NAMES)
+    unknown = sorted(set(metric_names) - set(METRIC_NAMES))
+    if unknown:
+        raise handle_validation_error("metrics", f"Unknown metrics: {', '.join(unknown)}")
+
+    db_session = get_db('sec_master', read_only=True)
+    try:
+        db = next(db_session)
+
+        frequency = resolve_frequency(
+            request.frequency, first_price_date(db, symbols, request.frequency, request.start_date, portfolio_ids),
+            request.end_date, settings.PRICE_HISTORY_MAX_POINTS
+        )
+        periods_per_year = request.periods_per_year or PERIODS_PER_YEAR[frequency]
+
+        empty = (np.empty(0, dtype="datetime64[D]"), np.empty(0, dtype=str), np.empty((0, 0)))
+        symbol_dates, panel_symbols, panel = cached_price_panel(
+            db, symbols, request.start_date, request.end_date, request.price_field, frequency
+        ) if symbols else empty
+        results = compute_panel_metrics(panel, periods_per_year=periods_per_year,
+                                        risk_free_rate=request.risk_free_rate)
+        portfolio_dates, panel_portfolios, panel = load_unit_value_panel(
+            db, portfolio_ids, request.start_date, request.end_date, frequency
+        ) if portfolio_ids else empty
+        portfolio_results = compute_panel_metrics(panel, periods_per_year=periods_per_year,
+                                                  risk_free_rate=request.risk_free_rate)
+
+        symbol_keys = panel_symbols.tolist()
+        portfolio_keys = panel_portfolios.tolist()
+        dates = np.concatenate([symbol_dates, portfolio_dates])
+        summary = {
+            "price_field": request.price_field.value,
+            "frequency": frequency.value,
+            "start_date": dates.min().item() if len(dates) else None,
+            "end_date": dates.max().item() if len(dates) else None,
+        }
+        found = set(symbol_keys) | set(portfolio_keys)
+        missing = {
+            "missing_symbols": [symbol for symbol in symbols if symbol not in found],
+            "missing_portfolios": [portfolio_id for portfolio_id in portfolio_ids if portfolio_id not in found],
+        }
+
+        logger.info(
+            f"Computed batch metrics for {len(symbol_keys)} symbols and {len(portfolio_keys)} portfolios"
+        )
+
+        table_format = negotiate_table_format(http_request)
+        if table_format != TableFormat.json:
+            # Symbol rows first, then portfolio rows; the portfolio_id column is only added when asked for
+            columns = {"symbol": symbol_keys + [None] * len(portfolio_keys)}
+            if portfolio_ids:
+                columns["portfolio_id"] = [None] * len(symbol_keys) + portfolio_keys
+            body = table_bytes(
+                {
+                    **columns,
+                    "observations": np.concatenate([results["observations"], portfolio_results["observations"]]),
+                    **{name: np.concatenate([results[name], portfolio_results[name]]) for name in metric_names},
+                },
+                table_format,
+                metadata={**summary, **missing}
+            )
+            return _metrics_response(body, table_format)
+
+        metrics, observations = _metrics_by_key(symbol_keys, results, metric_names)
+        portfolio_metrics, portfolio_observations = _metrics_by_key(portfolio_keys, portfolio_results, metric_names)
+
+        return _metrics_response(dumps({
+            **summary,
+            "metrics": metrics,
+            "observations": observations,
+            "portfolio_metrics": portfolio_metrics,
+            "portfolio_observations": portfolio_observations,
+            **missing,
+        }), table_format)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error computing batch metrics: {e}")
+        raise handle_database_error(e, "computing batch metrics")
+    finally:
+        db_session.close()
+
+def prepare_universe_metrics(request: UniverseMetricsRequest):
+    """Validate a universe metrics request and load its price panel.
+
+    Returns (frequency, dates, missing symbols, chunk iterator); the iterator
+    runs the computation on the process pool as it is consumed.
+    """
+    metric_names = request.metrics or list(METRIC_NAMES)
+    unknown = sorted(set(metric_names) - set(METRIC_NAMES))
+    if unknown:
+        raise handle_validation_error("metrics", f"Unknown metrics: {', '.join(unknown)}")
+
+    # The panel is built straight into the shared memory block the workers read
+    shared = SharedPanel()
+    try:
+        db_session = get_db('sec_master', read_only=True)
+        db = next(db_session)
+        try:
+            symbols = request.symbols or universe_symbols(db)
+            frequency = resolve_frequency(
+                request.frequency, first_price_date(db, request.symbols or None, request.frequency, request.start_date),
+                request.end_date, settings.PRICE_HISTORY_MAX_POINTS
+            )
+            dates, panel_symbols, _ = cached_price_panel(
+                db, symbols, request.start_date, request.end_date, request.price_field, frequency,
+                allocate=shared.allocate
+            )
+        finally:
+            db_session.close()
+
+    except Exception as e:
+        shared.release()
+        logger.error(f"Error loading prices for universe metrics: {e}")
+        raise handle_database_error(e, "computing universe metrics")
+
+    found = set(panel_symbols.tolist())
+    chunks = iter_panel_metrics(
+        shared,
+        panel_symbols.tolist(),
+        metric_names,
+        periods_per_year=request.periods_per_year or PERIODS_PER_YEAR[frequency],
+        risk_free_rate=request.risk_free_rate,
+        chunk_size=request.chunk_size or settings.METRICS_PROCESS_CHUNK_SIZE,
+        max_workers=settings.METRICS_PROCESS_WORKERS
+    )
+    return frequency, dates, [symbol for symbol in symbols if symbol not in found], chunks
+
+
+def _universe_batches(chunks, metric_names: List[str], metadata: dict):
+    """Arrow schema of universe metrics and an iterator of one record batch (one row per symbol) per chunk."""
+    import pyarrow as pa
+
+    schema = with_metadata(
+        pa.schema(
+            [("symbol", pa.string()), ("observations", pa.int64())] + [(name, pa.float64()) for name in metric_names]
+        ),
+        metadata
+    )
+    batches = (
+        record_batch({
+            "symbol": list(chunk["metrics"]),
+            "observations": list(chunk["observations"].values()),
+            **{name: [values[name] for values in chunk["metrics"].values()] for name in metric_names},
+        }, schema)
+        for chunk in chunks
+    )
+    return schema, batches
+
+
+@router.post("/universe")
+def get_universe_metrics(request: UniverseMetricsRequest, http_request: Request):
+    """Compute metrics for a whole universe on the process pool, streamed as NDJSON chunk by chunk.
+
+    Each line holds the metrics and observation counts of one chunk of symbols,
+    in completion order; a final line lists the symbols without prices. Only
+    served where METRICS_UNIVERSE_ENDPOINT_ENABLED is set. If the
+    Accept header asks for an Arrow IPC stream or Parquet, each chunk is a
+    record batch (row group) instead and the missing symbols are schema metadata.
+    """
+    if not settings.METRICS_UNIVERSE_ENDPOINT_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Universe metrics run on the job workers: POST /api/v1/jobs/ with job_type universe_metrics"
+        )
+
+    frequency, dates, missing_symbols, chunks = prepare_universe_metrics(request)
+    headers = {
+        "X-Price-Frequency": frequency.value,
+        "X-Start-Date": str(dates[0].item()) if len(dates) else "",
+        "X-End-Date": str(dates[-1].item()) if len(dates) else "",
+        "Vary": "Accept",
+    }
+
+    table_format = negotiate_table_format(http_request)
+    if table_format != TableFormat.json:
+        schema, batches = _universe_batches(chunks, request.metrics or list(METRIC_NAMES), {
+            "frequency": frequency.value,
+            "start_date": dates[0].item() if len(dates) else None,
+            "end_date": dates[-1].item() if len(dates) else None,
+            "missing_symbols": missing_symbols,
+        })
+        return StreamingResponse(
+            iter_table_bytes(batches, schema, table_format), media_type=table_format.value, headers=headers
+        )
+
+    def stream():
+        for chunk in chunks:
+            yield dumps(chunk) + b"\n"
+        yield dumps({"missing_symbols": missing_symbols}) + b"\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson", headers=headers)
+
+def compute_return_matrix(request: ReturnMatrixRequest, max_symbols: Optional[int] = None) -> dict:
+    """ReturnMatrixResponse content for a request, with the matrix as a NumPy array (NaN for unknown pairs).
+
+    The symbol limit defaults to METRICS_MATRIX_MAX_SYMBOLS; the job queue passes a larger one.
+    """
+    max_symbols = max_symbols or settings.METRICS_MATRIX_MAX_SYMBOLS
+    symbols = sorted(set(symbol.strip() for symbol in request.symbols if symbol.strip()))
+    if not symbols:
+        raise handle_validation_error("symbols", "At least one symbol is required")
+    if len(symbols) > max_symbols:
+        message = f"At most {max_symbols} symbols can be requested at once"
+        if max_symbols < settings.METRICS_MATRIX_JOB_MAX_SYMBOLS:
+            message += f"; submit a return_matrix job for up to {settings.METRICS_MATRIX_JOB_MAX_SYMBOLS}"
+        raise handle_validation_error("symbols", message)
+
+    # Keyed by the requested frequency; an auto frequency is resolved (and cached) on a miss
+    cache_key = (tuple(symbols), request.start_date, request.end_date, request.price_field, request.frequency,
+                 request.kind, request.shrinkage, request.min_observations)
+
+    try:
+        result = matrix_cache.get(cache_key)
+        if result is None:
+            db_session = get_db('sec_master', read_only=True)
+            db = next(db_session)
+            try:
+                frequency = resolve_frequency(
+                    request.frequency, first_price_date(db, symbols, request.frequency, request.start_date),
+                    request.end_date, settings.PRICE_HISTORY_MAX_POINTS
+                )
+                dates, panel_symbols, panel = cached_price_panel(
+                    db, symbols, request.start_date, request.end_date, request.price_field, frequency
+                )
+            finally:
+                db_session.close()
+
+            estimate = compute_return_covariance(
+                panel, request.min_observations, shrinkage=request.shrinkage == Shrinkage.ledoit_wolf
+            )
+            del panel
+            # Keep only the requested matrix (unscaled) and what the response needs
+            result = {
+                "matrix": estimate["covariance" if request.kind == MatrixKind.covariance else "correlation"],
+                "observations": estimate["observations"],
+                "shrinkage_intensity": estimate["shrinkage_intensity"],
+                "frequency": frequency,
+                "start_date": dates[0].item() if len(dates) else None,
+                "end_date": dates[-1].item() if len(dates) else None,
+                "symbols": panel_symbols.tolist(),
+            }
+            del estimate
+            matrix_cache.set(cache_key, result)
+            logger.info(f"Computed return matrix for {len(panel_symbols)} symbols over {len(dates)} dates")
+
+        matrix, frequency = result["matrix"], result["frequency"]
+        if request.kind == MatrixKind.covariance:
+            matrix = matrix * (request.periods_per_year or PERIODS_PER_YEAR[frequency])
+
+        found = set(result["symbols"])
+        return {
+            "kind": request.kind.value,
+            "price_field": request.price_field.value,
+            "frequency": frequency.value,
+            "start_date": result["start_date"],
+            "end_date": result["end_date"],
+            "symbols": result["symbols"],
+            "matrix": matrix,
+            "observations": dict(zip(result["symbols"], result["observations"].tolist())),
+            "shrinkage": request.shrinkage.value,
+            "shrinkage_intensity": result["shrinkage_intensity"],
+            "missing_symbols": [symbol for symbol in symbols if symbol not in found],
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error computing return matrix: {e}")
+        raise handle_database_error(e, "computing return matrix")
+
+@router.post("/matrix", response_model=ReturnMatrixResponse)
+def get_return_matrix(request: ReturnMatrixRequest, http_request: Request):
+    """Correlation or covariance matrix of returns for a universe of symbols over a date range.
+
+    Declared sync so the matrix products run in the threadpool instead of the event loop.
+    The matrix is serialized from the NumPy array in one orjson call, or, if the
+    Accept header asks for an Arrow IPC stream or Parquet, as a table with a row
+    and a column per symbol (named MATRIX_COLUMN_PREFIX + symbol) and the other
+    response fields as schema metadata.
+    """
+    content = compute_return_matrix(request)
+    table_format = negotiate_table_format(http_request)
+    if table_format == TableFormat.json:
+        return _metrics_response(dumps(content), table_format)
+
+    symbols, matrix = content.pop("symbols"), content.pop("matrix")
+    observations = content.pop("observations")
+    body = table_bytes(
+        {
+            "symbol": symbols,
+            "observations": [observations[symbol] for symbol in symbols],
+            **{f"{MATRIX_COLUMN_PREFIX}{symbol}": matrix[:, i] for i, symbol in enumerate(symbols)},
+        },
+        table_format,
+        metadata={**content, "column_prefix": MATRIX_COLUMN_PREFIX}
+    )
+    return _metrics_response(body, table_format)
+
+@router.post("/state/refresh", response_model=dict)
+def refresh_symbol_metric_state(request: MetricStateRefreshRequest):
+    """Fold newly ingested prices into the persisted running metric state (all securities by default)."""
+    db_session = get_db('sec_master')
+    try:
+        db = next(db_session)
+
+        updated = refresh_metric_state(db, request.symbols, request.price_field, rebuild=request.rebuild)
+        db.commit()
+
+        return create_success_response(
+            data={"updated": updated},
+            message="Metric state refreshed successfully"
+        )
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error refreshing metric state: {e}")
+        raise handle_database_error(e, "refreshing metric state")
+    finally:
+        db_session.close()
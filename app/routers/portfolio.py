@@ -1,8 +1,22 @@
-from re import S
-from fastapi import APIRouter, HTTPException, status
+import json
+from enum import Enum
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Response
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime, date
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import text
+
+# Import utility functions
+from app.core.config import settings
+from app.util.database import get_async_db, get_db
+from app.util.metrics import TRADING_DAYS_PER_YEAR, compute_metrics
+from app.util.portfolio_nav import refresh_portfolio_nav
+from app.util.price_export import EXPORT_MEDIA_TYPES, ExportFormat
+from app.util.response_helpers import create_success_response, handle_database_error, handle_validation_error
+from app.util.logger import logger
 
 router = APIRouter()
 
@@ -21,8 +35,8 @@ class PortfolioCreate(PortfolioBase):
 
 class PortfolioResponse(PortfolioBase):
 
-    created_at: date
-    updated_at: date
+    created_at: datetime
+    updated_at: datetime
 
 
 
@@ -33,74 +47,605 @@ class PortfolioSnapshot(BaseModel):
     is_active: bool
     meta_data: Optional[dict] = None
 
+class TransactionType(Enum):
+    buy = "buy"
+    sell = "sell"
+    deposit = "deposit"
+    withdrawal = "withdrawal"
+    dividend = "dividend"
+    fee = "fee"
+
+class TransactionCreate(BaseModel):
+    trade_date: date
+    transaction_type: TransactionType
+    symbol: Optional[str] = None
+    quantity: float = 0.0
+    price: Optional[float] = None
+    # Cash amount of deposits, withdrawals, dividends and fees (always positive)
+    amount: Optional[float] = None
+
+class TransactionResponse(BaseModel):
+    id: int
+    portfolio_id: str
+    trade_date: date
+    transaction_type: TransactionType
+    symbol: Optional[str] = None
+    quantity: float
+    price: Optional[float] = None
+    cash_amount: float
+
+class HoldingResponse(BaseModel):
+    symbol: str
+    quantity: float
+    cost_basis: float
+    updated_at: datetime
+
+class PortfolioNavResponse(BaseModel):
+    portfolio_id: str
+    dates: List[date]
+    nav: List[float]
+    cash: List[float]
+    net_flow: List[float]
+    unit_value: List[float]
+
+class PortfolioMetricsResponse(BaseModel):
+    portfolio_id: str
+    start_date: date
+    end_date: date
+    observations: int
+    total_return: Optional[float] = None
+    annualized_return: Optional[float] = None
+    volatility: Optional[float] = None
+    sharpe_ratio: Optional[float] = None
+    max_drawdown: Optional[float] = None
+
+class NavRefreshRequest(BaseModel):
+    portfolio_ids: Optional[List[str]] = None
+    rebuild: bool = False
+
+class SnapshotBatch(BaseModel):
+    snapshots: List[PortfolioSnapshot]
+
+class SnapshotFormat(Enum):
+    json = "json"
+    arrow = "arrow"
+
+class SnapshotColumns(BaseModel):
+    id: List[str]
+    as_of_date: List[date]
+    balance: List[float]
+    is_active: List[bool]
+    meta_data: List[Optional[dict]]
+
+
+# Portfolios live in sec_master next to market_price (see query.sql)
+PORTFOLIO_COLUMNS = "id, name, owner_id, description, benchmark, base_currency, meta_data, created_at, updated_at"
+
+# Snapshots upserted per multi-row INSERT statement
+SNAPSHOT_WRITE_CHUNK_SIZE = 5000
+
+
+def _portfolio_params(portfolio: PortfolioCreate) -> dict:
+    """Bind parameters for a portfolio row; meta_data is sent as JSON text and cast to JSONB."""
+    params = portfolio.model_dump()
+    params['meta_data'] = json.dumps(portfolio.meta_data) if portfolio.meta_data is not None else None
+    return params
+
+def _portfolio_not_found(portfolio_id: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Portfolio '{portfolio_id}' not found"
+    )
+
+def _signed_amounts(transaction: TransactionCreate):
+    """Signed position and cash changes of a transaction, validating the fields its type needs."""
+    kind = transaction.transaction_type
+    if kind in (TransactionType.buy, TransactionType.sell):
+        if not transaction.symbol:
+            raise handle_validation_error("symbol", f"A {kind.value} needs a symbol")
+        if transaction.quantity <= 0 or not transaction.price or transaction.price <= 0:
+            raise handle_validation_error("quantity", f"A {kind.value} needs a positive quantity and price")
+        value = transaction.quantity * transaction.price
+        return (transaction.quantity, -value) if kind == TransactionType.buy else (-transaction.quantity, value)
+
+    if not transaction.amount or transaction.amount <= 0:
+        raise handle_validation_error("amount", f"A {kind.value} needs a positive amount")
+    if kind in (TransactionType.deposit, TransactionType.dividend):
+        return 0.0, transaction.amount
+    return 0.0, -transaction.amount
+
+def _snapshots_to_arrow(columns: dict) -> bytes:
+    """Encode snapshot columns as one Arrow IPC stream record batch."""
+    import pyarrow as pa
+
+    batch = pa.record_batch([
+        pa.array(columns["id"], type=pa.string()),
+        pa.array(columns["as_of_date"], type=pa.date32()),
+        pa.array(columns["balance"], type=pa.float64()),
+        pa.array(columns["is_active"], type=pa.bool_()),
+        # Free-form metadata travels as JSON text
+        pa.array([json.dumps(value) if value is not None else None for value in columns["meta_data"]],
+                 type=pa.string()),
+    ], names=list(columns))
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
 
-# Mock data storage (replace with database in production)
-portfolios = []
-portfolio_id_counter = 1
+def _date_range_clause(column: str, start_date: Optional[date], end_date: Optional[date], params: dict) -> str:
+    """AND-conditions for an optional date range, adding only the parameters that are used."""
+    conditions = ""
+    if start_date is not None:
+        conditions += f" AND {column} >= :start_date"
+        params['start_date'] = start_date
+    if end_date is not None:
+        conditions += f" AND {column} <= :end_date"
+        params['end_date'] = end_date
+    return conditions
 
 @router.get("/", response_model=List[PortfolioResponse])
-async def get_portfolios():
-    """Get all portfolios"""
-    return portfolios
+async def get_portfolios(
+    response: Response,
+    owner_id: Optional[str] = Query(None, description="Only return portfolios of this owner"),
+    after: Optional[str] = Query(None, description="Return portfolios with an id after this one"),
+    limit: int = Query(settings.PORTFOLIOS_PAGE_SIZE, ge=1, le=settings.PORTFOLIOS_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db('sec_master', read_only=True))
+):
+    """Get portfolios in id order, optionally for a single owner.
+
+    The id to pass as `after` for the next page is returned in the
+    X-Next-After header; it is absent on the last page.
+    """
+    # Only add the filters that were requested so every parameter has a single, known type
+    conditions = []
+    params = {'limit': limit + 1}
+    if owner_id is not None:
+        conditions.append("owner_id = :owner_id")
+        params['owner_id'] = owner_id
+    if after is not None:
+        conditions.append("id > :after")
+        params['after'] = after
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    try:
+        # Fetch one extra row to find out whether another page follows
+        result = await db.execute(
+            text(f"""
+                SELECT {PORTFOLIO_COLUMNS}
+                FROM portfolio
+                {where_clause}
+                ORDER BY id
+                LIMIT :limit
+            """),
+            params
+        )
+        rows = result.mappings().fetchall()
+
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers["X-Next-After"] = rows[-1]["id"]
+
+        return [PortfolioResponse(**row) for row in rows]
+
+    except Exception as e:
+        logger.error(f"Error retrieving portfolios: {e}")
+        raise handle_database_error(e, "retrieving portfolios")
+
+# Snapshot routes are declared before /{portfolio_id} so "snapshots" is not taken for an id
+@router.post("/snapshots", response_model=dict)
+async def write_snapshots(batch: SnapshotBatch, db: AsyncSession = Depends(get_async_db('sec_master'))):
+    """Upsert many portfolio snapshots with one multi-row statement per chunk."""
+    if len(batch.snapshots) > settings.PORTFOLIO_SNAPSHOT_MAX_ROWS:
+        raise handle_validation_error(
+            "snapshots", f"At most {settings.PORTFOLIO_SNAPSHOT_MAX_ROWS} snapshots can be written at once"
+        )
+
+    # A key may only be upserted once per statement; the last snapshot for it wins
+    snapshots = list({(snapshot.id, snapshot.as_of_date): snapshot for snapshot in batch.snapshots}.values())
+
+    try:
+        for i in range(0, len(snapshots), SNAPSHOT_WRITE_CHUNK_SIZE):
+            chunk = snapshots[i:i + SNAPSHOT_WRITE_CHUNK_SIZE]
+            await db.execute(
+                text("""
+                    INSERT INTO portfolio_snapshot (portfolio_id, as_of_date, balance, is_active, meta_data)
+                    SELECT portfolio_id, as_of_date, balance, is_active, CAST(meta_data AS JSONB)
+                    FROM unnest(
+                        CAST(:ids AS VARCHAR[]), CAST(:dates AS DATE[]), CAST(:balances AS FLOAT8[]),
+                        CAST(:active AS BOOLEAN[]), CAST(:meta_data AS TEXT[])
+                    ) AS s(portfolio_id, as_of_date, balance, is_active, meta_data)
+                    ON CONFLICT (portfolio_id, as_of_date) DO UPDATE SET
+                        balance = EXCLUDED.balance,
+                        is_active = EXCLUDED.is_active,
+                        meta_data = EXCLUDED.meta_data,
+                        updated_at = now()
+                """),
+                {
+                    'ids': [snapshot.id for snapshot in chunk],
+                    'dates': [snapshot.as_of_date for snapshot in chunk],
+                    'balances': [snapshot.balance for snapshot in chunk],
+                    'active': [snapshot.is_active for snapshot in chunk],
+                    'meta_data': [
+                        json.dumps(snapshot.meta_data) if snapshot.meta_data is not None else None
+                        for snapshot in chunk
+                    ]
+                }
+            )
+
+        await db.commit()
+        logger.info(f"Wrote {len(snapshots)} portfolio snapshots")
+        return create_success_response(data={"written": len(snapshots)}, message="Snapshots written successfully")
+
+    except IntegrityError as e:
+        await db.rollback()
+        logger.error(f"Snapshot batch rejected: {e}")
+        raise handle_validation_error("snapshots", "Snapshots reference unknown portfolios")
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error writing portfolio snapshots: {e}")
+        raise handle_database_error(e, "writing portfolio snapshots")
+
+@router.get("/snapshots", response_model=SnapshotColumns)
+async def read_snapshots(
+    response: Response,
+    start_date: date,
+    end_date: date,
+    ids: Optional[List[str]] = Query(None, description="Portfolio ids (default: all portfolios)"),
+    format: SnapshotFormat = SnapshotFormat.json,
+    after_date: Optional[date] = Query(None, description="Return snapshots after this date and after_id"),
+    after_id: Optional[str] = Query(None, description="Return snapshots after after_date and this id"),
+    limit: int = Query(settings.PORTFOLIO_SNAPSHOT_PAGE_SIZE, ge=1, le=settings.PORTFOLIO_SNAPSHOT_MAX_ROWS),
+    db: AsyncSession = Depends(get_async_db('sec_master', read_only=True))
+):
+    """Read snapshots for a date range as columnar JSON or an Arrow IPC stream, ordered by date and id.
+
+    The date and id to pass as `after_date` and `after_id` for the next page
+    are returned in the X-Next-After-Date and X-Next-After-Id headers; they
+    are absent on the last page.
+    """
+    if (after_date is None) != (after_id is None):
+        raise handle_validation_error("after_id", "after_date and after_id must be given together")
+
+    params = {'start_date': start_date, 'end_date': end_date, 'limit': limit + 1}
+    conditions = ""
+    if ids:
+        conditions += " AND portfolio_id = ANY(:ids)"
+        params['ids'] = ids
+    if after_date is not None:
+        conditions += " AND (as_of_date, portfolio_id) > (:after_date, :after_id)"
+        params.update(after_date=after_date, after_id=after_id)
+
+    try:
+        # Fetch one extra row to find out whether another page follows
+        rows = (await db.execute(
+            text(f"""
+                SELECT portfolio_id, as_of_date, balance::float8, is_active, meta_data
+                FROM portfolio_snapshot
+                WHERE as_of_date BETWEEN :start_date AND :end_date{conditions}
+                ORDER BY as_of_date, portfolio_id
+                LIMIT :limit
+            """),
+            params
+        )).fetchall()
+
+    except Exception as e:
+        logger.error(f"Error reading portfolio snapshots: {e}")
+        raise handle_database_error(e, "reading portfolio snapshots")
+
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers = {"X-Next-After-Date": rows[-1][1].isoformat(), "X-Next-After-Id": rows[-1][0]}
+
+    columns = dict(zip(SnapshotColumns.model_fields, zip(*rows))) if rows else {
+        name: () for name in SnapshotColumns.model_fields
+    }
+    if format == SnapshotFormat.arrow:
+        return Response(
+            content=_snapshots_to_arrow(columns), media_type=EXPORT_MEDIA_TYPES[ExportFormat.arrow], headers=headers
+        )
+    response.headers.update(headers)
+    return SnapshotColumns(**columns)
 
 @router.get("/{portfolio_id}", response_model=PortfolioResponse)
-async def get_portfolio(portfolio_id: int):
+async def get_portfolio(portfolio_id: str, db: AsyncSession = Depends(get_async_db('sec_master', read_only=True))):
     """Get a specific portfolio by ID"""
-    portfolio = next((p for p in portfolios if p["id"] == portfolio_id), None)
+    try:
+        portfolio = (await db.execute(
+            text(f"SELECT {PORTFOLIO_COLUMNS} FROM portfolio WHERE id = :id"),
+            {'id': portfolio_id}
+        )).mappings().fetchone()
+
+    except Exception as e:
+        logger.error(f"Error retrieving portfolio {portfolio_id}: {e}")
+        raise handle_database_error(e, "retrieving portfolio")
+
     if not portfolio:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Portfolio not found"
-        )
-    return portfolio
+        raise _portfolio_not_found(portfolio_id)
+    return PortfolioResponse(**portfolio)
 
 @router.post("/", response_model=PortfolioResponse, status_code=status.HTTP_201_CREATED)
-async def create_portfolio(portfolio: PortfolioCreate):
+async def create_portfolio(portfolio: PortfolioCreate, db: AsyncSession = Depends(get_async_db('sec_master'))):
     """Create a new portfolio"""
-    global portfolio_id_counter
-    
-    new_portfolio = PortfolioResponse(
-        id=portfolio_id_counter,
-        **portfolio.dict(),
-        created_at=datetime.now(),
-        updated_at=datetime.now()
-    )
-    
-    portfolios.append(new_portfolio.dict())
-    portfolio_id_counter += 1
-    
-    return new_portfolio
+    if not portfolio.id.strip():
+        raise handle_validation_error("id", "Portfolio id is mandatory and cannot be empty")
+
+    try:
+        # The insert is skipped, and nothing returned, if the id is taken
+        new_portfolio = (await db.execute(
+            text(f"""
+                INSERT INTO portfolio (id, name, owner_id, description, benchmark, base_currency, meta_data)
+                VALUES (:id, :name, :owner_id, :description, :benchmark, :base_currency,
+                        CAST(:meta_data AS JSONB))
+                ON CONFLICT (id) DO NOTHING
+                RETURNING {PORTFOLIO_COLUMNS}
+            """),
+            _portfolio_params(portfolio)
+        )).mappings().fetchone()
+
+        if not new_portfolio:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Portfolio '{portfolio.id}' already exists"
+            )
+
+        await db.commit()
+        logger.info(f"Portfolio created successfully: id={portfolio.id}, owner={portfolio.owner_id}")
+        return PortfolioResponse(**new_portfolio)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error creating portfolio: {e}")
+        raise handle_database_error(e, "portfolio creation")
 
 @router.put("/{portfolio_id}", response_model=PortfolioResponse)
-async def update_portfolio(portfolio_id: int, portfolio_update: PortfolioCreate):
+async def update_portfolio(portfolio_id: str, portfolio_update: PortfolioCreate,
+                           db: AsyncSession = Depends(get_async_db('sec_master'))):
     """Update an existing portfolio"""
-    portfolio_index = next((i for i, p in enumerate(portfolios) if p["id"] == portfolio_id), None)
-    
-    if portfolio_index is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Portfolio not found"
-        )
-    
-    updated_portfolio = PortfolioResponse(
-        id=portfolio_id,
-        **portfolio_update(),
-        created_at=portfolios[portfolio_index]["created_at"],
-        updated_at=datetime.now()
-    )
-    
-    portfolios[portfolio_index] = updated_portfolio.dict()
-    return updated_portfolio
+    if portfolio_update.id != portfolio_id:
+        raise handle_validation_error("id", "Portfolio id in the body must match the URL")
+
+    try:
+        updated_portfolio = (await db.execute(
+            text(f"""
+                UPDATE portfolio
+                SET name = :name,
+                    owner_id = :owner_id,
+                    description = :description,
+                    benchmark = :benchmark,
+                    base_currency = :base_currency,
+                    meta_data = CAST(:meta_data AS JSONB),
+                    updated_at = now()
+                WHERE id = :id
+                RETURNING {PORTFOLIO_COLUMNS}
+            """),
+            _portfolio_params(portfolio_update)
+        )).mappings().fetchone()
+
+        if not updated_portfolio:
+            raise _portfolio_not_found(portfolio_id)
+
+        await db.commit()
+        return PortfolioResponse(**updated_portfolio)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error updating portfolio {portfolio_id}: {e}")
+        raise handle_database_error(e, "portfolio update")
 
 @router.delete("/{portfolio_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_portfolio(portfolio_id: int):
+async def delete_portfolio(portfolio_id: str, db: AsyncSession = Depends(get_async_db('sec_master'))):
     """Delete a portfolio"""
-    portfolio_index = next((i for i, p in enumerate(portfolios) if p["id"] == portfolio_id), None)
-    
-    if portfolio_index is None:
+    try:
+        deleted = (await db.execute(
+            text("DELETE FROM portfolio WHERE id = :id RETURNING id"),
+            {'id': portfolio_id}
+        )).fetchone()
+
+        if not deleted:
+            raise _portfolio_not_found(portfolio_id)
+
+        await db.commit()
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error deleting portfolio {portfolio_id}: {e}")
+        raise handle_database_error(e, "portfolio deletion")
+
+@router.post("/nav/refresh", response_model=dict)
+def refresh_nav(request: NavRefreshRequest):
+    """Materialize the daily NAV series of portfolios (those with new transactions by default)."""
+    db_session = get_db('sec_master')
+    db = next(db_session)
+    try:
+        counts = refresh_portfolio_nav(db, request.portfolio_ids, rebuild=request.rebuild)
+        db.commit()
+        return create_success_response(data=counts, message="Portfolio NAV refreshed successfully")
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error refreshing portfolio NAV: {e}")
+        raise handle_database_error(e, "refreshing portfolio NAV")
+    finally:
+        db_session.close()
+
+@router.post("/{portfolio_id}/transactions", response_model=TransactionResponse, status_code=status.HTTP_201_CREATED)
+async def create_transaction(portfolio_id: str, transaction: TransactionCreate,
+                             db: AsyncSession = Depends(get_async_db('sec_master'))):
+    """Record a transaction and apply it to the portfolio's holdings in one statement."""
+    quantity, cash_amount = _signed_amounts(transaction)
+
+    try:
+        new_transaction = (await db.execute(
+            text("""
+                WITH new_transaction AS (
+                    INSERT INTO portfolio_transaction
+                        (portfolio_id, trade_date, transaction_type, symbol, quantity, price, cash_amount)
+                    -- A symbol without a price by the trade date could not be valued in the NAV
+                    SELECT :portfolio_id, :trade_date, :transaction_type, :symbol, :quantity, :price, :cash_amount
+                    WHERE CAST(:symbol AS VARCHAR) IS NULL OR EXISTS (
+                        SELECT 1 FROM market_price WHERE symbol = :symbol AND date <= :trade_date
+                    )
+                    RETURNING id, portfolio_id, trade_date, transaction_type, symbol,
+                              quantity::float8 AS quantity, price::float8 AS price, cash_amount::float8 AS cash_amount
+                ), holding AS (
+                    -- Buys add their cost; sells release cost in proportion to the quantity sold
+                    INSERT INTO portfolio_holding (portfolio_id, symbol, quantity, cost_basis)
+                    SELECT portfolio_id, symbol, quantity, -cash_amount
+                    FROM new_transaction
+                    WHERE symbol IS NOT NULL AND quantity <> 0
+                    ON CONFLICT (portfolio_id, symbol) DO UPDATE SET
+                        quantity = portfolio_holding.quantity + EXCLUDED.quantity,
+                        cost_basis = CASE
+                            WHEN EXCLUDED.quantity > 0 OR portfolio_holding.quantity <= 0
+                                THEN portfolio_holding.cost_basis + EXCLUDED.cost_basis
+                            ELSE portfolio_holding.cost_basis
+                                 * GREATEST(portfolio_holding.quantity + EXCLUDED.quantity, 0)
+                                 / portfolio_holding.quantity
+                        END,
+                        updated_at = now()
+                )
+                SELECT * FROM new_transaction
+            """),
+            {
+                'portfolio_id': portfolio_id,
+                'trade_date': transaction.trade_date,
+                'transaction_type': transaction.transaction_type.value,
+                'symbol': transaction.symbol,
+                'quantity': quantity,
+                'price': transaction.price,
+                'cash_amount': cash_amount
+            }
+        )).mappings().fetchone()
+        if new_transaction is None:
+            raise handle_validation_error(
+                "symbol", f"No price for '{transaction.symbol}' on or before {transaction.trade_date}"
+            )
+
+        await db.commit()
+        logger.info(f"Recorded {transaction.transaction_type.value} transaction for portfolio {portfolio_id}")
+        return TransactionResponse(**new_transaction)
+
+    except HTTPException:
+        await db.rollback()
+        raise
+    except IntegrityError as e:
+        await db.rollback()
+        if "symbol_fkey" in str(e.orig):
+            raise handle_validation_error("symbol", f"Unknown symbol '{transaction.symbol}'")
+        raise _portfolio_not_found(portfolio_id)
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error recording transaction for portfolio {portfolio_id}: {e}")
+        raise handle_database_error(e, "recording transaction")
+
+@router.get("/{portfolio_id}/transactions", response_model=List[TransactionResponse])
+async def get_transactions(portfolio_id: str, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                           db: AsyncSession = Depends(get_async_db('sec_master', read_only=True))):
+    """Get a portfolio's transactions in trade date order."""
+    params = {'portfolio_id': portfolio_id}
+    date_range = _date_range_clause("trade_date", start_date, end_date, params)
+
+    try:
+        rows = (await db.execute(
+            text(f"""
+                SELECT id, portfolio_id, trade_date, transaction_type, symbol,
+                       quantity::float8 AS quantity, price::float8 AS price, cash_amount::float8 AS cash_amount
+                FROM portfolio_transaction
+                WHERE portfolio_id = :portfolio_id{date_range}
+                ORDER BY trade_date, id
+            """),
+            params
+        )).mappings().fetchall()
+        return [TransactionResponse(**row) for row in rows]
+
+    except Exception as e:
+        logger.error(f"Error retrieving transactions for portfolio {portfolio_id}: {e}")
+        raise handle_database_error(e, "retrieving transactions")
+
+@router.get("/{portfolio_id}/holdings", response_model=List[HoldingResponse])
+async def get_holdings(portfolio_id: str, db: AsyncSession = Depends(get_async_db('sec_master', read_only=True))):
+    """Get a portfolio's open positions."""
+    try:
+        rows = (await db.execute(
+            text("""
+                SELECT symbol, quantity::float8 AS quantity, cost_basis::float8 AS cost_basis, updated_at
+                FROM portfolio_holding
+                WHERE portfolio_id = :portfolio_id AND quantity <> 0
+                ORDER BY symbol
+            """),
+            {'portfolio_id': portfolio_id}
+        )).mappings().fetchall()
+        return [HoldingResponse(**row) for row in rows]
+
+    except Exception as e:
+        logger.error(f"Error retrieving holdings for portfolio {portfolio_id}: {e}")
+        raise handle_database_error(e, "retrieving holdings")
+
+async def _load_nav(db: AsyncSession, portfolio_id: str, start_date: Optional[date], end_date: Optional[date]):
+    """Read a portfolio's materialized NAV series; raises 404 if it has none in the range."""
+    params = {'portfolio_id': portfolio_id}
+    date_range = _date_range_clause("date", start_date, end_date, params)
+
+    try:
+        rows = (await db.execute(
+            text(f"""
+                SELECT date, nav, cash, net_flow, unit_value
+                FROM portfolio_nav
+                WHERE portfolio_id = :portfolio_id{date_range}
+                ORDER BY date
+            """),
+            params
+        )).fetchall()
+
+    except Exception as e:
+        logger.error(f"Error retrieving NAV for portfolio {portfolio_id}: {e}")
+        raise handle_database_error(e, "retrieving portfolio NAV")
+
+    if not rows:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Portfolio not found"
+            detail=f"No NAV found for portfolio '{portfolio_id}'"
         )
-    
-    portfolios.pop(portfolio_index)
+    return rows
+
+@router.get("/{portfolio_id}/nav", response_model=PortfolioNavResponse)
+async def get_portfolio_nav(portfolio_id: str, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                            db: AsyncSession = Depends(get_async_db('sec_master', read_only=True))):
+    """Get the materialized daily NAV series of a portfolio."""
+    dates, nav, cash, net_flow, unit_value = zip(*await _load_nav(db, portfolio_id, start_date, end_date))
+    return PortfolioNavResponse(
+        portfolio_id=portfolio_id,
+        dates=dates,
+        nav=nav,
+        cash=cash,
+        net_flow=net_flow,
+        unit_value=unit_value
+    )
+
+@router.get("/{portfolio_id}/metrics", response_model=PortfolioMetricsResponse)
+async def get_portfolio_metrics(
+    portfolio_id: str,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    risk_free_rate: float = Query(0.0, description="Annual risk-free rate used for the Sharpe ratio"),
+    periods_per_year: int = Query(TRADING_DAYS_PER_YEAR, gt=0),
+    db: AsyncSession = Depends(get_async_db('sec_master', read_only=True))
+):
+    """Compute portfolio metrics from the time-weighted unit value of its materialized NAV."""
+    rows = await _load_nav(db, portfolio_id, start_date, end_date)
+    unit_value = np.fromiter((row.unit_value for row in rows), dtype=np.float64, count=len(rows))
+
+    return PortfolioMetricsResponse(
+        portfolio_id=portfolio_id,
+        start_date=rows[0].date,
+        end_date=rows[-1].date,
+        observations=len(rows),
+        **compute_metrics(unit_value, periods_per_year=periods_per_year, risk_free_rate=risk_free_rate)
+    )
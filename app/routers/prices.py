@@ -0,0 +1,76 @@
+from fastapi import APIRouter, HTTPException, status, File, UploadFile
+from typing import List, Optional
+from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
+
+# Import utility functions
+from app.util.database import get_db
+from app.util.price_ingest import IngestFormat, ingest_prices
+from app.util.price_rollup import refresh_price_rollups
+from app.util.response_helpers import (
+    create_success_response,
+    handle_database_error,
+    handle_validation_error
+)
+from app.util.logger import logger
+
+router = APIRouter()
+
+# Pydantic Models
+class RollupRefreshRequest(BaseModel):
+    # Symbols to rebuild (default: all securities)
+    symbols: Optional[List[str]] = None
+
+
+
+@router.post("/ingest", response_model=dict)
+def ingest_market_prices(file: UploadFile = File(...), file_format: Optional[IngestFormat] = None,
+                         refresh_state: bool = True):
+    """Bulk load a CSV or Parquet file into market_price using COPY and a staged upsert.
+
+    Declared sync so the blocking COPY runs in the threadpool instead of the event loop.
+    """
+    if file_format is None:
+        filename = (file.filename or "").lower()
+        file_format = IngestFormat.parquet if filename.endswith((".parquet", ".pq")) else IngestFormat.csv
+
+    try:
+        db = next(get_db('sec_master'))
+
+        counts = ingest_prices(db, file.file, file_format, refresh_state=refresh_state)
+        db.commit()
+
+        return create_success_response(data=counts, message="Market prices ingested successfully")
+
+    except ValueError as e:
+        db.rollback()
+        raise handle_validation_error("file", str(e))
+    except IntegrityError as e:
+        db.rollback()
+        logger.error(f"Integrity error ingesting market prices: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid market prices: every symbol must exist in securities and keys must be complete"
+        )
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error ingesting market prices: {e}")
+        raise handle_database_error(e, "ingesting market prices")
+
+
+@router.post("/rollups/refresh", response_model=dict)
+def refresh_market_price_rollups(request: RollupRefreshRequest):
+    """Rebuild the weekly and monthly price rollups from market_price, e.g. after loading with refresh_state=false."""
+    try:
+        db = next(get_db('sec_master'))
+
+        since_by_symbol = None if request.symbols is None else dict.fromkeys(request.symbols)
+        written = refresh_price_rollups(db, since_by_symbol)
+        db.commit()
+
+        return create_success_response(data={"written": written}, message="Price rollups refreshed successfully")
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error refreshing price rollups: {e}")
+        raise handle_database_error(e, "refreshing price rollups")
@@ -0,0 +1,143 @@
+import select
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+import psycopg2
+from sqlalchemy.sql import text
+
+from app.util.database import get_engine
+from app.util.logger import logger
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe in-process LRU cache whose entries also expire after a fixed time-to-live.
+
+    With maxbytes, entries are also evicted to keep the total sizeof() of the
+    cached values within the limit; a value larger than the limit is not cached.
+
+    pop() and clear() advance a generation counter. A reader that takes
+    generation before loading a value and passes it to set() never stores a
+    value loaded before an invalidation that arrived while it was loading.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, maxbytes: Optional[int] = None,
+                 sizeof: Optional[Callable[[Any], int]] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._data.pop(key, _MISSING)
+        if entry is not _MISSING:
+            self._bytes -= entry[2]
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default if it is missing or expired."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[1] < time.monotonic():
+                if entry is not _MISSING:
+                    self._remove(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    @property
+    def generation(self) -> int:
+        """Number of invalidations (pop or clear) so far."""
+        return self._generation
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, generation: Optional[int] = None) -> None:
+        """Store a value, evicting the least recently used entries when full.
+
+        With generation, the value is dropped if the cache was invalidated since that generation.
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        size = self.sizeof(value) if self.maxbytes is not None and self.sizeof is not None else 0
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._remove(key)
+            if self.maxbytes is not None and size > self.maxbytes:
+                return
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._data) > self.maxsize or (self.maxbytes is not None and self._bytes > self.maxbytes):
+                self._remove(next(iter(self._data)))
+
+    def pop(self, key: Hashable) -> None:
+        """Remove a single entry if present."""
+        with self._lock:
+            self._generation += 1
+            self._remove(key)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size, for monitoring."""
+        return {"size": len(self._data), "maxsize": self.maxsize, "bytes": self._bytes, "maxbytes": self.maxbytes,
+                "hits": self.hits, "misses": self.misses}
+
+
+async def notify(db, channel: str, payload: str = "") -> None:
+    """Queue a NOTIFY on channel; PostgreSQL delivers it to listeners when the transaction commits."""
+    await db.execute(text("SELECT pg_notify(:channel, :payload)"), {'channel': channel, 'payload': payload})
+
+
+def start_listener(database_name: str, channel: str, callback: Callable[[str], None],
+                   retry_seconds: float = 5.0) -> threading.Thread:
+    """Run callback(payload) for every NOTIFY on channel, in a daemon thread with its own connection.
+
+    The connection is re-established after errors, and callback is also run
+    with an empty payload on every (re)connect, since notifications sent
+    while disconnected are lost.
+    """
+    def listen():
+        while True:
+            connection = None
+            try:
+                # A dedicated connection outside the pool, since it is held for the lifetime of the process
+                url = get_engine(database_name).url.set(drivername="postgresql")
+                connection = psycopg2.connect(url.render_as_string(hide_password=False))
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{channel}"')
+                logger.info(f"Listening for {channel} notifications on {database_name}")
+                callback("")
+
+                while True:
+                    if select.select([connection], [], [], 60.0) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        callback(connection.notifies.pop(0).payload)
+            except Exception as e:
+                logger.warning(f"{channel} listener on {database_name} failed, retrying: {e}")
+            finally:
+                if connection is not None:
+                    connection.close()
+            time.sleep(retry_seconds)
+
+    thread = threading.Thread(target=listen, name=f"listen-{channel}", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,111 @@
+import io
+from enum import Enum
+from typing import Any, Dict, Iterable, Iterator, Optional
+from fastapi import Request
+
+from app.util.http_cache import negotiate_media_type
+from app.util.json_response import dumps
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/x-parquet"
+
+
+class TableFormat(Enum):
+    """Representations of tabular responses, in server preference order; values are the media types."""
+    json = "application/json"
+    arrow = ARROW_STREAM_MEDIA_TYPE
+    parquet = PARQUET_MEDIA_TYPE
+
+
+def negotiate_table_format(request: Request) -> TableFormat:
+    """JSON, unless the Accept header prefers an Arrow IPC stream or Parquet."""
+    return TableFormat(negotiate_media_type(request, [table_format.value for table_format in TableFormat]))
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file handing out what was written since the last take().
+
+    The position keeps counting across takes, so Parquet footers record
+    correct offsets while the bytes are streamed out.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _array(values):
+    """Arrow array from a NumPy array or list; NaN becomes null, and a column of only nulls is float64."""
+    import pyarrow as pa
+
+    array = pa.array(values, from_pandas=True)
+    return array.cast(pa.float64()) if pa.types.is_null(array.type) else array
+
+
+def record_batch(columns: Dict[str, Any], schema=None):
+    """Record batch from named columns, typed by the schema if one is given."""
+    import pyarrow as pa
+
+    if schema is None:
+        return pa.record_batch([_array(values) for values in columns.values()], names=list(columns))
+    return pa.record_batch(
+        [pa.array(columns[field.name], type=field.type, from_pandas=True) for field in schema],
+        schema=schema
+    )
+
+
+def with_metadata(schema, metadata: Optional[Dict[str, Any]]):
+    """Schema carrying response-level values (dates, missing symbols, ...) as JSON-encoded metadata."""
+    if not metadata:
+        return schema
+    return schema.with_metadata({key: dumps(value) for key, value in metadata.items()})
+
+
+def iter_table_bytes(batches: Iterable, schema, table_format: TableFormat) -> Iterator[bytes]:
+    """Encode record batches as an Arrow IPC stream or a Parquet file, yielding bytes batch by batch.
+
+    Each batch becomes a Parquet row group; the Parquet footer follows the last one.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    if table_format == TableFormat.arrow:
+        writer = pa.ipc.new_stream(sink, schema)
+    elif table_format == TableFormat.parquet:
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        raise ValueError(f"{table_format.value} is not a columnar format")
+
+    with writer:
+        for batch in batches:
+            if table_format == TableFormat.arrow:
+                writer.write_batch(batch)
+            else:
+                writer.write_batch(batch, row_group_size=max(batch.num_rows, 1))
+            yield sink.take()
+    yield sink.take()
+
+
+def table_bytes(columns: Dict[str, Any], table_format: TableFormat, metadata: Optional[Dict[str, Any]] = None) -> bytes:
+    """Encode named columns (NumPy arrays or lists) as a single-batch Arrow IPC stream or Parquet file."""
+    batch = record_batch(columns)
+    return b"".join(iter_table_bytes([batch], with_metadata(batch.schema, metadata), table_format))
@@ -0,0 +1,146 @@
+import zlib
+from typing import Callable, Dict, Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.util.columnar import PARQUET_MEDIA_TYPE
+from app.util.http_cache import accept_qualities
+
+# zstd and brotli are offered only when their libraries are installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Compressor settings that favour speed: responses are compressed on every request
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+BROTLI_QUALITY = 4
+
+# Already compressed internally; compressing again costs CPU for no gain
+UNCOMPRESSED_MEDIA_TYPES = (PARQUET_MEDIA_TYPE,)
+
+# An encoder takes the next piece of the body and whether it is the last, and returns the compressed bytes.
+# Pieces are flushed so streamed responses can be decoded as they arrive.
+Encoder = Callable[[bytes, bool], bytes]
+
+
+def _gzip_encoder() -> Encoder:
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def encode(data: bytes, final: bool) -> bytes:
+        return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+    return encode
+
+
+def _zstd_encoder() -> Encoder:
+    compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def encode(data: bytes, final: bool) -> bytes:
+        mode = zstandard.COMPRESSOBJ_FLUSH_FINISH if final else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        return compressor.compress(data) + compressor.flush(mode)
+    return encode
+
+
+def _brotli_encoder() -> Encoder:
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def encode(data: bytes, final: bool) -> bytes:
+        return compressor.process(data) + (compressor.finish() if final else compressor.flush())
+    return encode
+
+
+# Available content codings in server preference order
+ENCODERS: Dict[str, Callable[[], Encoder]] = {
+    **({"zstd": _zstd_encoder} if zstandard is not None else {}),
+    **({"br": _brotli_encoder} if brotli is not None else {}),
+    "gzip": _gzip_encoder,
+}
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """The available coding the Accept-Encoding header rates highest (ties go to server preference), or None."""
+    qualities = dict(reversed(accept_qualities(accept_encoding)))
+    wildcard = qualities.get("*", 0.0)
+    best = max(ENCODERS, key=lambda coding: qualities.get(coding, wildcard))
+    return best if qualities.get(best, wildcard) > 0 else None
+
+
+class CompressionMiddleware:
+    """Compress responses of at least minimum_size bytes with zstd, brotli or gzip, as the client accepts.
+
+    Streamed responses are always compressed, piece by piece. Responses that
+    already have a Content-Encoding, or whose media type is compressed
+    internally, are sent as they are. The ETag of a compressed response is
+    made weak, since its bytes differ from the uncompressed representation.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        coding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        initial_message: Message = {}
+        encode: Optional[Encoder] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal initial_message, encode, passthrough
+            if message["type"] == "http.response.start":
+                # Hold the headers back until the first body shows whether to compress
+                initial_message = message
+                headers = Headers(raw=message["headers"])
+                media_type = headers.get("content-type", "").split(";")[0].strip()
+                passthrough = "content-encoding" in headers or media_type in UNCOMPRESSED_MEDIA_TYPES
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if encode is None and initial_message:
+                start, initial_message = initial_message, {}
+                if passthrough or (len(body) < self.minimum_size and not more_body):
+                    passthrough = True
+                    await send(start)
+                else:
+                    encode = ENCODERS[coding]()
+                    headers = MutableHeaders(raw=start["headers"])
+                    headers["Content-Encoding"] = coding
+                    headers.add_vary_header("Accept-Encoding")
+                    etag = headers.get("etag")
+                    if etag and not etag.startswith("W/"):
+                        headers["ETag"] = f"W/{etag}"
+                    if more_body:
+                        del headers["Content-Length"]
+                    else:
+                        body = encode(body, True)
+                        headers["Content-Length"] = str(len(body))
+                        await send(start)
+                        await send({**message, "body": body})
+                        return
+                    await send(start)
+
+            if passthrough:
+                await send(message)
+            else:
+                await send({**message, "body": encode(body, not more_body)})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,7 +1,21 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from app.core.config import settings
+from app.util.db_pool import (
+    InstrumentedAsyncQueuePool,
+    InstrumentedQueuePool,
+    PoolStats,
+    instrument_engine,
+    pool_status
+)
 from app.util.logger import logger
+from contextvars import ContextVar
+from itertools import count
+from uuid import uuid4
 import os
+import time
 from dotenv import load_dotenv
 
 # Load environment variables from .env file (if it exists)
@@ -17,45 +31,114 @@ DB_CONFIG_TEMPLATE = {
 }
 
 
+def _host_and_port(replica=None):
+    """Host and port of the primary, or of a replica given as 'host' or 'host:port'."""
+    if replica is None:
+        return DB_CONFIG_TEMPLATE['host'], DB_CONFIG_TEMPLATE['port']
+    host, _, port = replica.partition(':')
+    return host, int(port or DB_CONFIG_TEMPLATE['port'])
+
+
 # Utility function to generate the database URL
-def get_database_url(database_name):
+def get_database_url(database_name, replica=None):
     """Generate database URL from configuration. Raises error if password not set."""
     if not DB_CONFIG_TEMPLATE['password']:
         raise ValueError("DB_PASSWORD environment variable is required")
     
     # Add SSL mode for managed services (can be overridden)
     ssl_mode = os.getenv('DB_SSLMODE', 'prefer')
+    host, port = _host_and_port(replica)
     
     return (
         f"postgresql+psycopg2://{DB_CONFIG_TEMPLATE['user']}:{DB_CONFIG_TEMPLATE['password']}@"
-        f"{DB_CONFIG_TEMPLATE['host']}:{DB_CONFIG_TEMPLATE['port']}/{database_name}"
+        f"{host}:{port}/{database_name}"
         f"?sslmode={ssl_mode}"
     )
 
 
+# Read replica routing. Reads go round-robin to the replicas in settings.DB_REPLICAS
+# that have not recently failed; writes, and reads while read_from_primary is set
+# (read-your-writes), go to the primary.
+read_from_primary = ContextVar('read_from_primary', default=False)
+replica_down_until = {}  # (database_name, replica) -> monotonic time until which it is skipped
+_replica_cursor = count()
+
+
+def choose_replica(database_name):
+    """Pick the next healthy replica for a read, or None to read from the primary."""
+    replicas = settings.DB_REPLICAS.get(database_name, [])
+    if not replicas or read_from_primary.get():
+        return None
+
+    now = time.monotonic()
+    start = next(_replica_cursor)
+    for offset in range(len(replicas)):
+        replica = replicas[(start + offset) % len(replicas)]
+        if replica_down_until.get((database_name, replica), 0.0) <= now:
+            return replica
+
+    logger.warning(f"No healthy replica for {database_name}, reading from the primary")
+    return None
+
+
+def _track_replica_health(engine, database_name, replica):
+    """Take a replica out of rotation for DB_REPLICA_RETRY_SECONDS when it refuses or drops connections."""
+    @event.listens_for(engine, "handle_error")
+    def on_error(context):
+        if context.connection is None or context.is_disconnect:
+            replica_down_until[(database_name, replica)] = time.monotonic() + settings.DB_REPLICA_RETRY_SECONDS
+            logger.warning(f"Replica {replica} of {database_name} marked unhealthy: {context.original_exception}")
+
+
 # Connection pool manager
-engines = {}  # Cache for database engines
+engines = {}  # Cache for database engines, keyed by database or database@replica
+session_factories = {}  # Cache for session factories
 
 
-def get_engine(database_name):
-    """Get or create an engine for the specified database."""
-    if database_name not in engines:
-        engines[database_name] = create_engine(
-            get_database_url(database_name),
-            pool_size=10,
-            max_overflow=20,
+def get_pool_options(database_name):
+    """Pool sizing for a database: the DB_POOL_* settings, overridden by DB_POOL_OVERRIDES[database_name].
+
+    In pgbouncer mode connections are not pooled in-process (NullPool); pgbouncer does the pooling.
+    """
+    if settings.DB_PGBOUNCER_MODE:
+        return {'poolclass': NullPool}
+
+    options = {
+        'pool_size': settings.DB_POOL_SIZE,
+        'max_overflow': settings.DB_MAX_OVERFLOW,
+        'pool_timeout': settings.DB_POOL_TIMEOUT,
+        'pool_recycle': settings.DB_POOL_RECYCLE,
+    }
+    options.update(settings.DB_POOL_OVERRIDES.get(database_name, {}))
+    return options
+
+
+def get_engine(database_name, read_only=False):
+    """Get or create an engine for the specified database.
+
+    With read_only=True the engine of a healthy replica is returned when replicas are configured.
+    """
+    replica = choose_replica(database_name) if read_only else None
+    key = database_name if replica is None else f"{database_name}@{replica}"
+    if key not in engines:
+        engines[key] = create_engine(
+            get_database_url(database_name, replica),
             pool_pre_ping=True,
-            future=True  # Enables modern SQLAlchemy 1.4+ behavior
+            future=True,  # Enables modern SQLAlchemy 1.4+ behavior
+            **{'poolclass': InstrumentedQueuePool, **get_pool_options(database_name)}
         )
-    return engines[database_name]
+        instrument_engine(engines[key], PoolStats())
+        if replica is not None:
+            _track_replica_health(engines[key], database_name, replica)
+    return engines[key]
 
 
 # Session factory
-def get_db(database_name):
-    """Provide a session for the specified database."""
-    engine = get_engine(database_name)
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    db = SessionLocal()
+def get_db(database_name, read_only=False):
+    """Provide a session for the specified database (a replica session if read_only)."""
+    if database_name not in session_factories:
+        session_factories[database_name] = sessionmaker(autocommit=False, autoflush=False)
+    db = session_factories[database_name](bind=get_engine(database_name, read_only))
     try:
         logger.info(f"Database connection established for {database_name}")
         yield db
@@ -64,6 +147,94 @@ def get_db(database_name):
         db.close()
 
 
+# Async engines (asyncpg) for routes that must not block the event loop
+async_engines = {}  # Cache for async database engines
+async_session_factories = {}  # Cache for async session factories
+async_db_dependencies = {}  # Cache for FastAPI session dependencies
+
+
+def get_async_database_url(database_name, replica=None):
+    """Generate the asyncpg database URL. SSL mode is passed separately as a connect argument."""
+    if not DB_CONFIG_TEMPLATE['password']:
+        raise ValueError("DB_PASSWORD environment variable is required")
+
+    host, port = _host_and_port(replica)
+    return (
+        f"postgresql+asyncpg://{DB_CONFIG_TEMPLATE['user']}:{DB_CONFIG_TEMPLATE['password']}@"
+        f"{host}:{port}/{database_name}"
+    )
+
+
+def get_async_engine(database_name, read_only=False):
+    """Get or create an async engine for the specified database (a healthy replica if read_only)."""
+    replica = choose_replica(database_name) if read_only else None
+    key = database_name if replica is None else f"{database_name}@{replica}"
+    if key not in async_engines:
+        connect_args = {'ssl': os.getenv('DB_SSLMODE', 'prefer')}
+        if settings.DB_PGBOUNCER_MODE:
+            # pgbouncer in transaction mode may hand each transaction a different server
+            # connection, so prepared statements must not be cached or reuse names
+            connect_args.update({
+                'statement_cache_size': 0,
+                'prepared_statement_cache_size': 0,
+                'prepared_statement_name_func': lambda: f"__asyncpg_{uuid4()}__",
+            })
+
+        async_engines[key] = create_async_engine(
+            get_async_database_url(database_name, replica),
+            pool_pre_ping=True,
+            connect_args=connect_args,
+            **{'poolclass': InstrumentedAsyncQueuePool, **get_pool_options(database_name)}
+        )
+        instrument_engine(async_engines[key].sync_engine, PoolStats())
+        if replica is not None:
+            _track_replica_health(async_engines[key].sync_engine, database_name, replica)
+    return async_engines[key]
+
+
+def get_async_db(database_name, read_only=False):
+    """Build a FastAPI dependency that yields an AsyncSession for the specified database.
+
+    Usage: db: AsyncSession = Depends(get_async_db('sec_master'))
+           db: AsyncSession = Depends(get_async_db('sec_master', read_only=True))  # replica for GETs
+    """
+    # Reuse one dependency callable per database so app.dependency_overrides can target it
+    if (database_name, read_only) not in async_db_dependencies:
+        async def async_db_session():
+            if database_name not in async_session_factories:
+                async_session_factories[database_name] = async_sessionmaker(
+                    class_=AsyncSession, autoflush=False, expire_on_commit=False
+                )
+            engine = get_async_engine(database_name, read_only)
+            async with async_session_factories[database_name](bind=engine) as db:
+                logger.debug(f"Async database session opened for {database_name}")
+                yield db
+
+        async_db_dependencies[(database_name, read_only)] = async_db_session
+    return async_db_dependencies[(database_name, read_only)]
+
+
+async def dispose_async_engines():
+    """Close all pooled async connections; called on application shutdown."""
+    for engine in async_engines.values():
+        await engine.dispose()
+    async_engines.clear()
+    async_session_factories.clear()
+
+
+def get_pool_metrics():
+    """Occupancy, checkout wait and overflow counters for every engine created so far."""
+    return {
+        "pgbouncer_mode": settings.DB_PGBOUNCER_MODE,
+        "unhealthy_replicas": [
+            f"{database_name}@{replica}" for (database_name, replica), until in replica_down_until.items()
+            if until > time.monotonic()
+        ],
+        "sync": {name: pool_status(engine) for name, engine in engines.items()},
+        "async": {name: pool_status(engine.sync_engine) for name, engine in async_engines.items()},
+    }
+
+
 # Test connection
 if __name__ == "__main__":
     try:
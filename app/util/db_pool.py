@@ -0,0 +1,105 @@
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+
+class PoolStats:
+    """Cumulative checkout counters for one connection pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.overflow_events = 0
+        self.connects = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_checkout(self, wait: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def record_connect(self, overflow: bool) -> None:
+        with self._lock:
+            self.connects += 1
+            if overflow:
+                self.overflow_events += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.timeouts,
+                "avg_checkout_wait_ms": round(1000 * self.total_wait / attempts, 3) if attempts else 0.0,
+                "max_checkout_wait_ms": round(1000 * self.max_wait, 3),
+                "connects": self.connects,
+                "overflow_events": self.overflow_events,
+            }
+
+
+class _InstrumentedPoolMixin:
+    """Times every checkout from the underlying queue and keeps the stats across pool recreation."""
+
+    stats: PoolStats
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record_checkout(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record_checkout(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument_engine(engine, stats: PoolStats) -> None:
+    """Attach stats to an engine's pool and count new and overflow connections."""
+    pool = engine.pool
+    pool.stats = stats
+
+    @event.listens_for(pool, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        # QueuePool bumps its overflow counter before opening a connection past pool_size
+        overflow = isinstance(engine.pool, QueuePool) and engine.pool.overflow() > 0
+        engine.pool.stats.record_connect(overflow)
+
+
+def pool_status(engine) -> dict:
+    """Point-in-time pool occupancy combined with the cumulative stats."""
+    pool = engine.pool
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "pool_size": pool.size(),
+            "in_use": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+        })
+    elif isinstance(pool, NullPool):
+        status["in_use"] = None
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        status.update(stats.snapshot())
+    return status
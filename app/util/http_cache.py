@@ -0,0 +1,86 @@
+import hashlib
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+from fastapi import Request, Response
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag from the values that determine a response (data versions, request parameters, ...)."""
+    digest = hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def cache_control(max_age: int) -> str:
+    """Cache-Control value letting clients reuse a response for max_age seconds, then revalidate."""
+    return f"public, max-age={max_age}, must-revalidate"
+
+
+def cache_headers(etag: str, max_age: int) -> dict:
+    """ETag and Cache-Control headers for a response."""
+    return {"ETag": etag, "Cache-Control": cache_control(max_age)}
+
+
+def _if_none_match(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match header matches the ETag (weak comparison, as RFC 9110 requires)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def not_modified(request: Request, response: Optional[Response], etag: str, max_age: int) -> Optional[Response]:
+    """Set ETag and Cache-Control on a response; returns a 304 response if the client's copy is current.
+
+    Routes call this once the data version is known and return the 304 as is,
+    skipping the query and serialization of the body.
+    """
+    headers = cache_headers(etag, max_age)
+    if response is not None:
+        response.headers.update(headers)
+    if _if_none_match(request, etag):
+        return Response(status_code=304, headers=headers)
+    return None
+
+
+def accept_qualities(header: str) -> List[Tuple[str, float]]:
+    """(value, quality) pairs of an Accept or Accept-Encoding header, in header order; a missing q is 1."""
+    qualities = []
+    for item in header.split(","):
+        value, *params = (part.strip() for part in item.split(";"))
+        if not value:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, number = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        qualities.append((value.lower(), quality))
+    return qualities
+
+
+def negotiate_media_type(request: Request, media_types: Sequence[str]) -> str:
+    """The offered media type the Accept header rates highest; ties and no match give the earliest offered.
+
+    Offers are listed in server preference order, so the first one is also
+    the default for requests without an Accept header.
+    """
+    header = request.headers.get("accept")
+    if not header:
+        return media_types[0]
+
+    # The first occurrence of a range counts; the most specific matching range decides
+    ranges = dict(reversed(accept_qualities(header)))
+
+    def quality(media_type: str) -> float:
+        for accepted in (media_type, f"{media_type.split('/')[0]}/*", "*/*"):
+            if accepted in ranges:
+                return ranges[accepted]
+        return 0.0
+
+    best = max(media_types, key=lambda media_type: (quality(media_type), -media_types.index(media_type)))
+    return best if quality(best) > 0 else media_types[0]
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import socket
+import threading
+from contextlib import contextmanager
+from enum import Enum
+from typing import Any, Callable, Optional
+from fastapi import HTTPException
+from sqlalchemy.sql import text
+
+from app.core.config import settings
+from app.util.cache import start_listener
+from app.util.database import get_db
+from app.util.json_response import dumps
+from app.util.logger import logger
+
+# Submissions send the new job id on this channel so idle workers pick it up without waiting to poll
+JOB_CHANNEL = "metric_job"
+
+# Statuses of jobs that are still waiting or running; identical jobs in these states are deduplicated
+IN_FLIGHT_STATUSES = ("queued", "running")
+
+
+class JobStatus(Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+
+def job_key(job_type: str, params: dict) -> str:
+    """Deduplication key: a hash of the job type and its parameters as canonical JSON."""
+    canonical = json.dumps({"job_type": job_type, "params": params}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def claim_job(db, worker: str):
+    """Take the oldest runnable job, or None; the claim is committed before the job runs.
+
+    Running jobs whose heartbeat is older than JOB_LEASE_SECONDS (their worker
+    died) are claimed again until they reach JOB_MAX_ATTEMPTS, after which
+    they are failed. SKIP LOCKED lets any number of workers poll the table
+    without contending.
+    """
+    params = {
+        'worker': worker,
+        'lease': settings.JOB_LEASE_SECONDS,
+        'max_attempts': settings.JOB_MAX_ATTEMPTS,
+    }
+    db.execute(
+        text("""
+            UPDATE metric_job
+            SET status = 'failed', error = 'Worker stopped responding', finished_at = clock_timestamp()
+            WHERE status = 'running'
+              AND COALESCE(last_seen_at, started_at) < clock_timestamp() - make_interval(secs => :lease)
+              AND attempts >= :max_attempts
+        """),
+        params
+    )
+    job = db.execute(
+        text("""
+            UPDATE metric_job
+            SET status = 'running', worker = :worker, attempts = attempts + 1,
+                started_at = clock_timestamp(), last_seen_at = clock_timestamp()
+            WHERE id = (
+                SELECT id FROM metric_job
+                WHERE status = 'queued'
+                   OR (status = 'running'
+                       AND COALESCE(last_seen_at, started_at) < clock_timestamp() - make_interval(secs => :lease)
+                       AND attempts < :max_attempts)
+                ORDER BY id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, job_type, params
+        """),
+        params
+    ).fetchone()
+    db.commit()
+    return job
+
+
+def _send_heartbeats(job_id: int, worker: str, stop: threading.Event) -> None:
+    """Refresh a running job's last_seen_at every JOB_HEARTBEAT_SECONDS until stopped, on its own session."""
+    db_session = get_db('sec_master')
+    db = next(db_session)
+    try:
+        while not stop.wait(settings.JOB_HEARTBEAT_SECONDS):
+            try:
+                seen = db.execute(
+                    text("""
+                        UPDATE metric_job SET last_seen_at = clock_timestamp()
+                        WHERE id = :id AND worker = :worker AND status = 'running'
+                    """),
+                    {'id': job_id, 'worker': worker}
+                ).rowcount
+                db.commit()
+                if not seen:
+                    logger.warning(f"Job {job_id} is no longer held by worker {worker}")
+                    return
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Heartbeat for job {job_id} failed: {e}")
+    finally:
+        db_session.close()
+
+
+@contextmanager
+def job_heartbeat(job_id: int, worker: str):
+    """Keep the lease on a claimed job alive while the block runs."""
+    stop = threading.Event()
+    thread = threading.Thread(target=_send_heartbeats, args=(job_id, worker, stop),
+                              name=f"job-heartbeat-{job_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def execute_job(db, job, run_job: Callable[[Any, str, dict], dict], worker: str) -> bool:
+    """Run a claimed job and store its result or error; returns whether it succeeded.
+
+    Writes made by the job commit in the same transaction as its result. If
+    another worker has reclaimed the job meanwhile, the result is not stored
+    and the job's writes are rolled back.
+    """
+    logger.info(f"Running job {job.id} ({job.job_type})")
+    try:
+        result = run_job(db, job.job_type, job.params)
+        stored = db.execute(
+            text("""
+                UPDATE metric_job
+                SET status = 'succeeded', result = CAST(:result AS JSONB), error = NULL, finished_at = clock_timestamp()
+                WHERE id = :id AND worker = :worker AND status = 'running'
+            """),
+            {'id': job.id, 'worker': worker, 'result': dumps(result).decode()}
+        ).rowcount
+        if not stored:
+            db.rollback()
+            logger.warning(f"Job {job.id} ({job.job_type}) was reclaimed by another worker; discarded its result")
+            return False
+        db.commit()
+        logger.info(f"Job {job.id} ({job.job_type}) succeeded")
+        return True
+
+    except Exception as e:
+        db.rollback()
+        error = e.detail if isinstance(e, HTTPException) else str(e)
+        logger.error(f"Job {job.id} ({job.job_type}) failed: {error}")
+        db.execute(
+            text("""
+                UPDATE metric_job
+                SET status = 'failed', error = :error, finished_at = clock_timestamp()
+                WHERE id = :id AND worker = :worker AND status = 'running'
+            """),
+            {'id': job.id, 'worker': worker, 'error': str(error)[:2000]}
+        )
+        db.commit()
+        return False
+
+
+def run_worker(run_job: Callable[[Any, str, dict], dict], worker: Optional[str] = None) -> None:
+    """Claim and run queued jobs forever, one at a time.
+
+    An idle worker sleeps until a submission NOTIFY arrives or
+    JOB_POLL_SECONDS pass, whichever is first. A database error outside the
+    job itself (a lost connection, say) replaces the session; the job is left
+    to be reclaimed once its heartbeat lapses.
+    """
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    wake = threading.Event()
+    start_listener('sec_master', JOB_CHANNEL, lambda payload: wake.set())
+    logger.info(f"Job worker {worker} started")
+
+    db_session = get_db('sec_master')
+    db = next(db_session)
+    try:
+        while True:
+            wake.clear()
+            try:
+                job = claim_job(db, worker)
+                if job is None:
+                    wake.wait(settings.JOB_POLL_SECONDS)
+                    continue
+                with job_heartbeat(job.id, worker):
+                    execute_job(db, job, run_job, worker)
+
+            except Exception as e:
+                logger.error(f"Job worker {worker} lost its session, reconnecting: {e}")
+                db_session.close()
+                db_session = get_db('sec_master')
+                db = next(db_session)
+                wake.wait(settings.JOB_POLL_SECONDS)
+    finally:
+        db_session.close()
@@ -0,0 +1,26 @@
+from typing import Any, Sequence
+import orjson
+from fastapi import Response
+
+# NumPy arrays serialize natively (NaN and inf become null) and dict keys need not be strings
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+class JSONBytesResponse(Response):
+    """Response whose body has already been serialized to JSON bytes."""
+    media_type = "application/json"
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize plain Python, datetime and NumPy values to JSON bytes with orjson."""
+    return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+def rows_to_json(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> bytes:
+    """Serialize DB rows as a JSON array of objects in one pass, without building a model per row.
+
+    Only for rows whose values are already JSON types (cast DECIMAL columns
+    to float8 in SQL); the response schema is documented by the route's
+    response_model but not re-validated.
+    """
+    return orjson.dumps([dict(zip(columns, row)) for row in rows], option=ORJSON_OPTIONS)
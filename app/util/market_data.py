@@ -0,0 +1,167 @@
+from enum import Enum
+from typing import Callable, List, Optional
+from datetime import date
+import numpy as np
+from sqlalchemy.sql import text
+
+from app.util.metrics import TRADING_DAYS_PER_YEAR, build_price_panel
+
+
+class PriceField(Enum):
+    close_price = "close_price"
+    adjusted_close = "adjusted_close"
+
+
+class Frequency(Enum):
+    daily = "daily"
+    weekly = "weekly"
+    monthly = "monthly"
+    # Finest frequency that keeps the requested date range within a point budget
+    auto = "auto"
+
+
+# Observations per year at each frequency, used to annualize metrics
+PERIODS_PER_YEAR = {
+    Frequency.daily: TRADING_DAYS_PER_YEAR,
+    Frequency.weekly: 52,
+    Frequency.monthly: 12,
+}
+
+# Average calendar days per observation at each frequency
+_DAYS_PER_PERIOD = {
+    Frequency.daily: 365.25 / TRADING_DAYS_PER_YEAR,
+    Frequency.weekly: 7.0,
+    Frequency.monthly: 365.25 / 12,
+}
+
+
+# SQL expressions for each price field. Adjusted close falls back to the raw close
+# for rows where no adjustment has been loaded. Values are cast to float8 so the
+# driver hands back Python floats instead of Decimals.
+PRICE_COLUMNS = {
+    PriceField.close_price: "close_price::float8",
+    PriceField.adjusted_close: "COALESCE(adjusted_close, close_price)::float8",
+}
+
+
+def universe_symbols(db) -> List[str]:
+    """Every symbol in securities, in symbol order."""
+    return [row[0] for row in db.execute(text("SELECT symbol FROM securities ORDER BY symbol"))]
+
+
+# Earliest price date of :symbols (every symbol if NULL) and NAV date of :portfolio_ids.
+# Each is one probe of an index that leads with the symbol or portfolio (the primary key,
+# on date, for every symbol). close_price is never NULL, so this holds for every price field.
+FIRST_PRICE_DATE_SQL = text("""
+    SELECT min(first_date) FROM (
+        SELECT min(date) AS first_date FROM market_price WHERE CAST(:symbols AS VARCHAR[]) IS NULL
+        UNION ALL
+        SELECT (SELECT mp.date FROM market_price mp WHERE mp.symbol = s.symbol ORDER BY mp.date LIMIT 1)
+        FROM unnest(CAST(:symbols AS VARCHAR[])) AS s(symbol)
+        UNION ALL
+        SELECT min(date) FROM portfolio_nav WHERE portfolio_id = ANY(CAST(:portfolio_ids AS VARCHAR[]))
+    ) first_dates
+""")
+
+
+def first_price_date(db, symbols: Optional[List[str]], frequency: Frequency, start_date: Optional[date],
+                     portfolio_ids: Optional[List[str]] = None) -> Optional[date]:
+    """The start to resolve an auto frequency from: start_date, or the first price or NAV date if it is open."""
+    if frequency != Frequency.auto or start_date is not None:
+        return start_date
+    return db.execute(FIRST_PRICE_DATE_SQL, {'symbols': symbols, 'portfolio_ids': portfolio_ids}).scalar()
+
+
+def resolve_frequency(frequency: Frequency, start_date: Optional[date], end_date: Optional[date],
+                      max_points: int) -> Frequency:
+    """Resolve Frequency.auto to the finest frequency giving at most max_points over the date range.
+
+    For open-ended ranges pass the first price date as start_date (see
+    first_price_date); with no start at all there is no history to coarsen.
+    """
+    if frequency != Frequency.auto:
+        return frequency
+    if start_date is None:
+        return Frequency.daily
+
+    days = ((end_date or date.today()) - start_date).days
+    for candidate in (Frequency.daily, Frequency.weekly):
+        if days / _DAYS_PER_PERIOD[candidate] <= max_points:
+            return candidate
+    return Frequency.monthly
+
+
+def price_source(frequency: Frequency = Frequency.daily):
+    """(table, date column, extra condition) to read prices at a frequency from.
+
+    Weekly and monthly prices come from the market_price_rollup table, dated by
+    the last trading day of each period.
+    """
+    if frequency == Frequency.daily:
+        return "market_price", "date", ""
+    return "market_price_rollup", "period_end", f" AND frequency = '{frequency.value}'"
+
+
+def price_version(frequency: Frequency = Frequency.daily):
+    """Query for the data version of the prices of :symbols in a date range: (row count, latest updated_at).
+
+    Any load or correction of those prices changes it, so it can key HTTP
+    ETags and response caches without reading the prices themselves.
+    """
+    table, date_column, condition = price_source(frequency)
+    return text(f"""
+        SELECT count(*), max(updated_at)
+        FROM {table}
+        WHERE symbol = ANY(:symbols){condition}
+          AND (CAST(:start_date AS DATE) IS NULL OR {date_column} >= :start_date)
+          AND (CAST(:end_date AS DATE) IS NULL OR {date_column} <= :end_date)
+    """)
+
+
+def load_price_series(db, symbol: str, start_date: Optional[date], end_date: Optional[date],
+                      price_field: PriceField = PriceField.close_price, frequency: Frequency = Frequency.daily):
+    """Load the date-ordered price series for a symbol as (dates, float64 prices)."""
+    table, date_column, condition = price_source(frequency)
+    rows = db.execute(
+        text(f"""
+            SELECT {date_column}, {PRICE_COLUMNS[price_field]}
+            FROM {table}
+            WHERE symbol = :symbol{condition}
+              AND (CAST(:start_date AS DATE) IS NULL OR {date_column} >= :start_date)
+              AND (CAST(:end_date AS DATE) IS NULL OR {date_column} <= :end_date)
+            ORDER BY {date_column}
+        """),
+        {'symbol': symbol, 'start_date': start_date, 'end_date': end_date}
+    ).fetchall()
+
+    if not rows:
+        return [], np.empty(0, dtype=np.float64)
+
+    dates, prices = zip(*rows)
+    return list(dates), np.array(prices, dtype=np.float64)
+
+
+def load_price_panel(db, symbols: List[str], start_date: Optional[date], end_date: Optional[date],
+                     price_field: PriceField = PriceField.close_price, frequency: Frequency = Frequency.daily,
+                     allocate: Optional[Callable] = None):
+    """Load prices for many symbols with one set-based query and pivot them into a dates x symbols panel.
+
+    allocate is passed to build_price_panel.
+    """
+    table, date_column, condition = price_source(frequency)
+    rows = db.execute(
+        text(f"""
+            SELECT {date_column}, symbol, {PRICE_COLUMNS[price_field]}
+            FROM {table}
+            WHERE symbol = ANY(:symbols){condition}
+              AND (CAST(:start_date AS DATE) IS NULL OR {date_column} >= :start_date)
+              AND (CAST(:end_date AS DATE) IS NULL OR {date_column} <= :end_date)
+        """),
+        {'symbols': symbols, 'start_date': start_date, 'end_date': end_date}
+    ).fetchall()
+
+    if not rows:
+        return np.empty(0, dtype="datetime64[D]"), np.empty(0, dtype=str), np.empty((0, 0))
+
+    dates, row_symbols, prices = zip(*rows)
+    return build_price_panel(dates, row_symbols, prices, allocate)
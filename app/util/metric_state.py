@@ -0,0 +1,176 @@
+from datetime import date
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy.sql import text
+
+from app.util.market_data import PRICE_COLUMNS, PriceField
+from app.util.metrics import update_running_state
+from app.util.logger import logger
+
+# Number of symbols whose new prices are loaded and folded per round trip
+METRIC_STATE_CHUNK_SIZE = 500
+
+STATE_FIELDS = (
+    "first_price",
+    "last_price",
+    "running_peak",
+    "max_drawdown",
+    "return_count",
+    "mean_return",
+    "m2_return",
+)
+
+
+def mark_metric_state_stale(db, since_by_symbol: Dict[str, date]) -> int:
+    """Flag the states of symbols whose prices changed on or before their last_date for a rebuild.
+
+    since_by_symbol maps each symbol to the earliest date whose prices were
+    loaded, corrected or deleted. Run it in the transaction that changes the
+    prices (every price load does, whether or not it refreshes the state), so
+    refreshes never have to rescan market_price to find rewritten history.
+    Returns the number of states flagged.
+    """
+    symbols = sorted(since_by_symbol)
+    return db.execute(
+        text("""
+            UPDATE metric_state ms SET rebuild_required = true
+            FROM unnest(CAST(:symbols AS VARCHAR[]), CAST(:since AS DATE[])) AS s(symbol, since)
+            WHERE ms.symbol = s.symbol AND s.since <= ms.last_date AND NOT ms.rebuild_required
+        """),
+        {'symbols': symbols, 'since': [since_by_symbol[symbol] for symbol in symbols]}
+    ).rowcount
+
+
+def load_metric_state(db, symbol: str, price_field: PriceField = PriceField.close_price) -> Optional[Dict]:
+    """Load the persisted running state for a symbol, or None if it is missing or behind its prices.
+
+    A state flagged for a rebuild, or with prices loaded after its last_date
+    (a load that did not refresh it), is not current. The check is one index
+    probe on market_price (symbol, date), not a scan of the history.
+    """
+    row = db.execute(
+        text("""
+            SELECT ms.symbol, ms.first_date, ms.last_date, ms.first_price, ms.last_price, ms.running_peak,
+                   ms.max_drawdown, ms.return_count, ms.mean_return, ms.m2_return, ms.updated_at
+            FROM metric_state ms
+            WHERE ms.symbol = :symbol AND ms.price_field = :price_field
+              AND NOT ms.rebuild_required
+              AND NOT EXISTS (
+                  SELECT 1 FROM market_price mp WHERE mp.symbol = ms.symbol AND mp.date > ms.last_date
+              )
+        """),
+        {'symbol': symbol, 'price_field': price_field.value}
+    ).mappings().fetchone()
+    return dict(row) if row else None
+
+
+def _refresh_chunk(db, symbols: List[str], price_field: PriceField, rebuild: bool) -> int:
+    """Fold new prices for one chunk of symbols into metric_state; returns the number of states written."""
+    # Lock existing states; those whose history was rewritten at or before last_date were
+    # flagged by mark_metric_state_stale when the prices changed and are rebuilt from scratch
+    states = db.execute(
+        text("""
+            SELECT ms.symbol, ms.first_date, ms.last_date, ms.first_price, ms.last_price,
+                   ms.running_peak, ms.max_drawdown, ms.return_count, ms.mean_return, ms.m2_return,
+                   ms.rebuild_required AS stale
+            FROM metric_state ms
+            WHERE ms.symbol = ANY(:symbols) AND ms.price_field = :price_field
+            FOR UPDATE
+        """),
+        {'symbols': symbols, 'price_field': price_field.value}
+    ).mappings().fetchall()
+
+    current = {row['symbol']: dict(row) for row in states if not (rebuild or row['stale'])}
+    rebuilt = {row['symbol'] for row in states} - set(current)
+    since = [current[symbol]['last_date'] if symbol in current else None for symbol in symbols]
+
+    rows = db.execute(
+        text(f"""
+            SELECT mp.symbol, mp.date, {PRICE_COLUMNS[price_field]}
+            FROM market_price mp
+            JOIN unnest(CAST(:symbols AS VARCHAR[]), CAST(:since AS DATE[])) AS s(symbol, since)
+              ON mp.symbol = s.symbol
+            WHERE s.since IS NULL OR mp.date > s.since
+            ORDER BY mp.symbol, mp.date
+        """),
+        {'symbols': symbols, 'since': since}
+    ).fetchall()
+
+    # States rebuilt from no prices at all (every price was deleted) are dropped
+    orphaned = rebuilt - {row[0] for row in rows}
+    if orphaned:
+        db.execute(
+            text("DELETE FROM metric_state WHERE symbol = ANY(:symbols) AND price_field = :price_field"),
+            {'symbols': sorted(orphaned), 'price_field': price_field.value}
+        )
+
+    if not rows:
+        return 0
+
+    row_symbols, dates, prices = zip(*rows)
+    prices = np.array(prices, dtype=np.float64)
+    # Rows are ordered by symbol, so each symbol's new prices form one contiguous slice
+    keys, starts = np.unique(np.asarray(row_symbols, dtype=str), return_index=True)
+    ends = np.append(starts[1:], len(rows))
+
+    updates = []
+    for symbol, start, end in zip(keys.tolist(), starts.tolist(), ends.tolist()):
+        previous = current.get(symbol)
+        state = update_running_state(
+            {field: previous[field] for field in STATE_FIELDS} if previous else None,
+            prices[start:end]
+        )
+        updates.append({
+            'symbol': symbol,
+            'price_field': price_field.value,
+            'first_date': previous['first_date'] if previous else dates[start],
+            'last_date': dates[end - 1],
+            **state
+        })
+
+    db.execute(
+        text("""
+            INSERT INTO metric_state (
+                symbol, price_field, first_date, last_date, first_price, last_price,
+                running_peak, max_drawdown, return_count, mean_return, m2_return, rebuild_required, updated_at
+            )
+            VALUES (
+                :symbol, :price_field, :first_date, :last_date, :first_price, :last_price,
+                :running_peak, :max_drawdown, :return_count, :mean_return, :m2_return, false, clock_timestamp()
+            )
+            ON CONFLICT (symbol, price_field) DO UPDATE SET
+                first_date = EXCLUDED.first_date,
+                last_date = EXCLUDED.last_date,
+                first_price = EXCLUDED.first_price,
+                last_price = EXCLUDED.last_price,
+                running_peak = EXCLUDED.running_peak,
+                max_drawdown = EXCLUDED.max_drawdown,
+                return_count = EXCLUDED.return_count,
+                mean_return = EXCLUDED.mean_return,
+                m2_return = EXCLUDED.m2_return,
+                rebuild_required = false,
+                updated_at = EXCLUDED.updated_at
+        """),
+        updates
+    )
+    return len(updates)
+
+
+def refresh_metric_state(db, symbols: Optional[List[str]] = None,
+                         price_field: PriceField = PriceField.close_price, rebuild: bool = False) -> int:
+    """Bring metric_state up to date with market_price for the given symbols (default: all securities).
+
+    Only prices after each symbol's last_date are read. Symbols without a state,
+    or whose state was flagged by mark_metric_state_stale, are rebuilt from
+    their full history. The caller owns the transaction and must commit.
+    """
+    if symbols is None:
+        symbols = [row[0] for row in db.execute(text("SELECT symbol FROM securities ORDER BY symbol"))]
+
+    symbols = sorted(set(symbols))
+    updated = 0
+    for i in range(0, len(symbols), METRIC_STATE_CHUNK_SIZE):
+        updated += _refresh_chunk(db, symbols[i:i + METRIC_STATE_CHUNK_SIZE], price_field, rebuild)
+
+    logger.info(f"Refreshed {price_field.value} metric state for {updated} of {len(symbols)} symbols")
+    return updated
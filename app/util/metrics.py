@@ -0,0 +1,388 @@
+import numpy as np
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+# Number of daily observations per year used to annualize return and volatility
+TRADING_DAYS_PER_YEAR = 252
+
+# Metrics produced by compute_metrics, in response order
+METRIC_NAMES = (
+    "total_return",
+    "annualized_return",
+    "volatility",
+    "sharpe_ratio",
+    "max_drawdown",
+)
+
+
+def to_price_array(prices: Sequence[float]) -> np.ndarray:
+    """Convert a price sequence into a contiguous float64 array."""
+    return np.ascontiguousarray(prices, dtype=np.float64)
+
+
+def _to_optional(value: float) -> Optional[float]:
+    """Map NaN/inf results to None so they serialize cleanly to JSON."""
+    return float(value) if np.isfinite(value) else None
+
+
+def nan_to_none(values: np.ndarray) -> list:
+    """Convert an array to a list with NaN/inf replaced by None for JSON responses."""
+    result = np.asarray(values, dtype=np.float64).astype(object)
+    result[~np.isfinite(values)] = None
+    return result.tolist()
+
+
+def build_price_panel(
+    dates: Sequence,
+    symbols: Sequence[str],
+    prices: Sequence[float],
+    allocate: Optional[Callable[[Tuple[int, int]], np.ndarray]] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Pivot long (date, symbol, price) columns into a dates x symbols float64 panel.
+
+    Returns (unique sorted dates, unique sorted symbols, panel). Missing
+    observations are NaN. allocate(shape), if given, supplies the float64
+    array the panel is written into (e.g. one in shared memory).
+    """
+    date_keys, date_idx = np.unique(np.asarray(dates, dtype="datetime64[D]"), return_inverse=True)
+    symbol_keys, symbol_idx = np.unique(np.asarray(symbols, dtype=str), return_inverse=True)
+
+    shape = (date_keys.size, symbol_keys.size)
+    panel = allocate(shape) if allocate is not None else np.empty(shape, dtype=np.float64)
+    panel.fill(np.nan)
+    panel[date_idx, symbol_idx] = to_price_array(prices)
+    return date_keys, symbol_keys, panel
+
+
+def forward_fill(panel: np.ndarray) -> np.ndarray:
+    """Carry the last observed price forward down each column; leading NaNs are kept."""
+    rows = np.arange(panel.shape[0])[:, None]
+    last_valid = np.where(np.isnan(panel), 0, rows)
+    np.maximum.accumulate(last_valid, axis=0, out=last_valid)
+    return panel[last_valid, np.arange(panel.shape[1])]
+
+
+def compute_panel_metrics(
+    panel: np.ndarray,
+    periods_per_year: int = TRADING_DAYS_PER_YEAR,
+    risk_free_rate: float = 0.0
+) -> Dict[str, np.ndarray]:
+    """Compute all metrics for every column of a dates x symbols price panel at once.
+
+    Columns may start late, end early or have gaps (NaN). Returns are taken
+    between consecutive observations of each column, so every column gets the
+    same result as its own compacted series. Each metric is an array with one
+    value per column, NaN where it cannot be computed.
+    """
+    panel = to_price_array(panel)
+    if panel.ndim != 2:
+        raise ValueError("panel must be two-dimensional (dates x symbols)")
+
+    if panel.shape[0] == 0:
+        empty = np.full(panel.shape[1], np.nan)
+        return {"observations": np.zeros(panel.shape[1], dtype=np.int64),
+                **{name: empty.copy() for name in METRIC_NAMES}}
+
+    observed = ~np.isnan(panel)
+    observations = observed.sum(axis=0)
+    filled = forward_fill(panel)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = panel[1:] / filled[:-1] - 1.0
+        valid = ~np.isnan(returns)
+        n_returns = valid.sum(axis=0)
+
+        mean = np.where(valid, returns, 0.0).sum(axis=0) / n_returns
+        sq_dev = np.where(valid, returns - mean, 0.0) ** 2
+        variance = sq_dev.sum(axis=0) / (n_returns - 1)
+        volatility = np.where(n_returns > 1, np.sqrt(variance * periods_per_year), np.nan)
+        sharpe_ratio = (mean * periods_per_year - risk_free_rate) / volatility
+
+        first_price = panel[observed.argmax(axis=0), np.arange(panel.shape[1])]
+        total_return = np.where(n_returns > 0, filled[-1] / first_price - 1.0, np.nan)
+        annualized_return = (1.0 + total_return) ** (periods_per_year / n_returns) - 1.0
+
+        running_peak = np.fmax.accumulate(filled, axis=0)
+        drawdown = np.where(observed, filled / running_peak - 1.0, np.inf)
+        max_drawdown = np.where(n_returns > 0, drawdown.min(axis=0, initial=np.inf), np.nan)
+
+    return {
+        "observations": observations,
+        "total_return": total_return,
+        "annualized_return": annualized_return,
+        "volatility": volatility,
+        "sharpe_ratio": sharpe_ratio,
+        "max_drawdown": max_drawdown,
+    }
+
+
+def _ledoit_wolf_shrink(centred: np.ndarray, overlap: np.ndarray,
+                       covariance: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Shrink a sample covariance towards a scaled identity with the Ledoit-Wolf optimal intensity.
+
+    The intensity estimate uses the same pairwise overlaps as the sample
+    covariance, so each entry's sampling variance is measured over the dates
+    where both series were observed.
+    """
+    known = np.isfinite(covariance)
+    diagonal = np.diag(covariance)
+    if not known.any() or not np.isfinite(diagonal).any():
+        return covariance, 0.0
+    scale = np.nanmean(diagonal)
+    target = np.eye(covariance.shape[0]) * scale
+
+    squared = centred * centred
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Sampling variance of each covariance entry
+        entry_variance = ((squared.T @ squared) / overlap - covariance ** 2) / overlap
+    dispersion = np.where(known, covariance - target, 0.0)
+    distance = (dispersion ** 2).sum()
+    error = min(np.where(known & np.isfinite(entry_variance), entry_variance, 0.0).sum(), distance)
+    intensity = float(error / distance) if distance > 0 else 0.0
+    return intensity * target + (1.0 - intensity) * covariance, intensity
+
+
+def compute_return_covariance(
+    panel: np.ndarray,
+    min_observations: int = 2,
+    shrinkage: bool = False
+) -> Dict[str, np.ndarray]:
+    """Covariance and correlation matrices of the period returns of every column of a price panel.
+
+    Returns are taken between consecutive dates of the panel, so a gap in a
+    column drops the returns on either side of it rather than spanning it.
+    Each pair of columns is estimated over the dates where both have a
+    return (pairwise-complete), using a handful of dates x symbols matrix
+    products instead of a loop over pairs. Pairs with fewer than
+    min_observations common returns are NaN. With shrinkage the covariance
+    is shrunk towards a scaled identity (Ledoit-Wolf) and the correlation is
+    derived from the shrunk covariance.
+    """
+    panel = to_price_array(panel)
+    if panel.ndim != 2:
+        raise ValueError("panel must be two-dimensional (dates x symbols)")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = panel[1:] / panel[:-1] - 1.0
+    valid = np.isfinite(returns)
+    mask = valid.astype(np.float64)
+    observations = valid.sum(axis=0)
+
+    # Centre each column on its own mean so the sums of products stay well conditioned
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shift = np.where(observations > 0, np.where(valid, returns, 0.0).sum(axis=0) / observations, 0.0)
+    centred = np.where(valid, returns - shift, 0.0)
+
+    overlap = mask.T @ mask
+    # sums[i, j]: sum of column i's returns over the dates where column j has one too
+    sums = centred.T @ mask
+    squares = (centred * centred).T @ mask
+    products = centred.T @ centred
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = (products - sums * sums.T / overlap) / (overlap - 1)
+        variance = (squares - sums * sums / overlap) / (overlap - 1)
+        correlation = np.clip(covariance / np.sqrt(variance * variance.T), -1.0, 1.0)
+
+    too_few = overlap < max(min_observations, 2)
+    covariance[too_few] = np.nan
+    correlation[too_few] = np.nan
+
+    intensity = 0.0
+    if shrinkage:
+        covariance, intensity = _ledoit_wolf_shrink(centred, overlap, covariance)
+        scale = np.sqrt(np.diag(covariance))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            correlation = np.clip(covariance / np.outer(scale, scale), -1.0, 1.0)
+
+    return {
+        "observations": observations,
+        "overlap": overlap.astype(np.int64),
+        "covariance": covariance,
+        "correlation": correlation,
+        "shrinkage_intensity": intensity,
+    }
+
+
+def compute_metrics(
+    prices: Sequence[float],
+    periods_per_year: int = TRADING_DAYS_PER_YEAR,
+    risk_free_rate: float = 0.0
+) -> Dict[str, Optional[float]]:
+    """Compute all portfolio metrics for a date-ordered price series in one vectorized pass.
+
+    Returns total return, annualized return, annualized volatility, Sharpe ratio
+    and maximum drawdown (as a negative fraction). Metrics that cannot be computed
+    from the available observations are returned as None.
+    """
+    p = to_price_array(prices)
+    if p.ndim != 1:
+        raise ValueError("prices must be a one-dimensional series")
+
+    panel_metrics = compute_panel_metrics(p[:, None], periods_per_year, risk_free_rate)
+    return {name: _to_optional(panel_metrics[name][0]) for name in METRIC_NAMES}
+
+
+# Windows (in trading days) used by the rolling endpoints when none are requested
+DEFAULT_ROLLING_WINDOWS = (21, 63, 252)
+
+# Metrics produced by compute_rolling_metrics
+ROLLING_METRIC_NAMES = (
+    "rolling_volatility",
+    "rolling_sharpe",
+    "rolling_drawdown",
+)
+
+
+def rolling_max(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing maximum over `window` observations in O(n), independent of the window length.
+
+    Uses the van Herk/Gil-Werman block decomposition, which gives the same
+    bound as a monotonic deque but runs as a few vectorized passes. The first
+    window - 1 entries are maxima over the shorter expanding window.
+    """
+    x = to_price_array(values)
+    n = x.size
+    if n == 0:
+        return x.copy()
+
+    padded_size = -(-(n + window - 1) // window) * window
+    y = np.full(padded_size, -np.inf)
+    y[window - 1:window - 1 + n] = x
+
+    blocks = y.reshape(-1, window)
+    prefix = np.maximum.accumulate(blocks, axis=1).ravel()
+    suffix = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    return np.maximum(suffix[:n], prefix[window - 1:window - 1 + n])
+
+
+def _rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """Sums over each trailing window from a single cumulative sum."""
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    return cumulative[window:] - cumulative[:-window]
+
+
+def compute_rolling_metrics(
+    prices: Sequence[float],
+    windows: Sequence[int] = DEFAULT_ROLLING_WINDOWS,
+    periods_per_year: int = TRADING_DAYS_PER_YEAR,
+    risk_free_rate: float = 0.0
+) -> Dict[int, Dict[str, np.ndarray]]:
+    """Compute rolling volatility, Sharpe ratio and drawdown for each window in O(n) per window.
+
+    Every output array is aligned with `prices`; entry t covers the `window`
+    returns ending at t and is NaN until a full window is available. Rolling
+    drawdown is the price relative to its peak within the trailing window.
+    """
+    p = to_price_array(prices)
+    if p.ndim != 1:
+        raise ValueError("prices must be a one-dimensional series")
+
+    returns = p[1:] / p[:-1] - 1.0
+    # Centre returns before accumulating so the sum-of-squares stays well conditioned
+    shift = returns.mean() if returns.size else 0.0
+    centred = returns - shift
+
+    results = {}
+    for window in windows:
+        if window < 2:
+            raise ValueError("rolling windows must cover at least 2 observations")
+
+        volatility = np.full(p.size, np.nan)
+        sharpe = np.full(p.size, np.nan)
+        drawdown = np.full(p.size, np.nan)
+
+        if returns.size >= window:
+            sum_r = _rolling_sum(centred, window)
+            sum_r2 = _rolling_sum(centred * centred, window)
+            variance = np.maximum(sum_r2 - sum_r * sum_r / window, 0.0) / (window - 1)
+            mean = sum_r / window + shift
+
+            volatility[window:] = np.sqrt(variance * periods_per_year)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                sharpe[window:] = (mean * periods_per_year - risk_free_rate) / volatility[window:]
+
+        if p.size >= window:
+            peak = rolling_max(p, window)
+            drawdown[window - 1:] = p[window - 1:] / peak[window - 1:] - 1.0
+
+        results[window] = {
+            "rolling_volatility": volatility,
+            "rolling_sharpe": sharpe,
+            "rolling_drawdown": drawdown,
+        }
+    return results
+
+
+def update_running_state(state: Optional[Dict[str, float]], prices: Sequence[float]) -> Dict[str, float]:
+    """Fold newly arrived prices into a persisted running metric state.
+
+    The state holds the first and last price, the running peak, the worst
+    drawdown so far and Welford accumulators (count, mean, M2) of the
+    period returns. New prices are merged as one batch with Chan's parallel
+    update, so the cost depends only on the number of new prices.
+    """
+    new_prices = to_price_array(prices)
+    if state is None:
+        if new_prices.size == 0:
+            raise ValueError("cannot initialise metric state without prices")
+        state = {
+            "first_price": float(new_prices[0]),
+            "last_price": float(new_prices[0]),
+            "running_peak": float(new_prices[0]),
+            "max_drawdown": 0.0,
+            "return_count": 0,
+            "mean_return": 0.0,
+            "m2_return": 0.0,
+        }
+        new_prices = new_prices[1:]
+
+    if new_prices.size == 0:
+        return dict(state)
+
+    path = np.concatenate(([state["last_price"]], new_prices))
+    returns = path[1:] / path[:-1] - 1.0
+    peaks = np.maximum.accumulate(np.concatenate(([state["running_peak"]], new_prices)))[1:]
+
+    count_a, mean_a, m2_a = state["return_count"], state["mean_return"], state["m2_return"]
+    count_b = returns.size
+    mean_b = returns.mean()
+    m2_b = ((returns - mean_b) ** 2).sum()
+
+    count = count_a + count_b
+    delta = mean_b - mean_a
+
+    return {
+        "first_price": state["first_price"],
+        "last_price": float(new_prices[-1]),
+        "running_peak": float(peaks[-1]),
+        "max_drawdown": float(min(state["max_drawdown"], (new_prices / peaks - 1.0).min())),
+        "return_count": int(count),
+        "mean_return": float(mean_a + delta * count_b / count),
+        "m2_return": float(m2_a + m2_b + delta * delta * count_a * count_b / count),
+    }
+
+
+def metrics_from_state(
+    state: Dict[str, float],
+    periods_per_year: int = TRADING_DAYS_PER_YEAR,
+    risk_free_rate: float = 0.0
+) -> Dict[str, Optional[float]]:
+    """Derive the full-history metrics from a running state without touching the price history."""
+    count = state["return_count"]
+    if count < 1:
+        return {name: None for name in METRIC_NAMES}
+
+    total_return = state["last_price"] / state["first_price"] - 1.0
+    annualized_return = (1.0 + total_return) ** (periods_per_year / count) - 1.0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        volatility = np.sqrt(state["m2_return"] / (count - 1) * periods_per_year) if count > 1 else np.nan
+        sharpe_ratio = np.float64(state["mean_return"] * periods_per_year - risk_free_rate) / volatility
+
+    return {
+        "total_return": _to_optional(total_return),
+        "annualized_return": _to_optional(annualized_return),
+        "volatility": _to_optional(volatility),
+        "sharpe_ratio": _to_optional(sharpe_ratio),
+        "max_drawdown": _to_optional(state["max_drawdown"]),
+    }
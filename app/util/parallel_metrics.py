@@ -0,0 +1,164 @@
+import multiprocessing
+import os
+import shutil
+import threading
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+import numpy as np
+
+from app.util.metrics import METRIC_NAMES, TRADING_DAYS_PER_YEAR, compute_panel_metrics, nan_to_none
+from app.util.logger import logger
+
+# Where shared memory blocks live on Linux
+SHM_DIRECTORY = "/dev/shm"
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_process_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """The shared process pool for universe-wide metric runs, created on first use.
+
+    Workers are spawned rather than forked so they do not inherit the parent's
+    threads, database connections or listener sockets.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=max_workers or os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        elif max_workers and max_workers != _executor._max_workers:
+            logger.warning(
+                f"Process pool already runs {_executor._max_workers} workers; ignoring max_workers={max_workers}"
+            )
+        return _executor
+
+
+def shutdown_process_pool() -> None:
+    """Stop the process pool, if it was started."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+class SharedPanel:
+    """A dates x symbols float64 panel held in a shared memory block that pool workers map.
+
+    Pass allocate as the allocate argument of load_price_panel or
+    cached_price_panel so the panel is built in the block directly, with no
+    private copy in the parent, then hand the SharedPanel to iter_panel_metrics,
+    which releases the block when it finishes.
+    """
+
+    def __init__(self):
+        self.shm: Optional[shared_memory.SharedMemory] = None
+        self.array: Optional[np.ndarray] = None
+        self._unlink = None
+
+    def allocate(self, shape: Tuple[int, int]) -> np.ndarray:
+        """Create the block for a panel of the given shape and return the array mapped on it."""
+        nbytes = int(np.prod(shape)) * np.dtype(np.float64).itemsize
+        # Touching pages beyond a full /dev/shm kills the process with SIGBUS; fail cleanly instead
+        if os.path.isdir(SHM_DIRECTORY) and shutil.disk_usage(SHM_DIRECTORY).free < nbytes:
+            raise MemoryError(
+                f"The {nbytes / 2**20:.0f} MiB price panel does not fit in {SHM_DIRECTORY}; "
+                f"mount a larger memory-backed volume there"
+            )
+        self.release()
+        self.shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+        # Remove the block even if the panel is dropped unconsumed (e.g. a streamed response
+        # whose client went away before it started); the mapping goes with its last reference
+        self._unlink = weakref.finalize(self, self.shm.unlink)
+        self.array = np.ndarray(shape, dtype=np.float64, buffer=self.shm.buf)
+        return self.array
+
+    def release(self) -> None:
+        """Unmap and remove the block; arrays returned by allocate must no longer be referenced."""
+        self.array = None
+        if self.shm is not None:
+            self.shm.close()
+            self._unlink()
+            self.shm = None
+
+
+def _chunk_metrics(shm_name: str, shape: tuple, start: int, end: int, metric_names: Sequence[str],
+                   periods_per_year: int, risk_free_rate: float) -> Dict[str, list]:
+    """Worker task: compute metrics for panel columns [start, end) read from shared memory."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        panel = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        results = compute_panel_metrics(panel[:, start:end], periods_per_year, risk_free_rate)
+    finally:
+        shm.close()
+    return {
+        "observations": results["observations"].tolist(),
+        **{name: nan_to_none(results[name]) for name in metric_names},
+    }
+
+
+def iter_panel_metrics(
+    panel: Union[np.ndarray, SharedPanel],
+    symbols: Sequence[str],
+    metric_names: Sequence[str] = METRIC_NAMES,
+    periods_per_year: int = TRADING_DAYS_PER_YEAR,
+    risk_free_rate: float = 0.0,
+    chunk_size: int = 500,
+    max_workers: Optional[int] = None
+) -> Iterator[Dict[str, dict]]:
+    """Compute metrics for the columns of a dates x symbols panel across the process pool.
+
+    Every worker maps the panel in a shared memory block, so only column ranges
+    and results cross process boundaries. A SharedPanel is used in place; a
+    plain array is first copied into a block of its own. Results are yielded
+    per chunk of symbols, as {"metrics": ..., "observations": ...}, in
+    completion order. The block is released when the iterator finishes or is
+    closed.
+    """
+    shared = panel if isinstance(panel, SharedPanel) else None
+    if shared is None and panel.size:
+        shared = SharedPanel()
+        shared.allocate(panel.shape)[:] = panel
+    # Drop this frame's reference so the block is the only copy while workers run
+    del panel
+    if shared is None or shared.array is None or shared.array.size == 0:
+        if shared is not None:
+            shared.release()
+        return
+
+    shape = shared.array.shape
+    try:
+        executor = get_process_pool(max_workers)
+        pending = {
+            executor.submit(_chunk_metrics, shared.shm.name, shape, start, min(start + chunk_size, len(symbols)),
+                            tuple(metric_names), periods_per_year, risk_free_rate): start
+            for start in range(0, len(symbols), chunk_size)
+        }
+        logger.info(f"Computing metrics for {len(symbols)} symbols in {len(pending)} chunks")
+
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start = pending.pop(future)
+                    results = future.result()
+                    chunk_symbols: List[str] = list(symbols[start:start + chunk_size])
+                    yield {
+                        "metrics": {
+                            symbol: {name: results[name][i] for name in metric_names}
+                            for i, symbol in enumerate(chunk_symbols)
+                        },
+                        "observations": dict(zip(chunk_symbols, results["observations"])),
+                    }
+        finally:
+            # Workers may still be reading the block if the consumer stopped early
+            for future in pending:
+                future.cancel()
+            wait(pending)
+    finally:
+        shared.release()
@@ -0,0 +1,362 @@
+from datetime import date
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy.sql import text
+
+from app.util.market_data import Frequency, PriceField, load_price_panel
+from app.util.metrics import build_price_panel, forward_fill
+from app.util.price_rollup import ROLLUP_UNITS
+from app.util.logger import logger
+
+# Number of portfolios whose transactions and prices are loaded per round trip
+NAV_REFRESH_CHUNK_SIZE = 50
+
+# Transaction types that move money into or out of a portfolio; they change
+# NAV without being a return, so the unit value series excludes them
+EXTERNAL_FLOW_TYPES = ("deposit", "withdrawal")
+
+
+def compute_nav_series(
+    trade_dates: np.ndarray,
+    trade_columns: np.ndarray,
+    quantities: np.ndarray,
+    cash_amounts: np.ndarray,
+    flows: np.ndarray,
+    date_keys: np.ndarray,
+    prices: np.ndarray,
+    previous_nav: Optional[float] = None,
+    previous_unit_value: float = 1.0
+) -> Dict[str, np.ndarray]:
+    """Value a portfolio on every date of a forward-filled price panel.
+
+    Each transaction is applied on the first panel date on or after its trade
+    date; trade_columns index the panel column of the traded symbol (-1 for
+    cash-only transactions). Positions and cash are running sums of the
+    signed quantities and cash amounts. unit_value is a time-weighted index
+    starting at 1 that removes external flows from the daily returns; to
+    extend a stored series, pass the NAV and unit value of its last row.
+    """
+    n_dates, n_symbols = prices.shape
+    rows = np.searchsorted(date_keys, trade_dates, side="left")
+    # Transactions after the last priced date are picked up once prices arrive
+    valid = rows < n_dates
+    rows, trade_columns = rows[valid], trade_columns[valid]
+    quantities, cash_amounts, flows = quantities[valid], cash_amounts[valid], flows[valid]
+
+    positions = np.zeros((n_dates, n_symbols), dtype=np.float64)
+    traded = trade_columns >= 0
+    np.add.at(positions, (rows[traded], trade_columns[traded]), quantities[traded])
+    np.cumsum(positions, axis=0, out=positions)
+
+    cash = np.zeros(n_dates, dtype=np.float64)
+    np.add.at(cash, rows, cash_amounts)
+    np.cumsum(cash, out=cash)
+
+    net_flow = np.zeros(n_dates, dtype=np.float64)
+    np.add.at(net_flow, rows, flows)
+
+    # Positions held before a symbol's first price contribute nothing
+    market_value = np.where(positions != 0, positions * np.nan_to_num(prices), 0.0).sum(axis=1)
+    nav = cash + market_value
+
+    returns = np.zeros(n_dates, dtype=np.float64)
+    previous = nav[:-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns[1:] = np.where(previous > 0, (nav[1:] - net_flow[1:]) / previous - 1.0, 0.0)
+    if previous_nav is not None and previous_nav > 0 and n_dates:
+        returns[0] = (nav[0] - net_flow[0]) / previous_nav - 1.0
+    unit_value = previous_unit_value * np.cumprod(1.0 + returns)
+
+    return {
+        "nav": nav,
+        "cash": cash,
+        "market_value": market_value,
+        "net_flow": net_flow,
+        "unit_value": unit_value,
+    }
+
+
+def load_unit_value_panel(db, portfolio_ids: List[str], start_date: Optional[date], end_date: Optional[date],
+                          frequency: Frequency = Frequency.daily):
+    """Load the unit values of many portfolios with one set-based query as a dates x portfolios panel.
+
+    Weekly and monthly panels hold the last unit value of each period, dated
+    by its last NAV date, as the price rollups are.
+    """
+    if frequency == Frequency.daily:
+        select, order = "SELECT date, portfolio_id, unit_value", ""
+    else:
+        period = f"date_trunc('{ROLLUP_UNITS[frequency]}', date)"
+        select = f"SELECT DISTINCT ON (portfolio_id, {period}) date, portfolio_id, unit_value"
+        order = f"ORDER BY portfolio_id, {period}, date DESC"
+    rows = db.execute(
+        text(f"""
+            {select}
+            FROM portfolio_nav
+            WHERE portfolio_id = ANY(:ids)
+              AND (CAST(:start_date AS DATE) IS NULL OR date >= :start_date)
+              AND (CAST(:end_date AS DATE) IS NULL OR date <= :end_date)
+            {order}
+        """),
+        {'ids': portfolio_ids, 'start_date': start_date, 'end_date': end_date}
+    ).fetchall()
+
+    if not rows:
+        return np.empty(0, dtype="datetime64[D]"), np.empty(0, dtype=str), np.empty((0, 0))
+
+    dates, row_portfolios, unit_values = zip(*rows)
+    return build_price_panel(dates, row_portfolios, unit_values)
+
+
+def _stale_portfolios(db, portfolio_ids: Optional[List[str]],
+                      since_by_symbol: Optional[Dict[str, Optional[date]]],
+                      rebuild: bool) -> Dict[str, Optional[date]]:
+    """Portfolios whose NAV must be recomputed, in id order, mapped to the date to recompute from (None for all)."""
+    if portfolio_ids is not None:
+        return {portfolio_id: None for portfolio_id in sorted(set(portfolio_ids))}
+    if since_by_symbol is not None:
+        # New or corrected prices revalue every portfolio that ever held the symbols, from the
+        # earliest changed price on (or earlier, if it has transactions not yet in its series)
+        symbols = sorted(since_by_symbol)
+        return dict(db.execute(
+            text("""
+                SELECT h.portfolio_id,
+                       CASE WHEN p.nav_refreshed_at IS NULL OR bool_or(s.since IS NULL) THEN NULL
+                            ELSE LEAST(min(s.since), (
+                                SELECT min(t.trade_date) FROM portfolio_transaction t
+                                WHERE t.portfolio_id = h.portfolio_id AND t.created_at > p.nav_refreshed_at
+                            ))
+                       END
+                FROM portfolio_holding h
+                JOIN unnest(CAST(:symbols AS VARCHAR[]), CAST(:since AS DATE[])) AS s(symbol, since)
+                  ON s.symbol = h.symbol
+                JOIN portfolio p ON p.id = h.portfolio_id
+                GROUP BY h.portfolio_id, p.nav_refreshed_at
+                ORDER BY h.portfolio_id
+            """),
+            {'symbols': symbols, 'since': [since_by_symbol[symbol] for symbol in symbols]}
+        ).fetchall())
+    # New transactions are recomputed from the earliest of their trade dates
+    return dict(db.execute(
+        text("""
+            SELECT p.id, CASE WHEN :rebuild OR p.nav_refreshed_at IS NULL THEN NULL ELSE new.since END
+            FROM portfolio p
+            CROSS JOIN LATERAL (
+                SELECT min(t.trade_date) AS since FROM portfolio_transaction t
+                WHERE t.portfolio_id = p.id AND t.created_at > p.nav_refreshed_at
+            ) new
+            WHERE :rebuild OR p.nav_refreshed_at IS NULL OR new.since IS NOT NULL
+            ORDER BY p.id
+        """),
+        {'rebuild': rebuild}
+    ).fetchall())
+
+
+def _load_filled_panel(db, symbols: List[str], start_date: date):
+    """Close prices of the symbols from start_date on, plus a forward-filled copy.
+
+    Returns date_keys, panel_symbols, the raw panel and the filled panel. The
+    filled panel has one extra leading row holding each symbol's last close
+    before start_date, so held symbols are valued from their last known price
+    even when they do not trade (or stopped trading) after start_date;
+    filled row i + 1 is date_keys[i].
+    """
+    date_keys, panel_symbols, raw_panel = load_price_panel(db, symbols, start_date, None, PriceField.close_price)
+    seed = dict(db.execute(
+        text("""
+            SELECT s.symbol, last.close_price::float8
+            FROM unnest(CAST(:symbols AS VARCHAR[])) AS s(symbol)
+            CROSS JOIN LATERAL (
+                SELECT close_price FROM market_price
+                WHERE symbol = s.symbol AND date < :start_date
+                ORDER BY date DESC LIMIT 1
+            ) last
+        """),
+        {'symbols': symbols, 'start_date': start_date}
+    ).fetchall())
+
+    all_symbols = np.asarray(sorted(set(panel_symbols.tolist()) | set(seed)), dtype=str)
+    raw = np.full((len(date_keys), len(all_symbols)), np.nan)
+    if raw_panel.size:
+        raw[:, np.searchsorted(all_symbols, panel_symbols)] = raw_panel
+    seed_row = np.array([seed.get(symbol, np.nan) for symbol in all_symbols.tolist()], dtype=np.float64)
+    filled = forward_fill(np.vstack([seed_row[None, :], raw]))
+    return date_keys, all_symbols, raw, filled
+
+
+def _business_days(start: np.datetime64, end: np.datetime64) -> np.ndarray:
+    """Weekdays from start to end inclusive."""
+    days = np.arange(start, end + 1, dtype="datetime64[D]")
+    return days[np.is_busday(days)]
+
+
+def _refresh_chunk(db, since_by_portfolio: Dict[str, Optional[date]]) -> Dict[str, int]:
+    """Recompute and replace the NAV series of one chunk of portfolios from each one's `since` date on.
+
+    Positions and cash are always rebuilt from the full transaction history;
+    only the NAV rows from `since` on are replaced, with the unit value chained
+    from the last row kept. Returns the rows written and the number of
+    transactions in symbols that have no prices at all.
+    """
+    portfolio_ids = list(since_by_portfolio)
+    # Lock the portfolios; concurrent transaction inserts wait on the foreign key until we commit
+    db.execute(
+        text("SELECT id FROM portfolio WHERE id = ANY(:ids) ORDER BY id FOR UPDATE"),
+        {'ids': portfolio_ids}
+    )
+
+    transactions = db.execute(
+        text(f"""
+            SELECT portfolio_id, trade_date, symbol, quantity::float8, cash_amount::float8,
+                   CASE WHEN transaction_type IN ({', '.join(f"'{t}'" for t in EXTERNAL_FLOW_TYPES)})
+                        THEN cash_amount::float8 ELSE 0 END AS flow
+            FROM portfolio_transaction
+            WHERE portfolio_id = ANY(:ids)
+            ORDER BY portfolio_id, trade_date, id
+        """),
+        {'ids': portfolio_ids}
+    ).fetchall()
+
+    # The last row kept before each portfolio's since date; without one the whole series is recomputed
+    since = [since_by_portfolio[portfolio_id] for portfolio_id in portfolio_ids]
+    previous = {row[0]: row[1:] for row in db.execute(
+        text("""
+            SELECT s.portfolio_id, last.date, last.nav, last.unit_value
+            FROM unnest(CAST(:ids AS VARCHAR[]), CAST(:since AS DATE[])) AS s(portfolio_id, since)
+            CROSS JOIN LATERAL (
+                SELECT date, nav, unit_value FROM portfolio_nav
+                WHERE portfolio_id = s.portfolio_id AND date < s.since
+                ORDER BY date DESC LIMIT 1
+            ) last
+        """),
+        {'ids': portfolio_ids, 'since': since}
+    )}
+    since = [value if portfolio_id in previous else None for portfolio_id, value in zip(portfolio_ids, since)]
+
+    db.execute(
+        text("""
+            DELETE FROM portfolio_nav n
+            USING unnest(CAST(:ids AS VARCHAR[]), CAST(:since AS DATE[])) AS s(portfolio_id, since)
+            WHERE n.portfolio_id = s.portfolio_id AND (s.since IS NULL OR n.date >= s.since)
+        """),
+        {'ids': portfolio_ids, 'since': since}
+    )
+    since_by_portfolio = dict(zip(portfolio_ids, since))
+
+    written = 0
+    unpriced = 0
+    if transactions:
+        tx_portfolios, tx_dates, tx_symbols, quantities, cash_amounts, flows = zip(*transactions)
+        tx_portfolios = np.asarray(tx_portfolios, dtype=str)
+        tx_dates = np.asarray(tx_dates, dtype="datetime64[D]")
+        tx_symbols = np.asarray([symbol or "" for symbol in tx_symbols], dtype=str)
+        quantities = np.asarray(quantities, dtype=np.float64)
+        cash_amounts = np.asarray(cash_amounts, dtype=np.float64)
+        flows = np.asarray(flows, dtype=np.float64)
+
+        # Transactions are ordered by portfolio, so each portfolio is one contiguous slice
+        keys, starts = np.unique(tx_portfolios, return_index=True)
+        ends = np.append(starts[1:], len(tx_portfolios))
+        begins = [
+            np.datetime64(since_by_portfolio[portfolio_id], "D") if since_by_portfolio[portfolio_id]
+            else tx_dates[start]
+            for portfolio_id, start in zip(keys.tolist(), starts.tolist())
+        ]
+
+        # One set-based price load for every symbol the chunk ever traded
+        traded_symbols = sorted(set(tx_symbols.tolist()) - {""})
+        date_keys, panel_symbols, raw_panel, filled = _load_filled_panel(db, traded_symbols, min(begins).item())
+        today = np.datetime64(date.today(), "D")
+
+        rows = {'portfolio_id': [], 'date': [], 'nav': [], 'cash': [], 'net_flow': [], 'unit_value': []}
+        for portfolio_id, start, end, begin in zip(keys.tolist(), starts.tolist(), ends.tolist(), begins):
+            symbols = tx_symbols[start:end]
+            columns = np.searchsorted(panel_symbols, symbols)
+            known = (symbols != "") & (columns < len(panel_symbols))
+            known[known] &= panel_symbols[columns[known]] == symbols[known]
+            used = np.unique(columns[known])
+
+            # Symbols that were never priced add no value; flag them rather than silently valuing them at zero
+            missing = (symbols != "") & ~known
+            if missing.any():
+                unpriced += int(missing.sum())
+                logger.warning(
+                    f"Portfolio {portfolio_id} has {int(missing.sum())} transactions in symbols without prices: "
+                    f"{', '.join(sorted(set(symbols[missing].tolist())))}"
+                )
+
+            # The portfolio's calendar: dates from `begin` on which one of its symbols traded,
+            # or weekdays through today for portfolios holding no priced symbol (cash only)
+            if used.size:
+                calendar = date_keys[(date_keys >= begin) & ~np.isnan(raw_panel[:, used]).all(axis=1)]
+            else:
+                calendar = _business_days(begin, today)
+            if not calendar.size:
+                continue
+
+            last = previous.get(portfolio_id) if since_by_portfolio[portfolio_id] else None
+            portfolio_flows = flows[start:end]
+            if last is not None:
+                # Flows on or before the last kept row are already in the stored series
+                portfolio_flows = np.where(tx_dates[start:end] <= np.datetime64(last[0], "D"), 0.0, portfolio_flows)
+
+            series = compute_nav_series(
+                tx_dates[start:end],
+                np.where(known, np.searchsorted(used, columns), -1),
+                quantities[start:end],
+                cash_amounts[start:end],
+                portfolio_flows,
+                calendar,
+                filled[np.ix_(np.searchsorted(date_keys, calendar, side="right"), used)],
+                previous_nav=last[1] if last is not None else None,
+                previous_unit_value=last[2] if last is not None else 1.0
+            )
+            rows['portfolio_id'].extend([portfolio_id] * len(calendar))
+            rows['date'].extend(calendar.tolist())
+            for name in ('nav', 'cash', 'net_flow', 'unit_value'):
+                rows[name].extend(series[name].tolist())
+
+        if rows['date']:
+            db.execute(
+                text("""
+                    INSERT INTO portfolio_nav (portfolio_id, date, nav, cash, net_flow, unit_value)
+                    SELECT * FROM unnest(
+                        CAST(:portfolio_id AS VARCHAR[]), CAST(:date AS DATE[]), CAST(:nav AS FLOAT8[]),
+                        CAST(:cash AS FLOAT8[]), CAST(:net_flow AS FLOAT8[]), CAST(:unit_value AS FLOAT8[])
+                    )
+                """),
+                rows
+            )
+            written = len(rows['date'])
+
+    db.execute(
+        text("UPDATE portfolio SET nav_refreshed_at = clock_timestamp() WHERE id = ANY(:ids)"),
+        {'ids': portfolio_ids}
+    )
+    return {"rows": written, "unpriced_transactions": unpriced}
+
+
+def refresh_portfolio_nav(db, portfolio_ids: Optional[List[str]] = None,
+                          since_by_symbol: Optional[Dict[str, Optional[date]]] = None,
+                          rebuild: bool = False) -> Dict[str, int]:
+    """Materialize the daily NAV series of portfolios into portfolio_nav.
+
+    By default only portfolios without a series, or with transactions recorded
+    since their last refresh, are recomputed, from the earliest new trade date
+    on; pass portfolio_ids to recompute them in full, since_by_symbol (symbol
+    to earliest changed price date, None for all history) to revalue every
+    portfolio that traded those symbols after a price load, or rebuild=True for
+    all. The caller owns the transaction and must commit.
+    """
+    since_by_portfolio = _stale_portfolios(db, portfolio_ids, since_by_symbol, rebuild)
+    portfolio_ids = list(since_by_portfolio)
+
+    counts = {"portfolios": len(portfolio_ids), "rows": 0, "unpriced_transactions": 0}
+    for i in range(0, len(portfolio_ids), NAV_REFRESH_CHUNK_SIZE):
+        chunk = {portfolio_id: since_by_portfolio[portfolio_id]
+                 for portfolio_id in portfolio_ids[i:i + NAV_REFRESH_CHUNK_SIZE]}
+        for name, value in _refresh_chunk(db, chunk).items():
+            counts[name] += value
+
+    logger.info(f"Refreshed NAV for {len(portfolio_ids)} portfolios ({counts['rows']} rows)")
+    return counts
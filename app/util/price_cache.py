@@ -0,0 +1,326 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import date
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import quote
+import numpy as np
+from sqlalchemy.sql import text
+
+from app.core.config import settings
+from app.util.database import get_db
+from app.util.market_data import (
+    PRICE_COLUMNS, Frequency, PriceField, first_price_date, load_price_panel, load_price_series, price_version
+)
+from app.util.metrics import build_price_panel
+from app.util.logger import logger
+
+# Price loads send the earliest date they touched per symbol on this channel; every
+# API process applies it through price_cache.invalidate.
+PRICE_CACHE_CHANNEL = "price_cache"
+
+# NOTIFY payloads must be shorter than 8000 bytes; larger loads send only their earliest date
+PG_NOTIFY_MAX_PAYLOAD = 7999
+
+# Invalidations remembered per process; series that fell further behind are re-read in full
+MAX_INVALIDATIONS = 1024
+
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+
+def invalidation_payload(since_by_symbol: Dict[str, Optional[date]]) -> str:
+    """PRICE_CACHE_CHANNEL payload for a price change: symbol -> earliest changed date as a JSON object.
+
+    A date of None resets the symbol: its prices were deleted, so nothing
+    cached for it is kept. Falls back to the earliest date for every symbol
+    (or to a full reset) when the object does not fit in a NOTIFY.
+    """
+    payload = json.dumps({symbol: since and since.isoformat() for symbol, since in since_by_symbol.items()},
+                         separators=(",", ":"))
+    if len(payload.encode()) > PG_NOTIFY_MAX_PAYLOAD:
+        sinces = list(since_by_symbol.values())
+        return "" if None in sinces else min(sinces).isoformat()
+    return payload
+
+
+def _pending(invalidations: List[tuple], symbol: str, applied: int) -> List[Tuple[float, Optional[date]]]:
+    """(received_at, since) of the invalidations after generation `applied` that touch the symbol.
+
+    If some of them have already been dropped, the oldest remembered one stands
+    in for them with since=None, so the series is re-read in full.
+    """
+    pending = []
+    if invalidations and applied < invalidations[0][0] - 1:
+        pending.append((invalidations[0][1], None))
+    for generation, received_at, since_by_symbol, since in invalidations:
+        if generation <= applied:
+            continue
+        if since_by_symbol is None:
+            pending.append((received_at, since))
+        elif symbol in since_by_symbol:
+            pending.append((received_at, since_by_symbol[symbol]))
+    return pending
+
+
+class PriceSeriesCache:
+    """Per-symbol price series persisted as memory-mapped Arrow IPC files under a local directory.
+
+    Every worker process on a host maps the same files, so the series live once
+    in the OS page cache instead of once per process. Files are replaced
+    atomically; a process keeps reading its current mapping until it
+    revalidates. Each file records, in its schema metadata, when its rows were
+    queried, so a process can tell whether another worker has already
+    refreshed it after an invalidation.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        # Recent invalidations as (generation, received_at, since_by_symbol, since);
+        # since_by_symbol=None means every symbol from `since` (None = at any date)
+        self._generation = 0
+        self._invalidations: Deque[tuple] = deque(maxlen=MAX_INVALIDATIONS)
+        # (symbol, price_field) -> (generation applied, dates as int32 days, prices, queried_at)
+        self._series: Dict[tuple, Tuple[int, np.ndarray, np.ndarray, float]] = {}
+        # Nothing on disk is trusted until this process has seen it validated
+        self.invalidate("")
+
+    def invalidate(self, payload: str = "") -> None:
+        """Record that prices changed.
+
+        The payload is a JSON object of symbol -> earliest changed ISO date (null =
+        any date), or a single ISO date for every symbol ("" = every symbol at any date).
+        """
+        if payload.startswith("{"):
+            since_by_symbol = {symbol: since and date.fromisoformat(since)
+                               for symbol, since in json.loads(payload).items()}
+            since = None
+        else:
+            since_by_symbol, since = None, date.fromisoformat(payload) if payload else None
+        with self._lock:
+            self._generation += 1
+            self._invalidations.append((self._generation, time.time(), since_by_symbol, since))
+
+    def _path(self, symbol: str, price_field: PriceField) -> str:
+        # Quoting keeps arbitrary symbols inside the cache directory
+        return os.path.join(self.directory, price_field.value, f"{quote(symbol, safe='')}.arrow")
+
+    @staticmethod
+    def _read(path: str):
+        """Map a cache file; returns (queried_at, dates as int32 days, prices) without copying, or None."""
+        import pyarrow as pa
+
+        try:
+            table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+        queried_at = float(table.schema.metadata[b"queried_at"])
+        dates = table.column("date").chunk(0).view(pa.int32()).to_numpy() if table.num_rows else np.empty(0, np.int32)
+        prices = table.column("price").chunk(0).to_numpy() if table.num_rows else np.empty(0, np.float64)
+        return queried_at, dates, prices
+
+    @staticmethod
+    def _write(path: str, queried_at: float, dates: np.ndarray, prices: np.ndarray) -> None:
+        """Write a cache file to a temporary name and rename it into place."""
+        import pyarrow as pa
+
+        table = pa.table(
+            {"date": pa.array(dates.astype(np.int32), pa.int32()).view(pa.date32()),
+             "price": pa.array(prices, pa.float64())},
+            metadata={"queried_at": repr(queried_at)}
+        )
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with pa.OSFile(temp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(temp_path, path)
+
+    def _query(self, price_field: PriceField, since_by_symbol: Dict[str, Optional[date]]):
+        """Read several symbols' prices, each from its `since` on (all if None), from the primary in one query.
+
+        Returns symbol -> (int32 days, prices) for the symbols that have prices.
+        """
+        db_session = get_db('sec_master')
+        db = next(db_session)
+        try:
+            rows = db.execute(
+                text(f"""
+                    SELECT mp.symbol, mp.date, {PRICE_COLUMNS[price_field]}
+                    FROM unnest(CAST(:symbols AS TEXT[]), CAST(:sinces AS DATE[])) AS s(symbol, since)
+                    JOIN market_price mp ON mp.symbol = s.symbol AND (s.since IS NULL OR mp.date >= s.since)
+                    ORDER BY mp.symbol, mp.date
+                """),
+                {'symbols': list(since_by_symbol), 'sinces': list(since_by_symbol.values())}
+            ).fetchall()
+        finally:
+            db_session.close()
+
+        if not rows:
+            return {}
+        row_symbols, dates, prices = zip(*rows)
+        row_symbols = np.asarray(row_symbols, dtype=object)
+        days = (np.asarray(dates, dtype="datetime64[D]") - _EPOCH).astype(np.int32)
+        prices = np.asarray(prices, dtype=np.float64)
+        bounds = np.flatnonzero(np.r_[True, row_symbols[1:] != row_symbols[:-1], True])
+        return {row_symbols[start]: (days[start:end], prices[start:end]) for start, end in zip(bounds[:-1], bounds[1:])}
+
+    def get_many(self, symbols: List[str],
+                 price_field: PriceField = PriceField.close_price) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """Full price histories of several symbols as read-only (int32 days since epoch, float64 prices) arrays."""
+        return {symbol: (days, prices) for symbol, (days, prices, _) in self._get_many(symbols, price_field).items()}
+
+    def _get_many(self, symbols: List[str], price_field: PriceField) -> Dict[str, Tuple[np.ndarray, np.ndarray, float]]:
+        """Price histories of several symbols as (days, prices, queried_at), revalidated against the invalidations.
+
+        Series touched by invalidations this process has not applied yet are
+        re-read together in one query, from the earliest invalidated date of each.
+        The lock is held only to snapshot the invalidations and to swap in the
+        refreshed series, never while reading files or querying.
+        """
+        with self._lock:
+            generation = self._generation
+            invalidations = list(self._invalidations)
+
+        series, stale = {}, {}
+        for symbol in dict.fromkeys(symbols):
+            entry = self._series.get((symbol, price_field))
+            if entry is not None and entry[0] == generation:
+                series[symbol] = entry[1:]
+                continue
+
+            pending = _pending(invalidations, symbol, entry[0] if entry is not None else 0)
+            if entry is not None and not pending:
+                series[symbol] = entry[1:]
+                continue
+
+            cached = self._read(self._path(symbol, price_field))
+            # Another worker may already have re-read the prices after the latest invalidation
+            if cached is not None and cached[0] > max(received_at for received_at, _ in pending):
+                series[symbol] = cached[1], cached[2], cached[0]
+                continue
+
+            sinces = [since for received_at, since in pending if cached is None or received_at >= cached[0]]
+            stale[symbol] = (cached, None if cached is None or None in sinces else min(sinces))
+
+        if stale:
+            queried_at = time.time()
+            loaded = self._query(price_field, {symbol: since for symbol, (_, since) in stale.items()})
+            for symbol, (cached, since) in stale.items():
+                series[symbol] = (*self._merge(symbol, price_field, cached, since, queried_at, loaded.get(symbol)),
+                                  queried_at)
+            logger.debug(f"Price cache re-read {len(stale)} {price_field.value} series")
+
+        with self._lock:
+            for symbol, entry in series.items():
+                current = self._series.get((symbol, price_field))
+                if current is None or current[0] < generation:
+                    self._series[(symbol, price_field)] = (generation, *entry)
+        return series
+
+    def _merge(self, symbol: str, price_field: PriceField, cached, since: Optional[date], queried_at: float, loaded):
+        """Combine a cache file with the prices re-read from `since` on, and write the result back.
+
+        With since=None (a full re-read, e.g. after the symbol's prices were
+        deleted) nothing of the cache file is kept.
+        """
+        new_days, new_prices = loaded if loaded is not None else (np.empty(0, np.int32), np.empty(0, np.float64))
+        if since is None:
+            days, prices = new_days, new_prices
+        else:
+            # Keep the cached history before `since` and replace the rest
+            keep = cached[1] < (np.datetime64(since, "D") - _EPOCH).astype(np.int32)
+            days = np.concatenate([cached[1][keep], new_days])
+            prices = np.concatenate([cached[2][keep], new_prices])
+
+        if days.size == 0 and cached is None:
+            # Do not create files for unknown symbols
+            return days, prices
+
+        path = self._path(symbol, price_field)
+        self._write(path, queried_at, days, prices)
+        return self._read(path)[1:]
+
+    def get(self, symbol: str, price_field: PriceField = PriceField.close_price) -> Tuple[np.ndarray, np.ndarray]:
+        """A symbol's full price history as read-only (int32 days since epoch, float64 prices) arrays."""
+        return self.get_many([symbol], price_field)[symbol]
+
+    def get_versioned(self, symbol: str, price_field: PriceField = PriceField.close_price):
+        """get() plus the series' data version: (queried_at, last date), which changes whenever it is re-read.
+
+        Every worker mapping the same file agrees on it, so it can key HTTP ETags
+        without querying market_price.
+        """
+        days, prices, queried_at = self._get_many([symbol], price_field)[symbol]
+        return days, prices, (queried_at, int(days[-1]) if days.size else None)
+
+
+def _slice(days: np.ndarray, start_date: Optional[date], end_date: Optional[date]) -> slice:
+    """Index range of a sorted day array that falls within the date range."""
+    start = 0 if start_date is None else np.searchsorted(days, (np.datetime64(start_date, "D") - _EPOCH).astype(int))
+    end = days.size if end_date is None else np.searchsorted(
+        days, (np.datetime64(end_date, "D") - _EPOCH).astype(int), side="right"
+    )
+    return slice(int(start), int(end))
+
+
+price_cache = PriceSeriesCache(settings.PRICE_CACHE_DIR) if settings.PRICE_CACHE_DIR else None
+
+
+def cached_price_series(db, symbol: str, start_date: Optional[date], end_date: Optional[date],
+                        price_field: PriceField = PriceField.close_price, frequency: Frequency = Frequency.daily):
+    """load_price_series served from the local price cache when PRICE_CACHE_DIR is set.
+
+    The cache holds daily prices; weekly and monthly series are read from the rollups.
+    """
+    if price_cache is None or frequency != Frequency.daily:
+        return load_price_series(db, symbol, start_date, end_date, price_field, frequency)
+
+    days, prices = price_cache.get(symbol, price_field)
+    window = _slice(days, start_date, end_date)
+    return (_EPOCH + days[window]).tolist(), prices[window]
+
+
+def cached_price_version(db, symbol: str, start_date: Optional[date], end_date: Optional[date],
+                         price_field: PriceField = PriceField.close_price, frequency: Frequency = Frequency.daily):
+    """Data version of a symbol's prices in a date range, for ETags and response caches.
+
+    Taken from the price cache entry when PRICE_CACHE_DIR is set (daily prices
+    only), so revalidating does not scan market_price; otherwise price_version.
+    """
+    if price_cache is None or frequency != Frequency.daily:
+        return tuple(db.execute(
+            price_version(frequency), {'symbols': [symbol], 'start_date': start_date, 'end_date': end_date}
+        ).fetchone())
+    return ("cache", *price_cache.get_versioned(symbol, price_field)[2])
+
+
+def cached_first_price_date(db, symbol: str, frequency: Frequency, start_date: Optional[date],
+                            price_field: PriceField = PriceField.close_price) -> Optional[date]:
+    """first_price_date for one symbol, read from the price cache when PRICE_CACHE_DIR is set."""
+    if price_cache is None or frequency != Frequency.auto or start_date is not None:
+        return first_price_date(db, [symbol], frequency, start_date)
+    days = price_cache.get(symbol, price_field)[0]
+    return (_EPOCH + days[0]).item() if days.size else None
+
+
+def cached_price_panel(db, symbols: List[str], start_date: Optional[date], end_date: Optional[date],
+                       price_field: PriceField = PriceField.close_price, frequency: Frequency = Frequency.daily,
+                       allocate: Optional[Callable] = None):
+    """load_price_panel served from the local price cache when PRICE_CACHE_DIR is set (daily prices only)."""
+    if price_cache is None or frequency != Frequency.daily:
+        return load_price_panel(db, symbols, start_date, end_date, price_field, frequency, allocate)
+
+    days, row_symbols, prices = [], [], []
+    for symbol, (symbol_days, symbol_prices) in price_cache.get_many(symbols, price_field).items():
+        window = _slice(symbol_days, start_date, end_date)
+        days.append(symbol_days[window])
+        prices.append(symbol_prices[window])
+        row_symbols.append(np.full(days[-1].size, symbol, dtype=object))
+
+    if not days or not sum(chunk.size for chunk in days):
+        return np.empty(0, dtype="datetime64[D]"), np.empty(0, dtype=str), np.empty((0, 0))
+    return build_price_panel(
+        _EPOCH + np.concatenate(days), np.concatenate(row_symbols), np.concatenate(prices), allocate
+    )
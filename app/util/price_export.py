@@ -0,0 +1,138 @@
+import csv
+import io
+from datetime import date
+from enum import Enum
+from typing import Iterator, List, Optional
+from sqlalchemy.sql import text
+
+from app.util.columnar import (
+    ARROW_STREAM_MEDIA_TYPE,
+    PARQUET_MEDIA_TYPE,
+    TableFormat,
+    iter_table_bytes,
+    record_batch
+)
+from app.util.database import get_db
+from app.util.json_response import dumps
+from app.util.market_data import Frequency, price_source
+from app.util.logger import logger
+
+# Rows fetched from the server-side cursor and encoded per chunk
+PRICE_EXPORT_CHUNK_SIZE = 10_000
+
+EXPORT_COLUMNS = (
+    "date",
+    "symbol",
+    "open_price",
+    "high_price",
+    "low_price",
+    "close_price",
+    "adjusted_close",
+    "volume",
+)
+
+
+class ExportFormat(Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+    arrow = "arrow"
+    parquet = "parquet"
+
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+    ExportFormat.arrow: ARROW_STREAM_MEDIA_TYPE,
+    ExportFormat.parquet: PARQUET_MEDIA_TYPE,
+}
+
+
+def _iter_price_chunks(symbols: List[str], start_date: Optional[date], end_date: Optional[date],
+                       frequency: Frequency = Frequency.daily) -> Iterator[list]:
+    """Yield price rows in chunks from a server-side cursor; the session lives as long as the stream.
+
+    Weekly and monthly rows come from the rollups, dated by the last trading day of each period.
+    """
+    table, date_column, condition = price_source(frequency)
+    db_session = get_db('sec_master', read_only=True)
+    db = next(db_session)
+    try:
+        result = db.execute(
+            text(f"""
+                SELECT {date_column}, symbol, open_price::float8, high_price::float8, low_price::float8,
+                       close_price::float8, adjusted_close::float8, volume
+                FROM {table}
+                WHERE symbol = ANY(:symbols){condition}
+                  AND (CAST(:start_date AS DATE) IS NULL OR {date_column} >= :start_date)
+                  AND (CAST(:end_date AS DATE) IS NULL OR {date_column} <= :end_date)
+                ORDER BY symbol, {date_column}
+            """),
+            {'symbols': symbols, 'start_date': start_date, 'end_date': end_date},
+            execution_options={'yield_per': PRICE_EXPORT_CHUNK_SIZE}
+        )
+        for partition in result.partitions():
+            yield partition
+    finally:
+        db_session.close()
+
+
+def _encode_ndjson(chunks: Iterator[list]) -> Iterator[bytes]:
+    for rows in chunks:
+        yield b"".join(dumps(dict(zip(EXPORT_COLUMNS, row))) + b"\n" for row in rows)
+
+
+def _encode_csv(chunks: Iterator[list]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _price_batches(chunks: Iterator[list]):
+    """Arrow schema of exported prices and an iterator of one record batch per chunk."""
+    import pyarrow as pa
+
+    schema = pa.schema([
+        ("date", pa.date32()),
+        ("symbol", pa.string()),
+        ("open_price", pa.float64()),
+        ("high_price", pa.float64()),
+        ("low_price", pa.float64()),
+        ("close_price", pa.float64()),
+        ("adjusted_close", pa.float64()),
+        ("volume", pa.int64()),
+    ])
+    batches = (record_batch(dict(zip(EXPORT_COLUMNS, zip(*rows))), schema) for rows in chunks)
+    return schema, batches
+
+
+def _encode_arrow(chunks: Iterator[list]) -> Iterator[bytes]:
+    schema, batches = _price_batches(chunks)
+    return iter_table_bytes(batches, schema, TableFormat.arrow)
+
+
+def _encode_parquet(chunks: Iterator[list]) -> Iterator[bytes]:
+    schema, batches = _price_batches(chunks)
+    return iter_table_bytes(batches, schema, TableFormat.parquet)
+
+
+ENCODERS = {
+    ExportFormat.ndjson: _encode_ndjson,
+    ExportFormat.csv: _encode_csv,
+    ExportFormat.arrow: _encode_arrow,
+    ExportFormat.parquet: _encode_parquet,
+}
+
+
+def stream_prices(symbols: List[str], start_date: Optional[date] = None, end_date: Optional[date] = None,
+                  export_format: ExportFormat = ExportFormat.ndjson,
+                  frequency: Frequency = Frequency.daily) -> Iterator[bytes]:
+    """Stream price history for the given symbols, encoded chunk by chunk, without materializing it."""
+    logger.info(f"Streaming {frequency.value} {export_format.value} price history for {len(symbols)} symbols")
+    return ENCODERS[export_format](_iter_price_chunks(symbols, start_date, end_date, frequency))
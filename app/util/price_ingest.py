@@ -0,0 +1,149 @@
+import io
+from enum import Enum
+from typing import BinaryIO, Dict, List
+from sqlalchemy.sql import text
+
+from app.util.market_data import PriceField
+from app.util.metric_state import mark_metric_state_stale, refresh_metric_state
+from app.util.portfolio_nav import refresh_portfolio_nav
+from app.util.price_cache import PRICE_CACHE_CHANNEL, invalidation_payload
+from app.util.price_rollup import refresh_price_rollups
+from app.util.logger import logger
+
+# Columns of market_price that can be loaded from a file
+INGEST_COLUMNS = (
+    "date",
+    "symbol",
+    "close_price",
+    "open_price",
+    "high_price",
+    "low_price",
+    "volume",
+    "adjusted_close",
+)
+REQUIRED_COLUMNS = ("date", "symbol", "close_price")
+
+# Rows per Parquet record batch converted and sent to COPY at a time
+PARQUET_BATCH_SIZE = 100_000
+
+STAGING_TABLE = "market_price_staging"
+
+
+class IngestFormat(Enum):
+    csv = "csv"
+    parquet = "parquet"
+
+
+def validate_columns(columns: List[str]) -> List[str]:
+    """Check a file's columns against market_price; raises ValueError on unknown or missing columns."""
+    unknown = [column for column in columns if column not in INGEST_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+    if len(set(columns)) != len(columns):
+        raise ValueError("Duplicate column names in header")
+    return columns
+
+
+def _copy_csv(cursor, fileobj: BinaryIO) -> List[str]:
+    """Stream a CSV file with a header row straight into the staging table."""
+    header = fileobj.readline()
+    if isinstance(header, bytes):
+        header = header.decode('utf-8-sig')
+    columns = validate_columns([column.strip().strip('"').lower() for column in header.strip().split(',')])
+
+    # The header has been consumed, so the rest of the file is pure data for COPY
+    cursor.copy_expert(
+        f"COPY {STAGING_TABLE} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+        fileobj
+    )
+    return columns
+
+
+def _copy_parquet(cursor, fileobj: BinaryIO) -> List[str]:
+    """Convert a Parquet file to CSV one record batch at a time and COPY each batch into staging."""
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(fileobj)
+    source_columns = parquet_file.schema_arrow.names
+    columns = validate_columns([name.lower() for name in source_columns])
+
+    copy_sql = f"COPY {STAGING_TABLE} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    write_options = pa_csv.WriteOptions(include_header=False)
+    for batch in parquet_file.iter_batches(batch_size=PARQUET_BATCH_SIZE, columns=source_columns):
+        buffer = io.BytesIO()
+        pa_csv.write_csv(batch, buffer, write_options)
+        buffer.seek(0)
+        cursor.copy_expert(copy_sql, buffer)
+    return columns
+
+
+def ingest_prices(db, fileobj: BinaryIO, file_format: IngestFormat = IngestFormat.csv,
+                  refresh_state: bool = True) -> Dict[str, int]:
+    """Bulk load prices into market_price via COPY into a staging table and one upsert.
+
+    Rows are COPYed into a transaction-local staging table, then merged with
+    INSERT ... ON CONFLICT (date, symbol). Only the columns present in the file
+    are overwritten on conflict. When a key appears more than once in the file
+    the last row wins. Metric state and weekly/monthly rollups for the touched
+    symbols, and the NAV of portfolios that hold them, are refreshed in the
+    same transaction. The caller owns the transaction and must commit.
+    """
+    # Use the session's own DB-API connection so COPY runs in the same transaction
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.execute(
+            f"CREATE TEMP TABLE {STAGING_TABLE} "
+            f"(LIKE market_price INCLUDING DEFAULTS, row_num BIGSERIAL) ON COMMIT DROP"
+        )
+        if file_format == IngestFormat.parquet:
+            columns = _copy_parquet(cursor, fileobj)
+        else:
+            columns = _copy_csv(cursor, fileobj)
+    finally:
+        cursor.close()
+
+    value_columns = [column for column in columns if column not in ("date", "symbol")]
+    column_list = ", ".join(columns)
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in value_columns)
+
+    staged = db.execute(text(f"SELECT count(*) FROM {STAGING_TABLE}")).scalar()
+    upserted = db.execute(
+        text(f"""
+            INSERT INTO market_price ({column_list})
+            SELECT DISTINCT ON (date, symbol) {column_list}
+            FROM {STAGING_TABLE}
+            ORDER BY date, symbol, row_num DESC
+            ON CONFLICT (date, symbol) DO UPDATE SET
+                {updates},
+                updated_at = CURRENT_TIMESTAMP
+        """)
+    ).rowcount
+
+    # Earliest loaded date per symbol; rollups are recomputed from the period containing it
+    since_by_symbol = dict(
+        db.execute(text(f"SELECT symbol, min(date) FROM {STAGING_TABLE} GROUP BY symbol")).fetchall()
+    )
+    symbols = sorted(since_by_symbol)
+    # Price caches re-read each loaded symbol from its earliest loaded date once this commits
+    if since_by_symbol:
+        db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {'channel': PRICE_CACHE_CHANNEL, 'payload': invalidation_payload(since_by_symbol)}
+        )
+    logger.info(f"Ingested {upserted} market prices ({staged} staged rows) for {len(symbols)} symbols")
+
+    # Even without a refresh, states whose history this load rewrote must not be extended later
+    if since_by_symbol:
+        mark_metric_state_stale(db, since_by_symbol)
+
+    if refresh_state and symbols:
+        for price_field in PriceField:
+            refresh_metric_state(db, symbols, price_field)
+        refresh_price_rollups(db, since_by_symbol)
+        refresh_portfolio_nav(db, since_by_symbol=since_by_symbol)
+
+    return {"staged": staged, "upserted": upserted, "symbols": len(symbols)}
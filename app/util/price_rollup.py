@@ -0,0 +1,90 @@
+from datetime import date
+from typing import Dict, List, Optional
+from sqlalchemy.sql import text
+
+from app.util.market_data import Frequency
+from app.util.logger import logger
+
+# Rolled-up frequencies and the date_trunc unit that defines their periods
+ROLLUP_UNITS = {
+    Frequency.weekly: "week",
+    Frequency.monthly: "month",
+}
+
+
+def _refresh_frequency(db, frequency: Frequency, symbols: List[str], since: List[Optional[date]]) -> int:
+    """Recompute the periods of one frequency from each symbol's `since` date on; returns the rows written."""
+    unit = ROLLUP_UNITS[frequency]
+    return db.execute(
+        text(f"""
+            WITH s AS (
+                SELECT symbol, date_trunc('{unit}', since)::date AS period_from
+                FROM unnest(CAST(:symbols AS VARCHAR[]), CAST(:since AS DATE[])) AS s(symbol, since)
+            ), periods AS (
+                SELECT mp.symbol,
+                       date_trunc('{unit}', mp.date)::date AS period_start,
+                       max(mp.date) AS period_end,
+                       (array_agg(mp.open_price ORDER BY mp.date) FILTER (WHERE mp.open_price IS NOT NULL))[1]
+                           AS open_price,
+                       (array_agg(mp.close_price ORDER BY mp.date DESC))[1] AS close_price,
+                       (array_agg(COALESCE(mp.adjusted_close, mp.close_price) ORDER BY mp.date DESC))[1]
+                           AS adjusted_close,
+                       max(COALESCE(mp.high_price, mp.close_price)) AS high_price,
+                       min(COALESCE(mp.low_price, mp.close_price)) AS low_price,
+                       sum(mp.volume) AS volume,
+                       count(*) AS observations
+                FROM market_price mp
+                JOIN s ON mp.symbol = s.symbol
+                WHERE s.period_from IS NULL OR mp.date >= s.period_from
+                GROUP BY mp.symbol, date_trunc('{unit}', mp.date)
+            )
+            INSERT INTO market_price_rollup (
+                symbol, frequency, period_start, period_end, open_price, high_price, low_price,
+                close_price, adjusted_close, volume, observations, period_return
+            )
+            SELECT p.symbol, :frequency, p.period_start, p.period_end, p.open_price, p.high_price, p.low_price,
+                   p.close_price, p.adjusted_close, p.volume, p.observations,
+                   -- The first recomputed period takes its previous close from the stored rollup
+                   p.close_price / NULLIF(COALESCE(
+                       lag(p.close_price) OVER (PARTITION BY p.symbol ORDER BY p.period_start),
+                       (SELECT r.close_price FROM market_price_rollup r
+                        WHERE r.symbol = p.symbol AND r.frequency = :frequency AND r.period_start < p.period_start
+                        ORDER BY r.period_start DESC LIMIT 1)
+                   ), 0) - 1
+            FROM periods p
+            ON CONFLICT (symbol, frequency, period_start) DO UPDATE SET
+                period_end = EXCLUDED.period_end,
+                open_price = EXCLUDED.open_price,
+                high_price = EXCLUDED.high_price,
+                low_price = EXCLUDED.low_price,
+                close_price = EXCLUDED.close_price,
+                adjusted_close = EXCLUDED.adjusted_close,
+                volume = EXCLUDED.volume,
+                observations = EXCLUDED.observations,
+                period_return = EXCLUDED.period_return,
+                updated_at = CURRENT_TIMESTAMP
+        """),
+        {'symbols': symbols, 'since': since, 'frequency': frequency.value}
+    ).rowcount
+
+
+def refresh_price_rollups(db, since_by_symbol: Optional[Dict[str, Optional[date]]] = None) -> int:
+    """Bring the weekly and monthly rollups up to date with market_price.
+
+    since_by_symbol maps each symbol to the earliest date whose prices changed
+    (None rebuilds the symbol); only the periods from that date on are
+    recomputed. Without it every security is rebuilt. The caller owns the
+    transaction and must commit.
+    """
+    if since_by_symbol is None:
+        since_by_symbol = {row[0]: None for row in db.execute(text("SELECT symbol FROM securities"))}
+
+    symbols = sorted(since_by_symbol)
+    since = [since_by_symbol[symbol] for symbol in symbols]
+
+    written = 0
+    for frequency in ROLLUP_UNITS:
+        written += _refresh_frequency(db, frequency, symbols, since)
+
+    logger.info(f"Refreshed {written} weekly/monthly price rollups for {len(symbols)} symbols")
+    return written
@@ -44,3 +44,11 @@ def handle_unauthorized_error(message: str = "Unauthorized access") -> HTTPExcep
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail=message
     )
+
+def handle_service_unavailable_error(message: str = "Service temporarily unavailable", retry_after: int = 1) -> HTTPException:
+    """Handle overload errors and return an HTTP 503 exception asking the client to retry."""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=message,
+        headers={"Retry-After": str(retry_after)}
+    )
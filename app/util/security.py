@@ -5,7 +5,10 @@ import hashlib
 import base64
 from datetime import datetime, timedelta
 from typing import Optional
+from app.core.config import settings
+from app.util.cache import TTLCache
 from app.util.logger import logger
+from app.util.worker_pool import BoundedWorkerPool
 
 SECRET_KEY = os.getenv('SECRET_KEY', 'your_secret_key')
 ACCESS_TOKEN_EXPIRE_HOURS = 1
@@ -18,6 +21,25 @@ def verify_password(password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
     return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
 
+# bcrypt releases the GIL while hashing, so a small thread pool gives real parallelism
+# without blocking the event loop. Requests beyond the queue limit are rejected.
+password_pool = BoundedWorkerPool(
+    "password-hash",
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE
+)
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the bounded bcrypt pool. Raises PoolSaturatedError when the pool is full."""
+    return await password_pool.run(hash_password, password)
+
+async def verify_password_async(password: str, hashed_password: str) -> bool:
+    """Verify a password on the bounded bcrypt pool. Raises PoolSaturatedError when the pool is full."""
+    return await password_pool.run(verify_password, password, hashed_password)
+
+# Verified tokens -> username; each entry expires together with its token
+token_cache = TTLCache(maxsize=settings.TOKEN_CACHE_SIZE)
+
 def generate_token(username: str) -> str:
     """Generate a JWT-like token with expiration."""
     expiration = (datetime.utcnow() + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)).strftime('%Y-%m-%d %H:%M:%S')
@@ -27,8 +49,16 @@ def generate_token(username: str) -> str:
     return base64.urlsafe_b64encode(token.encode()).decode()
 
 def verify_token(token: str) -> Optional[str]:
-    """Verify a token's validity."""
-    logger.debug(f'Verifying token: {token}')
+    """Verify a token's validity.
+
+    Verified tokens are cached until their own expiry, so repeat requests
+    with the same token skip decoding and the HMAC check entirely.
+    """
+    username = token_cache.get(token)
+    if username is not None:
+        return username
+
+    logger.debug('Verifying token')
     try:
         decoded_token = base64.urlsafe_b64decode(token).decode()
         username, expiration, signature = decoded_token.rsplit('|', 2)
@@ -36,7 +66,9 @@ def verify_token(token: str) -> Optional[str]:
         expected_signature = hmac.new(SECRET_KEY.encode(), payload.encode(), hashlib.sha256).hexdigest()
 
         if hmac.compare_digest(signature, expected_signature):
-            if datetime.utcnow() < datetime.strptime(expiration, '%Y-%m-%d %H:%M:%S'):
+            remaining = (datetime.fromisoformat(expiration) - datetime.utcnow()).total_seconds()
+            if remaining > 0:
+                token_cache.set(token, username, ttl=remaining)
                 return username
             else:
                 logger.debug("Token valid but expired")
@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+from app.util.logger import logger
+
+
+class PoolSaturatedError(Exception):
+    """Raised when a bounded worker pool already has its maximum number of tasks running or queued."""
+
+
+class BoundedWorkerPool:
+    """Fixed-size thread pool for blocking calls from async code, with a queue-depth limit.
+
+    At most max_workers tasks run at once and at most max_queue more may wait.
+    Anything beyond that is rejected immediately with PoolSaturatedError, so
+    callers can shed load instead of piling up latency.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+        self._started = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_run = 0.0
+
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        """Run fn(*args) on the pool and await its result; raises PoolSaturatedError when full."""
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                logger.warning(f"{self.name} pool saturated ({self._in_flight} tasks in flight), rejecting task")
+                raise PoolSaturatedError(f"{self.name} pool is saturated")
+            self._in_flight += 1
+            self.submitted += 1
+
+        queued_at = time.monotonic()
+
+        def task():
+            started_at = time.monotonic()
+            with self._lock:
+                self._running += 1
+                self._started += 1
+                wait = started_at - queued_at
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._total_run += time.monotonic() - started_at
+
+        # In-flight accounting follows the executor future, not this coroutine: a caller that is
+        # cancelled or times out stops waiting, but its task keeps its slot until it finishes
+        try:
+            future = self._executor.submit(task)
+        except RuntimeError:
+            # The pool was shut down
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        future.add_done_callback(self._finished)
+        return await asyncio.wrap_future(future)
+
+    def _finished(self, future: Future) -> None:
+        """Release the slot of a task that completed, failed or was cancelled before it started."""
+        with self._lock:
+            self._in_flight -= 1
+            if future.cancelled():
+                self.cancelled += 1
+                return
+            self.completed += 1
+            if future.exception() is not None:
+                self.failed += 1
+
+    def stats(self) -> dict:
+        """Current load and cumulative counters for monitoring."""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": self._in_flight - self._running,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(1000 * self._total_wait / self._started, 3) if self._started else 0.0,
+                "max_wait_ms": round(1000 * self._max_wait, 3),
+                "avg_run_ms": round(1000 * self._total_run / self.completed, 3) if self.completed else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        """Stop accepting work and drop queued tasks."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
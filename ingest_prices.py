@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Bulk load market prices from CSV or Parquet files into market_price using COPY
+"""
+
+import argparse
+import sys
+
+from app.util.database import get_db
+from app.util.price_ingest import IngestFormat, ingest_prices
+from app.util.logger import logger
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load market prices into market_price")
+    parser.add_argument("files", nargs="+", help="CSV (with header) or Parquet files to load")
+    parser.add_argument("--format", choices=[f.value for f in IngestFormat], default=None,
+                        help="File format (default: inferred from the file extension)")
+    parser.add_argument("--no-refresh-state", action="store_true",
+                        help="Skip the incremental metric state and portfolio NAV refresh after loading")
+    args = parser.parse_args()
+
+    db = next(get_db('sec_master'))
+    try:
+        for path in args.files:
+            if args.format:
+                file_format = IngestFormat(args.format)
+            else:
+                file_format = IngestFormat.parquet if path.lower().endswith((".parquet", ".pq")) else IngestFormat.csv
+
+            with open(path, "rb") as fileobj:
+                counts = ingest_prices(db, fileobj, file_format, refresh_state=not args.no_refresh_state)
+            db.commit()
+            logger.info(f"Loaded {path}: {counts}")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Market price ingest failed: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -75,6 +75,7 @@ kubectl apply -f k8s/namespace.yaml
 kubectl apply -f k8s/configmap.yaml
 kubectl apply -f k8s/secret.yaml
 kubectl apply -f k8s/deployment.yaml
+kubectl apply -f k8s/worker-deployment.yaml
 kubectl apply -f k8s/service.yaml
 echo -e "${GREEN}Manifests applied${NC}"
 
@@ -1,8 +1,18 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from app.routers import api_router
+from app.routers.auth import IDENTITY_CACHE_CHANNEL, invalidate_identity_cache
+from app.routers.instruments import INSTRUMENT_CACHE_CHANNEL, invalidate_instrument_cache
+from app.routers.metrics import invalidate_matrix_cache
 from app.core.config import settings
+from app.util.cache import start_listener
+from app.util.compression import CompressionMiddleware
+from app.util.price_cache import PRICE_CACHE_CHANNEL, price_cache
+from app.util.database import dispose_async_engines, get_pool_metrics, read_from_primary
 from app.util.logger import configure_root_logging
+from app.util.parallel_metrics import shutdown_process_pool
+from app.util.security import password_pool
 
 # Configure logging first
 configure_root_logging()
@@ -11,7 +21,9 @@ app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.PROJECT_VERSION,
     description=settings.PROJECT_DESCRIPTION,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    # Routes that return models are rendered with orjson rather than the stdlib encoder
+    default_response_class=ORJSONResponse
 )
 
 # Set up CORS middleware
@@ -23,9 +35,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large responses with the best coding the client accepts
+app.add_middleware(CompressionMiddleware, minimum_size=settings.HTTP_COMPRESSION_MIN_SIZE)
+
+# Clients that must see their own writes send "X-Read-Your-Writes: true" to bypass the read replicas
+@app.middleware("http")
+async def route_reads_to_primary(request: Request, call_next):
+    token = read_from_primary.set(request.headers.get("X-Read-Your-Writes", "").lower() in ("1", "true"))
+    try:
+        return await call_next(request)
+    finally:
+        read_from_primary.reset(token)
+
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+@app.on_event("startup")
+async def start_cache_listeners():
+    if settings.INSTRUMENT_CACHE_LISTEN:
+        start_listener('sec_master', INSTRUMENT_CACHE_CHANNEL, invalidate_instrument_cache)
+    if settings.IDENTITY_CACHE_LISTEN:
+        start_listener('user_data', IDENTITY_CACHE_CHANNEL, invalidate_identity_cache)
+    if price_cache is not None:
+        start_listener('sec_master', PRICE_CACHE_CHANNEL, price_cache.invalidate)
+    if settings.METRICS_MATRIX_CACHE_LISTEN:
+        start_listener('sec_master', PRICE_CACHE_CHANNEL, invalidate_matrix_cache)
+
+@app.on_event("shutdown")
+async def close_database_connections():
+    await dispose_async_engines()
+    password_pool.shutdown()
+    shutdown_process_pool()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Portfolio Metrics API"}
@@ -34,6 +75,11 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/health/pools")
+async def pool_metrics():
+    """Load and counters of the worker pools, for monitoring."""
+    return {"password_hashing": password_pool.stats(), "database": get_pool_metrics()}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -53,4 +53,172 @@ CREATE INDEX idx_market_price_symbol ON market_price(symbol);
 
 -- Add sample data for testing
 INSERT INTO market_price (date, symbol, close_price, volume) VALUES
-('2024-01-17', 'GOOGL', 141.90, 21000000);
\ No newline at end of file
+('2024-01-17', 'GOOGL', 141.90, 21000000);
+
+
+-- Running metric state per symbol and price field, updated incrementally on ingest
+-- so full-history metrics never rescan market_price. Price loads set rebuild_required
+-- on states whose history they rewrite (rows at or before last_date); anything else
+-- that changes or deletes such rows must do the same (mark_metric_state_stale)
+CREATE TABLE metric_state (
+    symbol VARCHAR(50) NOT NULL,
+    price_field VARCHAR(20) NOT NULL,
+    first_date DATE NOT NULL,
+    last_date DATE NOT NULL,
+    first_price DOUBLE PRECISION NOT NULL,
+    last_price DOUBLE PRECISION NOT NULL,
+    running_peak DOUBLE PRECISION NOT NULL,
+    max_drawdown DOUBLE PRECISION NOT NULL DEFAULT 0,
+    -- Welford accumulators over period returns
+    return_count INTEGER NOT NULL DEFAULT 0,
+    mean_return DOUBLE PRECISION NOT NULL DEFAULT 0,
+    m2_return DOUBLE PRECISION NOT NULL DEFAULT 0,
+    rebuild_required BOOLEAN NOT NULL DEFAULT false,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (symbol, price_field),
+    FOREIGN KEY (symbol) REFERENCES securities(symbol) ON DELETE CASCADE
+);
+
+-- Weekly and monthly OHLCV bars rolled up from market_price, refreshed incrementally
+-- after each price load (see app/util/price_rollup.py). Long-horizon metrics and
+-- history read these instead of scanning every daily row. period_end is the last
+-- trading date in the period; period_return is on close_price.
+CREATE TABLE market_price_rollup (
+    symbol VARCHAR(50) NOT NULL,
+    frequency VARCHAR(10) NOT NULL CHECK (frequency IN ('weekly', 'monthly')),
+    period_start DATE NOT NULL,
+    period_end DATE NOT NULL,
+    open_price DECIMAL(15,4),
+    high_price DECIMAL(15,4),
+    low_price DECIMAL(15,4),
+    close_price DECIMAL(15,4) NOT NULL,
+    adjusted_close DECIMAL(15,4) NOT NULL,
+    volume BIGINT,
+    observations INTEGER NOT NULL,
+    period_return DOUBLE PRECISION,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (symbol, frequency, period_start),
+    FOREIGN KEY (symbol) REFERENCES securities(symbol) ON DELETE CASCADE
+);
+
+-- Date-range reads filter on the period end
+CREATE INDEX idx_market_price_rollup_period_end ON market_price_rollup(symbol, frequency, period_end);
+
+
+
+-- Portfolios, kept in sec_master so holdings can be valued against market_price in SQL.
+-- The primary key serves id lookups; (owner_id, id) serves owner-scoped keyset pagination.
+CREATE TABLE portfolio (
+    id VARCHAR(64) PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    owner_id VARCHAR(64) NOT NULL,
+    description TEXT,
+    benchmark VARCHAR(50),
+    base_currency VARCHAR(3),
+    meta_data JSONB,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX idx_portfolio_owner_id ON portfolio(owner_id, id);
+
+
+-- Portfolio ledger. Quantities and cash amounts are signed: a buy adds quantity and
+-- spends cash, a sell does the reverse, deposits/dividends add cash and
+-- withdrawals/fees remove it. created_at uses clock_timestamp() so NAV refreshes
+-- can tell which transactions they have not seen.
+CREATE TABLE portfolio_transaction (
+    id BIGSERIAL PRIMARY KEY,
+    portfolio_id VARCHAR(64) NOT NULL REFERENCES portfolio(id) ON DELETE CASCADE,
+    trade_date DATE NOT NULL,
+    transaction_type VARCHAR(16) NOT NULL,
+    symbol VARCHAR(50) REFERENCES securities(symbol),
+    quantity DECIMAL(20,6) NOT NULL DEFAULT 0,
+    price DECIMAL(15,4),
+    cash_amount DECIMAL(20,4) NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+);
+
+CREATE INDEX idx_portfolio_transaction_portfolio_date ON portfolio_transaction(portfolio_id, trade_date);
+
+-- Current positions, maintained with each transaction. Closed positions keep a
+-- zero-quantity row so price loads can find every portfolio that held a symbol.
+CREATE TABLE portfolio_holding (
+    portfolio_id VARCHAR(64) NOT NULL REFERENCES portfolio(id) ON DELETE CASCADE,
+    symbol VARCHAR(50) NOT NULL REFERENCES securities(symbol),
+    quantity DECIMAL(20,6) NOT NULL,
+    cost_basis DECIMAL(20,4) NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (portfolio_id, symbol)
+);
+
+CREATE INDEX idx_portfolio_holding_symbol ON portfolio_holding(symbol);
+
+-- Materialized daily NAV per portfolio (see app/util/portfolio_nav.py). unit_value
+-- is the time-weighted index that portfolio metrics are computed from.
+CREATE TABLE portfolio_nav (
+    portfolio_id VARCHAR(64) NOT NULL REFERENCES portfolio(id) ON DELETE CASCADE,
+    date DATE NOT NULL,
+    nav DOUBLE PRECISION NOT NULL,
+    cash DOUBLE PRECISION NOT NULL,
+    net_flow DOUBLE PRECISION NOT NULL,
+    unit_value DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (portfolio_id, date)
+);
+
+ALTER TABLE portfolio ADD COLUMN nav_refreshed_at TIMESTAMPTZ;
+
+
+-- End-of-day portfolio snapshots pushed in bulk by reconciliation jobs
+CREATE TABLE portfolio_snapshot (
+    portfolio_id VARCHAR(64) NOT NULL REFERENCES portfolio(id) ON DELETE CASCADE,
+    as_of_date DATE NOT NULL,
+    balance DECIMAL(20,4) NOT NULL,
+    is_active BOOLEAN NOT NULL,
+    meta_data JSONB,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (portfolio_id, as_of_date)
+);
+
+-- Date-range reads across all portfolios
+CREATE INDEX idx_portfolio_snapshot_date ON portfolio_snapshot(as_of_date, portfolio_id);
+
+-- Queue of long-running jobs (universe metrics, return matrices, backfills) and their
+-- results, drained by worker.py with FOR UPDATE SKIP LOCKED. job_key hashes the job
+-- type and parameters; the partial unique index lets only one identical job be
+-- queued or running at a time.
+CREATE TABLE metric_job (
+    id BIGSERIAL PRIMARY KEY,
+    job_type VARCHAR(50) NOT NULL,
+    params JSONB NOT NULL,
+    job_key CHAR(64) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued', 'running', 'succeeded', 'failed')),
+    result JSONB,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker VARCHAR(255),
+    created_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp(),
+    started_at TIMESTAMPTZ,
+    -- Heartbeat of the worker running the job
+    last_seen_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ
+);
+
+CREATE UNIQUE INDEX uq_metric_job_in_flight ON metric_job(job_key) WHERE status IN ('queued', 'running');
+-- Workers scan only the jobs that are still queued or running
+CREATE INDEX idx_metric_job_pending ON metric_job(id) WHERE status IN ('queued', 'running');
+
+-- (user_data database) Notify API replicas when a user's roles change so their
+-- in-process identity caches drop the user
+CREATE OR REPLACE FUNCTION notify_identity_cache() RETURNS trigger AS $$
+BEGIN
+  PERFORM pg_notify('identity_cache', u.username)
+  FROM users u
+  WHERE u.id IN (NEW.user_id, OLD.user_id);
+  RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+CREATE TRIGGER user_role_mapping_identity_cache
+AFTER INSERT OR UPDATE OR DELETE ON user_role_mapping
+FOR EACH ROW EXECUTE FUNCTION notify_identity_cache();
@@ -0,0 +1,5 @@
+import os
+
+# Settings are read when app modules are imported; SECRET_KEY has no default,
+# so provide a throwaway one for tests run without an environment
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
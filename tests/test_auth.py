@@ -0,0 +1,48 @@
+import base64
+import hashlib
+import hmac
+import time
+from datetime import datetime, timedelta
+import app.util.cache as cache_module
+from app.routers.auth import identity_cache, invalidate_identity_cache
+from app.util.security import SECRET_KEY, token_cache, verify_token
+
+def make_token(username, expires_in):
+    """A signed token for username expiring expires_in seconds from now"""
+    expiration = (datetime.utcnow() + timedelta(seconds=expires_in)).strftime('%Y-%m-%d %H:%M:%S')
+    payload = f"{username}|{expiration}"
+    signature = hmac.new(SECRET_KEY.encode(), payload.encode(), hashlib.sha256).hexdigest()
+    return base64.urlsafe_b64encode(f"{payload}|{signature}".encode()).decode()
+
+def test_token_cache_entry_expires_with_the_token(monkeypatch):
+    """Test that a verified token is cached no longer than the token itself is valid"""
+    token_cache.clear()
+    token = make_token("alice", 30)
+    assert verify_token(token) == "alice"
+    assert token_cache._data[token][1] - time.monotonic() <= 30
+
+    # Once the token's expiry has passed the cached entry misses
+    now = time.monotonic()
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now + 31)
+    assert token_cache.get(token) is None
+
+def test_expired_token_is_rejected_and_not_cached():
+    """Test that an expired token fails verification and never enters the cache"""
+    token_cache.clear()
+    token = make_token("alice", -5)
+    assert verify_token(token) is None
+    assert token_cache.get(token) is None
+    assert len(token_cache) == 0
+
+def test_identity_cache_notification_drops_the_user():
+    """Test that the identity cache NOTIFY handler drops one user, or everyone for an empty payload"""
+    identity_cache.clear()
+    identity_cache.set("alice", "alice's identity")
+    identity_cache.set("bob", "bob's identity")
+
+    invalidate_identity_cache("alice")
+    assert identity_cache.get("alice") is None
+    assert identity_cache.get("bob") == "bob's identity"
+
+    invalidate_identity_cache("")
+    assert identity_cache.get("bob") is None
@@ -0,0 +1,74 @@
+import time
+from app.util.cache import TTLCache
+
+def test_ttl_cache_get_and_set():
+    """Test storing and retrieving values"""
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("AAPL", 1)
+    assert cache.get("AAPL") == 1
+    assert cache.get("MSFT") is None
+    assert cache.get("MSFT", "default") == "default"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+def test_ttl_cache_evicts_least_recently_used():
+    """Test that the least recently used entry is evicted when full"""
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+def test_ttl_cache_expires_entries():
+    """Test that entries expire after their time-to-live"""
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("short", 1, ttl=0.01)
+    cache.set("long", 2)
+    time.sleep(0.02)
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+    assert len(cache) == 1
+
+def test_ttl_cache_pop_and_clear():
+    """Test explicit invalidation"""
+    cache = TTLCache()
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.pop("a")
+    cache.pop("missing")
+    assert cache.get("a") is None
+    cache.clear()
+    assert len(cache) == 0
+
+def test_ttl_cache_bounds_total_bytes():
+    """Test that entries are evicted to stay within maxbytes and oversized values are not cached"""
+    cache = TTLCache(maxsize=10, ttl=60, maxbytes=100, sizeof=len)
+    cache.set("a", b"x" * 40)
+    cache.set("b", b"x" * 40)
+    cache.get("a")
+    cache.set("c", b"x" * 40)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["bytes"] == 80
+
+    cache.set("d", b"x" * 101)
+    assert cache.get("d") is None
+    cache.set("a", b"x" * 10)
+    assert cache.stats()["bytes"] == 50
+    cache.clear()
+    assert cache.stats()["bytes"] == 0
+
+def test_ttl_cache_skips_values_read_before_an_invalidation():
+    """Test that a value loaded before a concurrent invalidation is not stored"""
+    cache = TTLCache(maxsize=10, ttl=60)
+    generation = cache.generation
+    cache.pop("AAPL")  # a writer invalidates while the reader is loading
+    cache.set("AAPL", "stale", generation=generation)
+    assert cache.get("AAPL") is None
+
+    generation = cache.generation
+    cache.set("AAPL", "fresh", generation=generation)
+    assert cache.get("AAPL") == "fresh"
@@ -0,0 +1,69 @@
+import gzip
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from app.util.compression import ENCODERS, CompressionMiddleware, negotiate_encoding
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+@app.get("/large")
+def large():
+    return Response(b"x" * 1000, media_type="application/json", headers={"ETag": '"abc"'})
+
+@app.get("/small")
+def small():
+    return Response(b"x" * 10, media_type="application/json", headers={"ETag": '"abc"'})
+
+@app.get("/parquet")
+def parquet():
+    return Response(b"x" * 1000, media_type="application/x-parquet")
+
+@app.get("/stream")
+def stream():
+    return StreamingResponse(iter([b"a" * 10, b"b" * 10, b"c" * 10]), media_type="application/x-ndjson")
+
+client = TestClient(app)
+
+def get_raw(path, accept_encoding="gzip"):
+    """Response with its body as sent, without the client decoding it"""
+    with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+def test_negotiate_encoding_respects_quality_values():
+    """Test that codings are picked by quality, refused with q=0 and matched by wildcard"""
+    assert negotiate_encoding("gzip") == "gzip"
+    assert negotiate_encoding("") is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("gzip;q=0") is None
+    assert negotiate_encoding("*") == next(iter(ENCODERS))
+    assert negotiate_encoding("unknown, *;q=0.1") == next(iter(ENCODERS))
+
+@pytest.mark.parametrize("path, compressed", [("/large", True), ("/small", False), ("/parquet", False)])
+def test_compresses_large_responses_only(path, compressed):
+    """Test that only responses above the threshold and not compressed already are gzipped"""
+    response, body = get_raw(path)
+    if compressed:
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["etag"] == 'W/"abc"'
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert int(response.headers["content-length"]) == len(body)
+        assert gzip.decompress(body) == b"x" * 1000
+    else:
+        assert "content-encoding" not in response.headers
+        assert body == b"x" * (10 if path == "/small" else 1000)
+
+def test_streams_are_compressed_piece_by_piece():
+    """Test that streamed responses are compressed regardless of size and decode to the full body"""
+    response, body = get_raw("/stream")
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert gzip.decompress(body) == b"a" * 10 + b"b" * 10 + b"c" * 10
+
+def test_no_compression_without_accept_encoding():
+    """Test that responses are sent as they are to clients that accept no coding"""
+    response, body = get_raw("/large", accept_encoding="identity")
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"abc"'
+    assert body == b"x" * 1000
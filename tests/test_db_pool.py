@@ -0,0 +1,38 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from app.util.db_pool import InstrumentedQueuePool, PoolStats, instrument_engine, pool_status
+
+def test_pool_status_counts_checkouts_and_overflow():
+    """Test that checkouts, in-use connections and overflow connects are reported"""
+    engine = create_engine("sqlite://", poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=1)
+    instrument_engine(engine, PoolStats())
+
+    first = engine.connect()
+    second = engine.connect()
+    status = pool_status(engine)
+    assert status["in_use"] == 2
+    assert status["overflow"] == 1
+    assert status["checkouts"] == 2
+    assert status["connects"] == 2
+    assert status["overflow_events"] == 1
+
+    first.close()
+    second.close()
+    assert pool_status(engine)["in_use"] == 0
+    engine.dispose()
+
+def test_pool_status_counts_timeouts():
+    """Test that a checkout that times out on an exhausted pool is recorded"""
+    engine = create_engine("sqlite://", poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0,
+                           pool_timeout=0.05)
+    instrument_engine(engine, PoolStats())
+
+    held = engine.connect()
+    with pytest.raises(PoolTimeoutError):
+        engine.connect()
+    status = pool_status(engine)
+    assert status["checkout_timeouts"] == 1
+    assert status["max_checkout_wait_ms"] >= 40
+    held.close()
+    engine.dispose()
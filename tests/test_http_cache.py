@@ -0,0 +1,44 @@
+from starlette.requests import Request
+from fastapi import Response
+from app.util.http_cache import make_etag, negotiate_media_type, not_modified
+
+def make_request(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers, "query_string": b""})
+
+def test_make_etag_is_strong_and_deterministic():
+    """Test that ETags are quoted strong validators that change with any part"""
+    etag = make_etag("metrics", {"b": 2, "a": 1}, (10, "2024-01-01"))
+    assert etag.startswith('"') and etag.endswith('"') and not etag.startswith("W/")
+    assert etag == make_etag("metrics", {"a": 1, "b": 2}, (10, "2024-01-01"))
+    assert etag != make_etag("metrics", {"a": 1, "b": 2}, (11, "2024-01-01"))
+
+def test_not_modified_honours_if_none_match():
+    """Test that matching If-None-Match values give a 304 and every response gets cache headers"""
+    etag = make_etag("x")
+    response = Response()
+    assert not_modified(make_request(), response, etag, 5) is None
+    assert response.headers["etag"] == etag
+    assert response.headers["cache-control"] == "public, max-age=5, must-revalidate"
+
+    assert not_modified(make_request('"other"'), None, etag, 5) is None
+    for header in (etag, f'"other", W/{etag}', "*"):
+        unchanged = not_modified(make_request(header), None, etag, 5)
+        assert unchanged.status_code == 304
+        assert unchanged.headers["etag"] == etag
+
+def make_accept_request(accept):
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [(b"accept", accept.encode())],
+                    "query_string": b""})
+
+def test_negotiate_media_type_follows_quality_and_specificity():
+    """Test that the highest rated offer wins, the first offer breaks ties and is the fallback"""
+    offers = ["application/json", "application/vnd.apache.arrow.stream", "application/x-parquet"]
+    assert negotiate_media_type(make_request(), offers) == "application/json"
+    assert negotiate_media_type(make_accept_request("*/*"), offers) == "application/json"
+    assert negotiate_media_type(make_accept_request("application/x-parquet"), offers) == "application/x-parquet"
+    accept = "application/json;q=0.5, application/vnd.apache.arrow.stream"
+    assert negotiate_media_type(make_accept_request(accept), offers) == "application/vnd.apache.arrow.stream"
+    accept = "application/*;q=0.2, application/x-parquet;q=0.9, application/json;q=0"
+    assert negotiate_media_type(make_accept_request(accept), offers) == "application/x-parquet"
+    assert negotiate_media_type(make_accept_request("text/html"), offers) == "application/json"
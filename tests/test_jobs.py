@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+from fastapi import HTTPException
+import time
+from app.core.config import settings
+from app.util import jobs
+from app.util.jobs import execute_job, job_heartbeat, job_key
+
+class FakeSession:
+    """Records the parameters of every statement and the commits/rollbacks around them"""
+
+    def __init__(self, rowcount=1):
+        self.calls = []
+        self.rowcount = rowcount
+
+    def execute(self, statement, params=None):
+        self.calls.append(("execute", params))
+        return SimpleNamespace(rowcount=self.rowcount)
+
+    def commit(self):
+        self.calls.append(("commit", None))
+
+    def rollback(self):
+        self.calls.append(("rollback", None))
+
+def test_job_key_ignores_parameter_order():
+    """Test that identical jobs get the same key regardless of parameter order"""
+    assert job_key("return_matrix", {"a": 1, "b": [1, 2]}) == job_key("return_matrix", {"b": [1, 2], "a": 1})
+    assert job_key("return_matrix", {"a": 1}) != job_key("universe_metrics", {"a": 1})
+    assert job_key("return_matrix", {"a": 1}) != job_key("return_matrix", {"a": 2})
+
+def test_execute_job_stores_result():
+    """Test that a successful job's result is stored and committed"""
+    db = FakeSession()
+    job = SimpleNamespace(id=7, job_type="metric_state", params={"symbols": ["AAPL"]})
+
+    assert execute_job(db, job, lambda session, job_type, params: {"updated": len(params["symbols"])}, "w1")
+    (_, params), commit = db.calls
+    assert params == {'id': 7, 'worker': "w1", 'result': '{"updated":1}'}
+    assert commit == ("commit", None)
+
+def test_execute_job_discards_result_of_reclaimed_job():
+    """Test that a job reclaimed by another worker has its writes rolled back and is not reported as succeeded"""
+    db = FakeSession(rowcount=0)
+    job = SimpleNamespace(id=9, job_type="metric_state", params={"symbols": ["AAPL"]})
+
+    assert not execute_job(db, job, lambda session, job_type, params: {"updated": 1}, "w1")
+    assert db.calls[-1] == ("rollback", None)
+    assert ("commit", None) not in db.calls
+
+def test_execute_job_records_failure():
+    """Test that a failing job is rolled back and its error recorded"""
+    db = FakeSession()
+    job = SimpleNamespace(id=8, job_type="return_matrix", params={})
+
+    def fail(session, job_type, params):
+        raise HTTPException(status_code=422, detail="Validation error for symbols: too many")
+
+    assert not execute_job(db, job, fail, "w1")
+    assert db.calls[0] == ("rollback", None)
+    assert db.calls[1][1]["error"] == "Validation error for symbols: too many"
+    assert db.calls[-1] == ("commit", None)
+
+def test_job_heartbeat_refreshes_lease_until_block_exits(monkeypatch):
+    """Test that the heartbeat updates last_seen_at on its own session and stops with the block"""
+    db = FakeSession()
+
+    def fake_get_db(name):
+        yield db
+    monkeypatch.setattr(jobs, "get_db", fake_get_db)
+    monkeypatch.setattr(settings, "JOB_HEARTBEAT_SECONDS", 0.01)
+
+    with job_heartbeat(5, "w1"):
+        time.sleep(0.1)
+    beats = len(db.calls)
+    time.sleep(0.05)
+    assert beats >= 2 and len(db.calls) == beats
+    assert db.calls[0] == ("execute", {'id': 5, 'worker': "w1"})
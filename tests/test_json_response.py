@@ -0,0 +1,29 @@
+import json
+from datetime import date, datetime
+import numpy as np
+from app.util.json_response import dumps, rows_to_json
+
+def test_dumps_handles_numpy_and_non_finite_values():
+    """Test that NumPy arrays serialize natively with NaN and inf as null"""
+    body = dumps({
+        "series": np.array([1.5, np.nan, np.inf]),
+        "matrix": np.array([[1.0, 0.5], [0.5, 1.0]]),
+        "value": float("nan"),
+        1: "non-string key",
+    })
+    assert json.loads(body) == {
+        "series": [1.5, None, None],
+        "matrix": [[1.0, 0.5], [0.5, 1.0]],
+        "value": None,
+        "1": "non-string key",
+    }
+
+def test_rows_to_json_matches_per_row_serialization():
+    """Test that rows serialize to the same objects as zipping each row with the columns"""
+    columns = ["symbol", "date", "updated_at", "close_price"]
+    rows = [("AAPL", date(2024, 1, 2), datetime(2024, 1, 2, 16, 0), 185.64), ("MSFT", None, None, None)]
+    assert json.loads(rows_to_json(columns, rows)) == [
+        {"symbol": "AAPL", "date": "2024-01-02", "updated_at": "2024-01-02T16:00:00", "close_price": 185.64},
+        {"symbol": "MSFT", "date": None, "updated_at": None, "close_price": None},
+    ]
+    assert rows_to_json(columns, []) == b"[]"
@@ -0,0 +1,60 @@
+from datetime import date
+from types import SimpleNamespace
+from app.util.market_data import PriceField
+from app.util.metric_state import mark_metric_state_stale, refresh_metric_state
+
+class FakeSession:
+    """Answers the state and price queries of a metric state refresh and records every statement"""
+
+    def __init__(self, states, prices):
+        self.states = states
+        self.prices = prices
+        self.calls = []
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        self.calls.append((sql, params))
+        if "FROM metric_state ms" in sql:
+            return SimpleNamespace(mappings=lambda: SimpleNamespace(fetchall=lambda: self.states))
+        if "FROM market_price mp" in sql:
+            return SimpleNamespace(fetchall=lambda: self.prices)
+        return SimpleNamespace(fetchall=lambda: [], rowcount=1)
+
+def state(symbol, stale):
+    return {
+        "symbol": symbol, "first_date": date(2024, 1, 2), "last_date": date(2024, 1, 3),
+        "first_price": 10.0, "last_price": 11.0, "running_peak": 11.0, "max_drawdown": 0.0,
+        "return_count": 1, "mean_return": 0.1, "m2_return": 0.0, "stale": stale,
+    }
+
+def test_stale_states_are_rebuilt_from_full_history():
+    """Test that a state flagged stale (e.g. after deleted prices) is re-read from its first price"""
+    db = FakeSession([state("AAPL", True), state("MSFT", False)], [
+        ("AAPL", date(2024, 1, 2), 10.0), ("AAPL", date(2024, 1, 4), 12.0),
+        ("MSFT", date(2024, 1, 4), 12.1),
+    ])
+    assert refresh_metric_state(db, ["AAPL", "MSFT"], PriceField.close_price) == 2
+
+    # Staleness comes from the flag set at ingest, not from rescanning market_price
+    assert "ms.rebuild_required" in db.calls[0][0]
+    assert "market_price" not in db.calls[0][0]
+    assert db.calls[1][1]["since"] == [None, date(2024, 1, 3)]
+    upserts = {row["symbol"]: row for row in db.calls[-1][1]}
+    assert upserts["AAPL"]["return_count"] == 1 and upserts["AAPL"]["last_price"] == 12.0
+    assert upserts["MSFT"]["return_count"] == 2
+
+def test_state_without_prices_is_dropped():
+    """Test that a stale state whose prices were all deleted is removed"""
+    db = FakeSession([state("AAPL", True)], [])
+    assert refresh_metric_state(db, ["AAPL"], PriceField.close_price) == 0
+    sql, params = db.calls[-1]
+    assert sql.startswith("DELETE FROM metric_state")
+    assert params["symbols"] == ["AAPL"]
+
+def test_ingest_changes_flag_states_for_rebuild():
+    """Test that the earliest loaded date of each symbol is passed to the stale flag update"""
+    db = FakeSession([], [])
+    assert mark_metric_state_stale(db, {"MSFT": date(2024, 1, 4), "AAPL": date(2024, 1, 2)}) == 1
+    sql, params = db.calls[0]
+    assert "s.since <= ms.last_date" in sql
+    assert params == {"symbols": ["AAPL", "MSFT"], "since": [date(2024, 1, 2), date(2024, 1, 4)]}
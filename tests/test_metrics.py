@@ -0,0 +1,219 @@
+import numpy as np
+import pytest
+from app.util.metrics import (
+    METRIC_NAMES,
+    ROLLING_METRIC_NAMES,
+    build_price_panel,
+    compute_metrics,
+    compute_panel_metrics,
+    compute_return_covariance,
+    compute_rolling_metrics,
+    metrics_from_state,
+    rolling_max,
+    update_running_state
+)
+
+def test_compute_metrics_known_series():
+    """Test metrics on a small hand-checked price series"""
+    prices = [100.0, 110.0, 99.0, 121.0]
+    metrics = compute_metrics(prices, periods_per_year=3)
+
+    returns = np.array([0.10, -0.10, 121.0 / 99.0 - 1.0])
+    assert metrics["total_return"] == pytest.approx(0.21)
+    assert metrics["annualized_return"] == pytest.approx(0.21)
+    assert metrics["volatility"] == pytest.approx(returns.std(ddof=1) * np.sqrt(3))
+    assert metrics["sharpe_ratio"] == pytest.approx(returns.mean() * 3 / metrics["volatility"])
+    assert metrics["max_drawdown"] == pytest.approx(-0.10)
+
+def test_compute_metrics_risk_free_rate():
+    """Test that the risk-free rate lowers the Sharpe ratio"""
+    prices = [100.0, 101.0, 100.5, 102.0, 103.0]
+    base = compute_metrics(prices)
+    adjusted = compute_metrics(prices, risk_free_rate=0.05)
+    assert adjusted["sharpe_ratio"] == pytest.approx(base["sharpe_ratio"] - 0.05 / base["volatility"])
+
+def test_compute_metrics_monotonic_series_has_no_drawdown():
+    """Test that a rising series has zero drawdown"""
+    metrics = compute_metrics(np.linspace(100.0, 200.0, 50))
+    assert metrics["max_drawdown"] == 0.0
+    assert metrics["total_return"] == pytest.approx(1.0)
+
+def test_compute_metrics_insufficient_data():
+    """Test that short series return None for every metric"""
+    assert compute_metrics([100.0]) == {name: None for name in METRIC_NAMES}
+    assert compute_metrics([]) == {name: None for name in METRIC_NAMES}
+
+def test_compute_metrics_flat_series_sharpe_undefined():
+    """Test that a zero-volatility series has an undefined Sharpe ratio"""
+    metrics = compute_metrics([100.0, 100.0, 100.0])
+    assert metrics["volatility"] == 0.0
+    assert metrics["sharpe_ratio"] is None
+
+def test_compute_panel_metrics_matches_single_series():
+    """Test that each panel column matches its own compacted series, including gaps"""
+    nan = np.nan
+    panel = np.array([
+        [100.0, nan, 50.0],
+        [101.0, 20.0, nan],
+        [nan, 21.0, 49.0],
+        [99.0, 19.5, 52.0],
+        [104.0, nan, nan],
+    ])
+    results = compute_panel_metrics(panel, risk_free_rate=0.01)
+
+    for col in range(panel.shape[1]):
+        series = panel[:, col][~np.isnan(panel[:, col])]
+        expected = compute_metrics(series, risk_free_rate=0.01)
+        assert results["observations"][col] == series.size
+        for name in METRIC_NAMES:
+            assert results[name][col] == pytest.approx(expected[name])
+
+def test_build_price_panel_pivots_long_rows():
+    """Test pivoting long (date, symbol, price) rows into a dates x symbols panel"""
+    dates, symbols, panel = build_price_panel(
+        ["2024-01-03", "2024-01-02", "2024-01-02"],
+        ["MSFT", "MSFT", "AAPL"],
+        [11.0, 10.0, 5.0],
+    )
+    assert dates.astype(str).tolist() == ["2024-01-02", "2024-01-03"]
+    assert symbols.tolist() == ["AAPL", "MSFT"]
+    np.testing.assert_array_equal(panel, [[5.0, 10.0], [np.nan, 11.0]])
+
+def test_rolling_max_matches_naive_window():
+    """Test the block-decomposed rolling max against a direct window scan"""
+    rng = np.random.default_rng(7)
+    values = rng.normal(size=103)
+    for window in (1, 2, 5, 21, 103, 150):
+        expected = [values[max(0, i - window + 1):i + 1].max() for i in range(values.size)]
+        np.testing.assert_allclose(rolling_max(values, window), expected)
+
+def test_compute_rolling_metrics_matches_naive_recomputation():
+    """Test rolling volatility, Sharpe and drawdown against per-window recomputation"""
+    rng = np.random.default_rng(11)
+    prices = 100.0 * np.cumprod(1.0 + rng.normal(0.0005, 0.01, size=300))
+    returns = prices[1:] / prices[:-1] - 1.0
+
+    results = compute_rolling_metrics(prices, windows=(21, 63), risk_free_rate=0.02)
+
+    for window in (21, 63):
+        series = results[window]
+        assert np.isnan(series["rolling_volatility"][:window]).all()
+        assert np.isnan(series["rolling_drawdown"][:window - 1]).all()
+        for t in range(window, prices.size):
+            window_returns = returns[t - window:t]
+            vol = window_returns.std(ddof=1) * np.sqrt(252)
+            assert series["rolling_volatility"][t] == pytest.approx(vol)
+            assert series["rolling_sharpe"][t] == pytest.approx((window_returns.mean() * 252 - 0.02) / vol)
+            peak = prices[t - window + 1:t + 1].max()
+            assert series["rolling_drawdown"][t] == pytest.approx(prices[t] / peak - 1.0)
+
+def test_compute_rolling_metrics_short_series():
+    """Test that series shorter than the window are all NaN"""
+    results = compute_rolling_metrics([100.0, 101.0, 102.0], windows=(5,))
+    for name in ROLLING_METRIC_NAMES:
+        assert np.isnan(results[5][name]).all()
+
+def test_running_state_matches_full_recompute():
+    """Test that folding prices in daily batches matches a full-history computation"""
+    rng = np.random.default_rng(3)
+    prices = 50.0 * np.cumprod(1.0 + rng.normal(0.0003, 0.02, size=400))
+
+    state = update_running_state(None, prices[:1])
+    for start, end in ((1, 2), (2, 150), (150, 151), (151, 400)):
+        state = update_running_state(state, prices[start:end])
+
+    expected = compute_metrics(prices, risk_free_rate=0.01)
+    actual = metrics_from_state(state, risk_free_rate=0.01)
+    assert state["return_count"] == prices.size - 1
+    for name in METRIC_NAMES:
+        assert actual[name] == pytest.approx(expected[name])
+
+def test_running_state_single_price():
+    """Test that a state seeded with one price has no metrics yet"""
+    state = update_running_state(None, [100.0])
+    assert metrics_from_state(state) == {name: None for name in METRIC_NAMES}
+    assert update_running_state(state, []) == state
+
+def test_resolve_frequency_fits_point_budget():
+    """Test that auto frequency coarsens as the date range grows and explicit frequencies pass through"""
+    from datetime import date
+    from app.util.market_data import Frequency, resolve_frequency
+
+    start = date(2020, 1, 1)
+    assert resolve_frequency(Frequency.auto, start, date(2020, 12, 31), 520) == Frequency.daily
+    assert resolve_frequency(Frequency.auto, start, date(2025, 12, 31), 520) == Frequency.weekly
+    assert resolve_frequency(Frequency.auto, date(1990, 1, 1), date(2025, 12, 31), 520) == Frequency.monthly
+    assert resolve_frequency(Frequency.auto, None, date(2025, 12, 31), 520) == Frequency.daily
+    assert resolve_frequency(Frequency.weekly, start, date(2020, 2, 1), 520) == Frequency.weekly
+
+def test_open_range_resolves_from_first_price_date():
+    """Test that an open-ended auto range is measured from the symbols' first price date"""
+    from datetime import date
+    from app.util.market_data import Frequency, first_price_date, resolve_frequency
+
+    class FakeSession:
+        def __init__(self):
+            self.calls = []
+
+        def execute(self, statement, params):
+            self.calls.append(params)
+            return self
+
+        def scalar(self):
+            return date(1990, 1, 2)
+
+    db = FakeSession()
+    start = first_price_date(db, ["AAPL"], Frequency.auto, None)
+    assert db.calls == [{'symbols': ["AAPL"], 'portfolio_ids': None}]
+    assert resolve_frequency(Frequency.auto, start, date(2025, 12, 31), 520) == Frequency.monthly
+
+    # Portfolio-only requests are measured from their NAV dates
+    first_price_date(db, [], Frequency.auto, None, ["p1"])
+    assert db.calls[-1] == {'symbols': [], 'portfolio_ids': ["p1"]}
+    del db.calls[-1]
+
+    # A given start or an explicit frequency needs no lookup
+    assert first_price_date(db, ["AAPL"], Frequency.auto, date(2024, 1, 1)) == date(2024, 1, 1)
+    assert first_price_date(db, ["AAPL"], Frequency.daily, None) is None
+    assert len(db.calls) == 1
+
+def test_return_covariance_matches_numpy_on_complete_data():
+    """Test that the matrix-product covariance and correlation match numpy on a gap-free panel"""
+    rng = np.random.default_rng(7)
+    panel = np.cumprod(1.0 + rng.normal(0.0, 0.01, (300, 6)), axis=0)
+    returns = panel[1:] / panel[:-1] - 1.0
+
+    result = compute_return_covariance(panel)
+    np.testing.assert_allclose(result["covariance"], np.cov(returns.T))
+    np.testing.assert_allclose(result["correlation"], np.corrcoef(returns.T))
+    assert result["shrinkage_intensity"] == 0.0
+
+def test_return_covariance_pairwise_missing_data():
+    """Test that each pair is estimated over the returns both columns have, and sparse pairs are NaN"""
+    rng = np.random.default_rng(11)
+    panel = np.cumprod(1.0 + rng.normal(0.0, 0.01, (200, 4)), axis=0)
+    panel[rng.random(panel.shape) < 0.2] = np.nan
+    panel[:190, 3] = np.nan
+    returns = panel[1:] / panel[:-1] - 1.0
+
+    result = compute_return_covariance(panel, min_observations=20)
+    both = ~np.isnan(returns[:, 0]) & ~np.isnan(returns[:, 2])
+    assert result["overlap"][0, 2] == both.sum()
+    assert result["covariance"][0, 2] == pytest.approx(np.cov(returns[both, 0], returns[both, 2])[0, 1])
+    assert result["correlation"][0, 2] == pytest.approx(np.corrcoef(returns[both, 0], returns[both, 2])[0, 1])
+    assert np.isnan(result["correlation"][3]).all()
+
+def test_return_covariance_ledoit_wolf_shrinkage():
+    """Test that shrinkage pulls off-diagonal covariances towards zero while keeping the average variance"""
+    rng = np.random.default_rng(3)
+    panel = np.cumprod(1.0 + rng.normal(0.0, 0.01, (60, 30)), axis=0)
+
+    sample = compute_return_covariance(panel)
+    shrunk = compute_return_covariance(panel, shrinkage=True)
+    intensity = shrunk["shrinkage_intensity"]
+    off_diagonal = ~np.eye(30, dtype=bool)
+
+    assert 0.0 < intensity <= 1.0
+    np.testing.assert_allclose(shrunk["covariance"][off_diagonal], (1 - intensity) * sample["covariance"][off_diagonal])
+    assert np.trace(shrunk["covariance"]) == pytest.approx(np.trace(sample["covariance"]))
+    np.testing.assert_allclose(np.diag(shrunk["correlation"]), 1.0)
@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from app.util import parallel_metrics
+from app.util.metrics import METRIC_NAMES, build_price_panel, compute_panel_metrics
+from app.util.parallel_metrics import SharedPanel, get_process_pool, iter_panel_metrics, shutdown_process_pool
+
+def test_parallel_metrics_match_serial_panel_metrics():
+    """Test that chunked process-pool metrics match a single-process panel computation"""
+    rng = np.random.default_rng(5)
+    panel = np.cumprod(1.0 + rng.normal(0.0, 0.01, (250, 7)), axis=0)
+    panel[rng.random(panel.shape) < 0.1] = np.nan
+    symbols = [f"S{i}" for i in range(7)]
+
+    try:
+        chunks = list(iter_panel_metrics(panel, symbols, chunk_size=3, max_workers=2))
+    finally:
+        shutdown_process_pool()
+
+    assert len(chunks) == 3
+    metrics = {symbol: values for chunk in chunks for symbol, values in chunk["metrics"].items()}
+    observations = {symbol: count for chunk in chunks for symbol, count in chunk["observations"].items()}
+    expected = compute_panel_metrics(panel)
+    for i, symbol in enumerate(symbols):
+        assert observations[symbol] == expected["observations"][i]
+        for name in METRIC_NAMES:
+            assert metrics[symbol][name] == pytest.approx(expected[name][i])
+
+def test_panel_built_in_shared_memory_is_used_in_place():
+    """Test that a panel pivoted straight into a SharedPanel is computed without a copy and then released"""
+    shared = SharedPanel()
+    _, symbols, panel = build_price_panel(
+        ["2024-01-02", "2024-01-03", "2024-01-02", "2024-01-04"], ["A", "A", "B", "B"], [10.0, 11.0, 20.0, 19.0],
+        allocate=shared.allocate
+    )
+    assert panel is shared.array
+    expected = compute_panel_metrics(panel)
+    del panel
+
+    try:
+        chunks = list(iter_panel_metrics(shared, symbols.tolist(), chunk_size=1, max_workers=2))
+    finally:
+        shutdown_process_pool()
+
+    observations = {symbol: count for chunk in chunks for symbol, count in chunk["observations"].items()}
+    assert observations == {"A": expected["observations"][0], "B": expected["observations"][1]}
+    assert shared.shm is None and shared.array is None
+
+def test_parallel_metrics_empty_panel():
+    """Test that an empty panel yields nothing without starting the pool"""
+    assert list(iter_panel_metrics(np.empty((0, 0)), [])) == []
+
+def test_parallel_metrics_fail_cleanly_when_shm_is_too_small(tmp_path, monkeypatch):
+    """Test that a panel larger than the free shared memory raises instead of crashing the workers"""
+    monkeypatch.setattr(parallel_metrics, "SHM_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(parallel_metrics.shutil, "disk_usage", lambda path: SimpleNamespace(free=100))
+    with pytest.raises(MemoryError):
+        next(iter_panel_metrics(np.ones((250, 7)), [f"S{i}" for i in range(7)]))
+
+def test_process_pool_warns_on_different_size(monkeypatch):
+    """Test that asking the running pool for a different number of workers is logged, not ignored silently"""
+    warnings = []
+    monkeypatch.setattr(parallel_metrics.logger, "warning", warnings.append)
+    try:
+        pool = get_process_pool(2)
+        assert get_process_pool(2) is pool and not warnings
+        assert get_process_pool(3) is pool
+        assert len(warnings) == 1
+    finally:
+        shutdown_process_pool()
@@ -1,15 +1,25 @@
+import os
+import uuid
 import pytest
 from fastapi.testclient import TestClient
 from main import app
 
+# Portfolios are stored in the sec_master database
+pytestmark = pytest.mark.skipif(not os.getenv("DB_PASSWORD"), reason="requires a PostgreSQL database")
+
 client = TestClient(app)
 
+def new_portfolio_id():
+    return f"test-{uuid.uuid4().hex[:12]}"
+
 def test_create_portfolio():
     """Test creating a new portfolio"""
     portfolio_data = {
+        "id": new_portfolio_id(),
         "name": "Test Portfolio",
+        "owner_id": "test-owner",
         "description": "A test portfolio",
-        "initial_balance": 10000.00
+        "base_currency": "USD"
     }
     
     response = client.post("/api/v1/portfolio/", json=portfolio_data)
@@ -18,8 +28,8 @@ def test_create_portfolio():
     data = response.json()
     assert data["name"] == portfolio_data["name"]
     assert data["description"] == portfolio_data["description"]
-    assert data["initial_balance"] == portfolio_data["initial_balance"]
-    assert "id" in data
+    assert data["id"] == portfolio_data["id"]
+    assert data["owner_id"] == portfolio_data["owner_id"]
     assert "created_at" in data
     assert "updated_at" in data
 
@@ -31,13 +41,31 @@ def test_get_portfolios():
     data = response.json()
     assert isinstance(data, list)
 
+def test_get_portfolios_by_owner_paginated():
+    """Test paging through one owner's portfolios"""
+    owner_id = new_portfolio_id()
+    created = sorted(
+        client.post("/api/v1/portfolio/", json={"id": new_portfolio_id(), "name": "Paged", "owner_id": owner_id}).json()["id"]
+        for _ in range(3)
+    )
+
+    first_page = client.get("/api/v1/portfolio/", params={"owner_id": owner_id, "limit": 2})
+    assert [p["id"] for p in first_page.json()] == created[:2]
+    next_after = first_page.headers["X-Next-After"]
+
+    second_page = client.get("/api/v1/portfolio/", params={"owner_id": owner_id, "limit": 2, "after": next_after})
+    assert [p["id"] for p in second_page.json()] == created[2:]
+    assert "X-Next-After" not in second_page.headers
+
 def test_get_portfolio():
     """Test getting a specific portfolio"""
     # First create a portfolio
     portfolio_data = {
+        "id": new_portfolio_id(),
         "name": "Test Portfolio 2",
+        "owner_id": "test-owner",
         "description": "Another test portfolio",
-        "initial_balance": 5000.00
+        "base_currency": "USD"
     }
     
     create_response = client.post("/api/v1/portfolio/", json=portfolio_data)
@@ -53,16 +81,18 @@ def test_get_portfolio():
 
 def test_get_portfolio_not_found():
     """Test getting a non-existent portfolio"""
-    response = client.get("/api/v1/portfolio/999")
+    response = client.get(f"/api/v1/portfolio/{new_portfolio_id()}")
     assert response.status_code == 404
 
 def test_update_portfolio():
     """Test updating a portfolio"""
     # First create a portfolio
     portfolio_data = {
+        "id": new_portfolio_id(),
         "name": "Test Portfolio 3",
+        "owner_id": "test-owner",
         "description": "A test portfolio to update",
-        "initial_balance": 7500.00
+        "base_currency": "USD"
     }
     
     create_response = client.post("/api/v1/portfolio/", json=portfolio_data)
@@ -70,9 +100,11 @@ def test_update_portfolio():
     
     # Update it
     update_data = {
+        "id": portfolio_id,
         "name": "Updated Portfolio",
+        "owner_id": "test-owner",
         "description": "Updated description",
-        "initial_balance": 8000.00
+        "base_currency": "EUR"
     }
     
     response = client.put(f"/api/v1/portfolio/{portfolio_id}", json=update_data)
@@ -81,15 +113,17 @@ def test_update_portfolio():
     data = response.json()
     assert data["name"] == update_data["name"]
     assert data["description"] == update_data["description"]
-    assert data["initial_balance"] == update_data["initial_balance"]
+    assert data["base_currency"] == update_data["base_currency"]
 
 def test_delete_portfolio():
     """Test deleting a portfolio"""
     # First create a portfolio
     portfolio_data = {
+        "id": new_portfolio_id(),
         "name": "Test Portfolio 4",
+        "owner_id": "test-owner",
         "description": "A test portfolio to delete",
-        "initial_balance": 3000.00
+        "base_currency": "USD"
     }
     
     create_response = client.post("/api/v1/portfolio/", json=portfolio_data)
@@ -102,3 +136,53 @@ def test_delete_portfolio():
     # Verify it's deleted
     get_response = client.get(f"/api/v1/portfolio/{portfolio_id}")
     assert get_response.status_code == 404
+
+def test_snapshots_bulk_round_trip():
+    """Test writing snapshots in bulk and reading them back as columns"""
+    portfolio_ids = [
+        client.post("/api/v1/portfolio/", json={"id": new_portfolio_id(), "name": "Snap", "owner_id": "test-owner"}).json()["id"]
+        for _ in range(2)
+    ]
+    snapshots = [
+        {"id": portfolio_id, "as_of_date": f"2024-01-0{day}", "balance": 1000.0 + day, "is_active": True}
+        for portfolio_id in portfolio_ids for day in range(2, 5)
+    ]
+
+    response = client.post("/api/v1/portfolio/snapshots", json={"snapshots": snapshots})
+    assert response.status_code == 200
+    assert response.json()["data"]["written"] == 6
+
+    response = client.get("/api/v1/portfolio/snapshots", params={
+        "start_date": "2024-01-03", "end_date": "2024-01-04", "ids": portfolio_ids
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert data["as_of_date"] == ["2024-01-03", "2024-01-03", "2024-01-04", "2024-01-04"]
+    assert data["balance"] == [1003.0, 1003.0, 1004.0, 1004.0]
+    assert data["meta_data"] == [None] * 4
+    assert "X-Next-After-Id" not in response.headers
+
+def test_snapshots_read_in_pages():
+    """Test paging through snapshots by date and id, with their metadata"""
+    portfolio_ids = sorted(
+        client.post("/api/v1/portfolio/", json={"id": new_portfolio_id(), "name": "Snap", "owner_id": "test-owner"}).json()["id"]
+        for _ in range(2)
+    )
+    snapshots = [
+        {"id": portfolio_id, "as_of_date": "2024-02-01", "balance": 10.0, "is_active": True, "meta_data": {"n": i}}
+        for i, portfolio_id in enumerate(portfolio_ids)
+    ]
+    client.post("/api/v1/portfolio/snapshots", json={"snapshots": snapshots})
+
+    params = {"start_date": "2024-02-01", "end_date": "2024-02-01", "ids": portfolio_ids, "limit": 1}
+    first_page = client.get("/api/v1/portfolio/snapshots", params=params)
+    assert first_page.json()["id"] == portfolio_ids[:1]
+    assert first_page.json()["meta_data"] == [{"n": 0}]
+
+    second_page = client.get("/api/v1/portfolio/snapshots", params={
+        **params,
+        "after_date": first_page.headers["X-Next-After-Date"],
+        "after_id": first_page.headers["X-Next-After-Id"],
+    })
+    assert second_page.json()["id"] == portfolio_ids[1:]
+    assert "X-Next-After-Id" not in second_page.headers
@@ -0,0 +1,84 @@
+import numpy as np
+from app.util.portfolio_nav import compute_nav_series
+
+def days(*values):
+    return np.array(values, dtype="datetime64[D]")
+
+def test_nav_values_positions_and_cash():
+    """Test that NAV is cash plus positions valued at forward-filled prices"""
+    date_keys = days("2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05")
+    prices = np.array([
+        [10.0, 50.0],
+        [11.0, 50.0],
+        [12.0, 55.0],
+        [12.0, 60.0],
+    ])
+    # Deposit 1000 on a weekend before the first date, buy 10 A, buy 4 B, sell 5 A
+    series = compute_nav_series(
+        trade_dates=days("2023-12-31", "2024-01-02", "2024-01-03", "2024-01-05"),
+        trade_columns=np.array([-1, 0, 1, 0]),
+        quantities=np.array([0.0, 10.0, 4.0, -5.0]),
+        cash_amounts=np.array([1000.0, -100.0, -200.0, 60.0]),
+        flows=np.array([1000.0, 0.0, 0.0, 0.0]),
+        date_keys=date_keys,
+        prices=prices
+    )
+
+    np.testing.assert_allclose(series["cash"], [900.0, 700.0, 700.0, 760.0])
+    np.testing.assert_allclose(series["nav"], [1000.0, 1010.0, 1040.0, 1060.0])
+    np.testing.assert_allclose(series["unit_value"], series["nav"] / 1000.0)
+
+def test_unit_value_excludes_external_flows():
+    """Test that deposits raise NAV but not the time-weighted unit value"""
+    date_keys = days("2024-01-02", "2024-01-03", "2024-01-04")
+    prices = np.array([[100.0], [110.0], [110.0]])
+    series = compute_nav_series(
+        trade_dates=days("2024-01-02", "2024-01-02", "2024-01-04"),
+        trade_columns=np.array([-1, 0, -1]),
+        quantities=np.array([0.0, 10.0, 0.0]),
+        cash_amounts=np.array([1000.0, -1000.0, 500.0]),
+        flows=np.array([1000.0, 0.0, 500.0]),
+        date_keys=date_keys,
+        prices=prices
+    )
+
+    np.testing.assert_allclose(series["nav"], [1000.0, 1100.0, 1600.0])
+    np.testing.assert_allclose(series["net_flow"], [1000.0, 0.0, 500.0])
+    np.testing.assert_allclose(series["unit_value"], [1.0, 1.1, 1.1])
+
+def test_series_extends_from_a_stored_row():
+    """Test that chaining from the last stored row reproduces the tail of the full series"""
+    date_keys = days("2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05")
+    prices = np.array([[100.0], [110.0], [99.0], [121.0]])
+    trade_dates = days("2024-01-02", "2024-01-02", "2024-01-04")
+    trade_columns = np.array([-1, 0, -1])
+    quantities = np.array([0.0, 10.0, 0.0])
+    cash_amounts = np.array([1000.0, -1000.0, 500.0])
+    flows = np.array([1000.0, 0.0, 500.0])
+    full = compute_nav_series(trade_dates, trade_columns, quantities, cash_amounts, flows, date_keys, prices)
+
+    # Recompute from 2024-01-04; flows up to the kept row on 2024-01-03 are already stored
+    tail = compute_nav_series(
+        trade_dates, trade_columns, quantities, cash_amounts,
+        np.where(trade_dates <= np.datetime64("2024-01-03"), 0.0, flows),
+        date_keys[2:], prices[2:],
+        previous_nav=full["nav"][1], previous_unit_value=full["unit_value"][1]
+    )
+
+    for name in ("nav", "cash", "net_flow", "unit_value"):
+        np.testing.assert_allclose(tail[name], full[name][2:])
+
+def test_cash_only_portfolio_is_valued():
+    """Test that a portfolio without positions is valued at its cash"""
+    series = compute_nav_series(
+        trade_dates=days("2024-01-02", "2024-01-04"),
+        trade_columns=np.array([-1, -1]),
+        quantities=np.array([0.0, 0.0]),
+        cash_amounts=np.array([1000.0, 10.0]),
+        flows=np.array([1000.0, 0.0]),
+        date_keys=days("2024-01-02", "2024-01-03", "2024-01-04"),
+        prices=np.empty((3, 0))
+    )
+
+    np.testing.assert_allclose(series["nav"], [1000.0, 1000.0, 1010.0])
+    np.testing.assert_allclose(series["unit_value"], [1.0, 1.0, 1.01])
@@ -0,0 +1,133 @@
+from datetime import date
+import numpy as np
+from app.util.market_data import PriceField
+from app.util.price_cache import MAX_INVALIDATIONS, PriceSeriesCache, invalidation_payload
+
+class FakeMarketPrice:
+    """Stands in for the market_price query, recording the symbol -> `since` map of every read"""
+
+    def __init__(self, prices):
+        self.prices = {symbol: dict(series) for symbol, series in prices.items()}
+        self.queries = []
+
+    def __call__(self, price_field, since_by_symbol):
+        self.queries.append(dict(since_by_symbol))
+        loaded = {}
+        for symbol, since in since_by_symbol.items():
+            rows = sorted((day, price) for day, price in self.prices.get(symbol, {}).items()
+                          if since is None or day >= since)
+            if rows:
+                days = np.array([(np.datetime64(day, "D") - np.datetime64("1970-01-01", "D")).astype(int)
+                                 for day, _ in rows], dtype=np.int32)
+                loaded[symbol] = days, np.array([price for _, price in rows], dtype=np.float64)
+        return loaded
+
+def make_cache(directory, market_price, monkeypatch):
+    cache = PriceSeriesCache(str(directory))
+    monkeypatch.setattr(cache, "_query", market_price)
+    return cache
+
+def test_cache_serves_mapped_series_without_requerying(tmp_path, monkeypatch):
+    """Test that a series is read once, then served read-only from the mapped file"""
+    market_price = FakeMarketPrice({"AAPL": {date(2024, 1, 2): 10.0, date(2024, 1, 3): 11.0}})
+    cache = make_cache(tmp_path, market_price, monkeypatch)
+
+    days, prices = cache.get("AAPL", PriceField.close_price)
+    days, prices = cache.get("AAPL", PriceField.close_price)
+    assert market_price.queries == [{"AAPL": None}]
+    np.testing.assert_array_equal(prices, [10.0, 11.0])
+    assert not prices.flags.writeable
+
+    # A second worker finds the file written after its own startup invalidation
+    other = make_cache(tmp_path, FakeMarketPrice({}), monkeypatch)
+    other._invalidations[0] = (1, 0.0, None, None)
+    np.testing.assert_array_equal(other.get("AAPL", PriceField.close_price)[1], [10.0, 11.0])
+
+def test_cache_refreshes_incrementally_after_invalidation(tmp_path, monkeypatch):
+    """Test that an invalidation re-reads only the dates from the loaded one onwards"""
+    market_price = FakeMarketPrice({"AAPL": {date(2024, 1, 2): 10.0, date(2024, 1, 3): 11.0}})
+    cache = make_cache(tmp_path, market_price, monkeypatch)
+    cache.get("AAPL", PriceField.close_price)
+
+    market_price.prices["AAPL"].update({date(2024, 1, 3): 11.5, date(2024, 1, 4): 12.0})
+    cache.invalidate("2024-01-03")
+    days, prices = cache.get("AAPL", PriceField.close_price)
+
+    assert market_price.queries == [{"AAPL": None}, {"AAPL": date(2024, 1, 3)}]
+    np.testing.assert_array_equal(prices, [10.0, 11.5, 12.0])
+    assert (np.datetime64("1970-01-01", "D") + days).tolist() == [date(2024, 1, 2), date(2024, 1, 3), date(2024, 1, 4)]
+
+def test_cache_skips_unknown_symbols(tmp_path, monkeypatch):
+    """Test that symbols without prices do not create cache files"""
+    cache = make_cache(tmp_path, FakeMarketPrice({}), monkeypatch)
+    days, prices = cache.get("../NOPE", PriceField.close_price)
+    assert days.size == 0 and prices.size == 0
+    assert not any(tmp_path.rglob("*.arrow"))
+
+def test_cache_reads_stale_symbols_in_one_query(tmp_path, monkeypatch):
+    """Test that a panel re-reads only the invalidated symbols, together, each from its own date"""
+    market_price = FakeMarketPrice({
+        "AAPL": {date(2024, 1, 2): 10.0, date(2024, 1, 3): 11.0},
+        "MSFT": {date(2024, 1, 2): 20.0, date(2024, 1, 3): 21.0},
+        "IBM": {date(2024, 1, 2): 30.0},
+    })
+    cache = make_cache(tmp_path, market_price, monkeypatch)
+    cache.get_many(["AAPL", "MSFT", "IBM"], PriceField.close_price)
+    assert market_price.queries == [{"AAPL": None, "MSFT": None, "IBM": None}]
+
+    market_price.prices["AAPL"][date(2024, 1, 3)] = 11.5
+    market_price.prices["MSFT"][date(2024, 1, 4)] = 22.0
+    cache.invalidate(invalidation_payload({"AAPL": date(2024, 1, 3), "MSFT": date(2024, 1, 4)}))
+    series = cache.get_many(["AAPL", "MSFT", "IBM"], PriceField.close_price)
+
+    assert market_price.queries[1:] == [{"AAPL": date(2024, 1, 3), "MSFT": date(2024, 1, 4)}]
+    np.testing.assert_array_equal(series["AAPL"][1], [10.0, 11.5])
+    np.testing.assert_array_equal(series["MSFT"][1], [20.0, 21.0, 22.0])
+    np.testing.assert_array_equal(series["IBM"][1], [30.0])
+
+def test_reset_drops_deleted_history(tmp_path, monkeypatch):
+    """Test that a symbol reset after its prices were deleted does not keep or resurrect cached rows"""
+    market_price = FakeMarketPrice({"AAPL": {date(2024, 1, 2): 10.0, date(2024, 1, 3): 11.0}})
+    cache = make_cache(tmp_path, market_price, monkeypatch)
+    cache.get("AAPL", PriceField.close_price)
+
+    del market_price.prices["AAPL"]
+    cache.invalidate(invalidation_payload({"AAPL": None}))
+    assert cache.get("AAPL", PriceField.close_price)[1].size == 0
+
+    # Re-created with new history loaded from a later date
+    market_price.prices["AAPL"] = {date(2024, 2, 1): 50.0}
+    cache.invalidate(invalidation_payload({"AAPL": date(2024, 2, 1)}))
+    np.testing.assert_array_equal(cache.get("AAPL", PriceField.close_price)[1], [50.0])
+
+def test_version_changes_when_series_is_re_read(tmp_path, monkeypatch):
+    """Test that a series' version is stable until an invalidation makes it re-read"""
+    market_price = FakeMarketPrice({"AAPL": {date(2024, 1, 2): 10.0}})
+    cache = make_cache(tmp_path, market_price, monkeypatch)
+    version = cache.get_versioned("AAPL", PriceField.close_price)[2]
+    assert cache.get_versioned("AAPL", PriceField.close_price)[2] == version
+    assert len(market_price.queries) == 1
+
+    market_price.prices["AAPL"][date(2024, 1, 3)] = 11.0
+    cache.invalidate(invalidation_payload({"AAPL": date(2024, 1, 3)}))
+    assert cache.get_versioned("AAPL", PriceField.close_price)[2] != version
+
+def test_cache_bounds_invalidations(tmp_path, monkeypatch):
+    """Test that old invalidations are dropped and series that missed them are re-read in full"""
+    market_price = FakeMarketPrice({"AAPL": {date(2024, 1, 2): 10.0}})
+    cache = make_cache(tmp_path, market_price, monkeypatch)
+    cache.get("AAPL", PriceField.close_price)
+
+    for _ in range(MAX_INVALIDATIONS + 5):
+        cache.invalidate("2024-01-02")
+    assert len(cache._invalidations) == MAX_INVALIDATIONS
+
+    cache.get("AAPL", PriceField.close_price)
+    assert market_price.queries[-1] == {"AAPL": None}
+
+def test_invalidation_payload_falls_back_to_earliest_date():
+    """Test that loads too large for a NOTIFY invalidate every symbol from their earliest date"""
+    assert invalidation_payload({"AAPL": date(2024, 1, 3)}) == '{"AAPL":"2024-01-03"}'
+    since_by_symbol = {f"SYM{i:05d}": date(2024, 1, 3) for i in range(1000)}
+    since_by_symbol["SYM00007"] = date(2023, 6, 1)
+    assert invalidation_payload(since_by_symbol) == "2023-06-01"
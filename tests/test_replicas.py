@@ -0,0 +1,44 @@
+import pytest
+from sqlalchemy import text
+from app.core.config import settings
+from app.util import database
+
+@pytest.fixture
+def replicas(monkeypatch):
+    monkeypatch.setitem(database.DB_CONFIG_TEMPLATE, "password", "secret")
+    monkeypatch.setattr(settings, "DB_REPLICAS", {"sec_master": ["127.0.0.1:1", "127.0.0.2:1"]})
+    monkeypatch.setattr(database, "replica_down_until", {})
+    existing = set(database.engines)
+    yield
+    for key in set(database.engines) - existing:
+        database.engines.pop(key).dispose()
+
+def test_reads_rotate_over_replicas(replicas):
+    """Test that reads alternate between replicas and writes stay on the primary"""
+    chosen = {database.choose_replica("sec_master") for _ in range(4)}
+    assert chosen == {"127.0.0.1:1", "127.0.0.2:1"}
+    assert database.choose_replica("user_data") is None
+    assert database.get_engine("sec_master", read_only=True).url.port == 1
+    assert database.get_engine("sec_master", read_only=False) is database.engines["sec_master"]
+
+def test_read_your_writes_uses_primary(replicas):
+    """Test that reads go to the primary while read_from_primary is set"""
+    token = database.read_from_primary.set(True)
+    try:
+        assert database.choose_replica("sec_master") is None
+    finally:
+        database.read_from_primary.reset(token)
+
+def test_failed_replica_leaves_rotation(replicas):
+    """Test that a replica refusing connections is skipped, and the primary is used when all are down"""
+    engine = database.get_engine("sec_master", read_only=True)
+    failed = f"{engine.url.host}:{engine.url.port}"
+    with pytest.raises(Exception):
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+    assert {database.choose_replica("sec_master") for _ in range(4)} == {"127.0.0.1:1", "127.0.0.2:1"} - {failed}
+
+    for replica in settings.DB_REPLICAS["sec_master"]:
+        database.replica_down_until[("sec_master", replica)] = float("inf")
+    assert database.choose_replica("sec_master") is None
@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import pytest
+from app.util.worker_pool import BoundedWorkerPool, PoolSaturatedError
+
+def test_worker_pool_runs_blocking_calls():
+    """Test that results and exceptions come back from the pool"""
+    pool = BoundedWorkerPool("test", max_workers=2, max_queue=2)
+
+    async def main():
+        assert await pool.run(pow, 2, 10) == 1024
+        with pytest.raises(ZeroDivisionError):
+            await pool.run(divmod, 1, 0)
+
+    asyncio.run(main())
+    stats = pool.stats()
+    assert stats["completed"] == 2
+    assert stats["failed"] == 1
+    assert stats["running"] == 0 and stats["queued"] == 0
+    pool.shutdown()
+
+def test_worker_pool_rejects_when_saturated():
+    """Test that tasks beyond workers + queue are rejected"""
+    pool = BoundedWorkerPool("test", max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def main():
+        blocked = [asyncio.ensure_future(pool.run(release.wait, 5)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(PoolSaturatedError):
+            await pool.run(release.wait, 5)
+        assert pool.stats()["running"] == 1
+        assert pool.stats()["queued"] == 1
+        release.set()
+        await asyncio.gather(*blocked)
+
+    asyncio.run(main())
+    assert pool.stats()["rejected"] == 1
+    assert pool.stats()["completed"] == 2
+    pool.shutdown()
+
+def test_worker_pool_holds_slots_until_tasks_finish():
+    """Test that a cancelled caller frees its slot only once its task has finished or been dropped"""
+    pool = BoundedWorkerPool("test", max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def main():
+        running = asyncio.ensure_future(pool.run(release.wait, 5))
+        queued = asyncio.ensure_future(pool.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        running.cancel()
+        queued.cancel()
+        await asyncio.sleep(0.05)
+        # The queued task never started; the running one still occupies its worker
+        stats = pool.stats()
+        assert stats["cancelled"] == 1 and stats["completed"] == 0
+        assert stats["running"] == 1 and stats["queued"] == 0
+        release.set()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(main())
+    stats = pool.stats()
+    assert stats["completed"] == 1 and stats["cancelled"] == 1
+    assert stats["running"] == 0 and stats["queued"] == 0
+    pool.shutdown()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Compute metrics for every symbol in securities across all CPU cores, written as NDJSON
+"""
+
+import argparse
+import json
+import sys
+from datetime import date
+
+from app.core.config import settings
+from app.util.database import get_db
+from app.util.market_data import PERIODS_PER_YEAR, Frequency, PriceField, load_price_panel, universe_symbols
+from app.util.parallel_metrics import SharedPanel, iter_panel_metrics, shutdown_process_pool
+from app.util.logger import logger
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute universe-wide metrics on a process pool")
+    parser.add_argument("--start-date", type=date.fromisoformat, default=None)
+    parser.add_argument("--end-date", type=date.fromisoformat, default=None)
+    parser.add_argument("--price-field", choices=[f.value for f in PriceField], default=PriceField.close_price.value)
+    parser.add_argument("--frequency", choices=[f.value for f in Frequency if f != Frequency.auto],
+                        default=Frequency.daily.value)
+    parser.add_argument("--risk-free-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=settings.METRICS_PROCESS_WORKERS,
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=settings.METRICS_PROCESS_CHUNK_SIZE,
+                        help="Symbols per worker task")
+    parser.add_argument("--output", default="-", help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    frequency = Frequency(args.frequency)
+    db = next(get_db('sec_master', read_only=True))
+    shared = SharedPanel()
+    try:
+        symbols = universe_symbols(db)
+        dates, panel_symbols, _ = load_price_panel(
+            db, symbols, args.start_date, args.end_date, PriceField(args.price_field), frequency,
+            allocate=shared.allocate
+        )
+    except Exception as e:
+        shared.release()
+        logger.error(f"Loading universe prices failed: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        for chunk in iter_panel_metrics(
+            shared,
+            panel_symbols.tolist(),
+            periods_per_year=PERIODS_PER_YEAR[frequency],
+            risk_free_rate=args.risk_free_rate,
+            chunk_size=args.chunk_size,
+            max_workers=args.workers
+        ):
+            output.write(json.dumps(chunk) + "\n")
+            output.flush()
+        logger.info(f"Computed metrics for {len(panel_symbols)} of {len(symbols)} symbols over {len(dates)} dates")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        shutdown_process_pool()
+
+
+if __name__ == "__main__":
+    main()
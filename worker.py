@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+"""
+Worker process that runs queued jobs (universe metrics, return matrices, backfills)
+"""
+
+from app.routers.jobs import run_job
+from app.util.jobs import run_worker
+from app.util.logger import configure_root_logging
+
+if __name__ == "__main__":
+    configure_root_logging()
+    run_worker(run_job)